@@ -1,21 +1,11 @@
+import time
+from functools import lru_cache
 from langchain_core.runnables import RunnableLambda, RunnableMap, RunnableSequence
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.vectorstores import Milvus
-from langchain_huggingface.embeddings import HuggingFaceEndpointEmbeddings
-from langchain_openai import ChatOpenAI
 from operator import itemgetter
 
-# 📥 Embeddings TEI local (réseau docker -> nom de service)
-embedding = HuggingFaceEndpointEmbeddings(model="http://tei:8010")
-
-# 🧠 Vector store Milvus (collection créée par RAG_tools)
-vectorstore = Milvus(
-    embedding_function=embedding,
-    connection_args={"host": "localhost", "port": "19530"},
-    collection_name="rag_demo",
-)
-retriever = vectorstore.as_retriever()
+from src.tools.clients import get_answer_cache, get_async_llm, get_llm, get_retriever
 
 # 🧾 Prompt de réponse fondée sur le contexte
 template = """Tu es un expert. Utilise le contexte suivant pour répondre à la question.
@@ -29,25 +19,155 @@ Question :
 Réponse :"""
 prompt = PromptTemplate.from_template(template)
 
-# 🤖 LLM via vLLM exposé en HTTP (attention : chemin complet !)
-llm = ChatOpenAI(
-    base_url="http://localhost:8000/v1/chat/completions",
-    api_key="not-needed",
-    model="auto"
-)
+# Nombre de passages récupérés (valeur par défaut du retriever)
+TOP_K = 4
+# Générations envoyées en parallèle à vLLM par run_chain_batch (batching côté serveur)
+BATCH_MAX_CONCURRENCY = 32
 
 # 🔁 Chaîne RAG LCEL : {question} -> retriever -> prompt -> llm -> str
-rag_chain: RunnableSequence = (
-    RunnableMap({
-        "context": itemgetter("question") | retriever,
-        "question": itemgetter("question")
-    }) | prompt | llm | StrOutputParser()
-)
+# Construite au premier appel : la récupération (embeddings TEI + Milvus, collection
+# créée par RAG_tools, avec caches) et le LLM vLLM sont les clients partagés de
+# src.tools.clients, aucune connexion n'est ouverte à l'import du module.
+@lru_cache(maxsize=None)
+def get_chain() -> RunnableSequence:
+    retriever = RunnableLambda(get_retriever(k=TOP_K).retrieve)
+    return (
+        RunnableMap({
+            "context": itemgetter("question") | retriever,
+            "question": itemgetter("question")
+        }) | prompt | get_llm() | StrOutputParser()
+    )
+
+
+def warm_up():
+    get_chain()
 
 # ---------------------------------------------------------------------
 # Interface imposée par l'UI : run_chain(prompt, history) -> str
+# Si le cache sémantique des réponses est activé (PYTHIA_ANSWER_CACHE_THRESHOLD),
+# une question proche d'une question déjà traitée reçoit la réponse stockée
+# sans recherche ni génération ; sinon la réponse générée y est enregistrée.
 def run_chain(user_input: str, _history=None, model_path=None) -> str:
-    return rag_chain.invoke({"question": user_input})
+    cache = get_answer_cache()
+    if cache is None:
+        return get_chain().invoke({"question": user_input})
+    retriever = get_retriever(k=TOP_K)
+    vector = retriever.embed_queries([user_input])[0]
+    generation = cache.generation
+    hit = cache.lookup(vector)
+    if hit is not None:
+        return hit["answer"]
+    t0 = time.perf_counter()
+    context = retriever.search([vector])[0]
+    answer = (prompt | get_llm() | StrOutputParser()).invoke({"context": context, "question": user_input})
+    cache.store(user_input, vector, answer, context, time.perf_counter() - t0, generation)
+    return answer
+
+# Variante streaming : yield des fragments de texte au fil de la génération
+def run_chain_stream(user_input: str, _history=None, model_path=None):
+    cache = get_answer_cache()
+    if cache is None:
+        yield from get_chain().stream({"question": user_input})
+        return
+    retriever = get_retriever(k=TOP_K)
+    vector = retriever.embed_queries([user_input])[0]
+    generation = cache.generation
+    hit = cache.lookup(vector)
+    if hit is not None:
+        yield hit["answer"]
+        return
+    t0 = time.perf_counter()
+    context = retriever.search([vector])[0]
+    parts = []
+    for piece in (prompt | get_llm() | StrOutputParser()).stream({"context": context, "question": user_input}):
+        parts.append(piece)
+        yield piece
+    cache.store(user_input, vector, "".join(parts), context, time.perf_counter() - t0, generation)
+
+# Variantes async : embedding TEI et génération vLLM sur les pools async partagés,
+# seule la recherche Milvus (client gRPC synchrone) passe par un thread.
+async def arun_chain(user_input: str, _history=None, model_path=None) -> str:
+    return "".join([piece async for piece in arun_chain_stream(user_input)])
+
+async def arun_chain_stream(user_input: str, _history=None, model_path=None):
+    cache = get_answer_cache()
+    retriever = get_retriever(k=TOP_K)
+    vector = (await retriever.aembed_queries([user_input]))[0]
+    if cache is not None:
+        generation = cache.generation
+        hit = cache.lookup(vector)
+        if hit is not None:
+            yield hit["answer"]
+            return
+    t0 = time.perf_counter()
+    context = (await retriever.asearch([vector]))[0]
+    answer_chain = prompt | get_async_llm() | StrOutputParser()
+    parts = []
+    async for piece in answer_chain.astream({"context": context, "question": user_input}):
+        parts.append(piece)
+        yield piece
+    if cache is not None:
+        cache.store(user_input, vector, "".join(parts), context, time.perf_counter() - t0, generation)
+
+# ---------------------------------------------------------------------
+# Lots de questions (jeux d'évaluation, FAQ) : un appel TEI pour toutes les
+# questions, une recherche Milvus multi-vecteurs (seulement pour les absentes
+# des caches), puis les générations en parallèle. Retour dans l'ordre des
+# questions : {"answers", "contexts", "cached" (servies par le cache de réponses), "timings"}.
+def _split_cached(vectors: list[list[float]]):
+    cache = get_answer_cache()
+    generation = cache.generation if cache is not None else None
+    hits = [cache.lookup(v) if cache is not None else None for v in vectors]
+    return cache, generation, hits, [i for i, h in enumerate(hits) if h is None]
+
+def _merge_batch(questions, vectors, cache, generation, hits, todo, contexts, answers, elapsed):
+    out_answers = [h["answer"] if h else None for h in hits]
+    out_contexts = [h["context"] if h else None for h in hits]
+    for i, context, answer in zip(todo, contexts, answers):
+        out_answers[i], out_contexts[i] = answer, context
+        if cache is not None:
+            cache.store(questions[i], vectors[i], answer, context, elapsed / len(todo), generation)
+    return out_answers, out_contexts, [h is not None for h in hits]
+
+def run_chain_batch(questions: list[str], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> dict:
+    if not questions:
+        return {"answers": [], "contexts": [], "cached": [], "timings": {}}
+    t0 = time.perf_counter()
+    retriever = get_retriever(k=TOP_K)
+    vectors = retriever.embed_queries(questions)
+    cache, generation, hits, todo = _split_cached(vectors)
+    t1 = time.perf_counter()
+    contexts = retriever.search([vectors[i] for i in todo]) if todo else []
+    t2 = time.perf_counter()
+    answer_chain = prompt | get_llm() | StrOutputParser()
+    answers = answer_chain.batch(
+        [{"context": c, "question": questions[i]} for i, c in zip(todo, contexts)],
+        config={"max_concurrency": max_concurrency},
+    )
+    t3 = time.perf_counter()
+    answers, contexts, cached = _merge_batch(questions, vectors, cache, generation, hits, todo, contexts, answers, t3 - t1)
+    timings = {"embed_s": t1 - t0, "search_s": t2 - t1, "generate_s": t3 - t2, "total_s": t3 - t0}
+    return {"answers": answers, "contexts": contexts, "cached": cached, "timings": timings}
+
+async def arun_chain_batch(questions: list[str], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> dict:
+    if not questions:
+        return {"answers": [], "contexts": [], "cached": [], "timings": {}}
+    t0 = time.perf_counter()
+    retriever = get_retriever(k=TOP_K)
+    vectors = await retriever.aembed_queries(questions)
+    cache, generation, hits, todo = _split_cached(vectors)
+    t1 = time.perf_counter()
+    contexts = await retriever.asearch([vectors[i] for i in todo]) if todo else []
+    t2 = time.perf_counter()
+    answer_chain = prompt | get_async_llm() | StrOutputParser()
+    answers = await answer_chain.abatch(
+        [{"context": c, "question": questions[i]} for i, c in zip(todo, contexts)],
+        config={"max_concurrency": max_concurrency},
+    )
+    t3 = time.perf_counter()
+    answers, contexts, cached = _merge_batch(questions, vectors, cache, generation, hits, todo, contexts, answers, t3 - t1)
+    timings = {"embed_s": t1 - t0, "search_s": t2 - t1, "generate_s": t3 - t2, "total_s": t3 - t0}
+    return {"answers": answers, "contexts": contexts, "cached": cached, "timings": timings}
 # ---------------------------------------------------------------------
 
 # 🧪 Exécution isolée
@@ -55,3 +175,7 @@ if __name__ == "__main__":
     q = "Qui est le personnage principal ?"
     print("[TEST] Question :", q)
     print("[TEST] Réponse :", run_chain(q))
+    print("[TEST] Réponse (cache) :", run_chain(q.lower()))
+    print("[TEST]", get_retriever(k=TOP_K).report())
+    if get_answer_cache() is not None:
+        print("[TEST]", get_answer_cache().report())
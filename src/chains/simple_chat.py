@@ -1,22 +1,36 @@
 # src/chains/simple_chat.py
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from functools import lru_cache
+
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnableSequence
 
-# Prompt LCEL : intègre toute la mémoire dans le contexte
+from src.tools.clients import get_async_llm, get_llm
+
+SYSTEM_PROMPT = "Tu es un assistant poli et cordial."
+
+# Prompt LCEL : system constant, historique en vrais messages (dans l'ordre), puis la question.
+# Le rendu du tour N est alors un préfixe exact du rendu du tour N+1 : le prefix
+# cache de vLLM évite de recalculer le prefill de toute la conversation.
 prompt = ChatPromptTemplate.from_messages([
-    ("system", "Tu es un assistant poli et cordial."),
-    *[("user", "{history_user}"), ("assistant", "{history_assistant}")],
+    ("system", "{system}"),
+    MessagesPlaceholder("history"),
     ("user", "{input}")
 ])
 
-# LLM (API vLLM)
-llm = ChatOpenAI(base_url="http://localhost:8000/v1",
-                 api_key="not-needed",
-                 model="auto")
 
-# LCEL Chain : prompt -> llm
-chain: RunnableSequence = prompt | llm
+@lru_cache(maxsize=None)
+def get_chain() -> RunnableSequence:
+    """LCEL Chain : prompt -> llm (client vLLM partagé), construite au premier appel."""
+    return prompt | get_llm()
+
+
+def get_async_chain() -> RunnableSequence:
+    """Même chain pour ainvoke/astream, sur le pool HTTP async de la boucle courante."""
+    return prompt | get_async_llm()
+
+
+def warm_up():
+    get_chain()
 
 
 def run_chain(user_input: str,
@@ -25,18 +39,62 @@ def run_chain(user_input: str,
     """
     Args:
         user_input: prompt utilisateur
-        history   : [{"role":"user"/"assistant", "content": "..."}]
+        history   : tours précédents [{"role":"user"/"assistant", "content": "..."}] ;
+                    un message "system" en tête (résumé de ChatMemory) est ajouté au system prompt
         **kwargs  : ignorés (ex. model_path)
 
     Returns:
         str : réponse générée
     """
-    history_user = [h["content"] for h in history if h["role"] == "user"]
-    history_assistant = [h["content"] for h in history if h["role"] == "assistant"]
-
-    result = chain.invoke({
-        "input": user_input,
-        "history_user": history_user,
-        "history_assistant": history_assistant,
-    })
+    result = get_chain().invoke(_chain_inputs(user_input, history))
     return result.content
+
+
+def run_chain_stream(user_input: str,
+                     history: list[dict],
+                     **kwargs):
+    """
+    Variante streaming de run_chain (même signature).
+
+    Yields:
+        str : fragments de texte au fil de la génération (SSE côté vLLM)
+    """
+    for chunk in get_chain().stream(_chain_inputs(user_input, history)):
+        if chunk.content:
+            yield chunk.content
+
+
+async def arun_chain(user_input: str,
+                     history: list[dict],
+                     **kwargs):
+    """Variante async de run_chain (même signature), sans thread par appel."""
+    result = await get_async_chain().ainvoke(_chain_inputs(user_input, history))
+    return result.content
+
+
+async def arun_chain_stream(user_input: str,
+                            history: list[dict],
+                            **kwargs):
+    """Variante async de run_chain_stream."""
+    async for chunk in get_async_chain().astream(_chain_inputs(user_input, history)):
+        if chunk.content:
+            yield chunk.content
+
+
+def build_messages(user_input: str, history: list[dict]) -> list[dict]:
+    """Messages envoyés au serveur, au format OpenAI (utilisé aussi par le benchmark prefix cache)."""
+    role = {"system": "system", "human": "user", "ai": "assistant"}
+    return [{"role": role[m.type], "content": m.content}
+            for m in prompt.format_messages(**_chain_inputs(user_input, history))]
+
+
+def _chain_inputs(user_input: str, history: list[dict]) -> dict:
+    # Résumé des tours évincés (system en tête) : fusionné au system prompt, seul message
+    # system accepté par tous les chat templates.
+    system = [SYSTEM_PROMPT] + [h["content"] for h in history if h["role"] == "system"]
+    history = [(h["role"], h["content"]) for h in history if h["role"] in ("user", "assistant")]
+    # L'historique ne doit pas contenir le message courant (sinon il est envoyé deux fois
+    # et le rendu du tour suivant ne prolonge plus celui-ci).
+    if history and history[-1] == ("user", user_input):
+        history = history[:-1]
+    return {"system": "\n\n".join(system), "input": user_input, "history": history}
@@ -7,6 +7,8 @@ from PyQt5.QtWidgets import (
     QPushButton, QMessageBox
 )
 
+from src.tools.RAG.collection_events import notify_collection_changed
+
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
@@ -75,6 +77,8 @@ class MilvusManager(QWidget):
                 log.info(f"Suppression des données pour {pdf_path}...")
                 self.collection.delete(expr)
                 self.collection.flush()
+                # Caches de la chaîne RAG (UI, autre processus) : résultats invalidés
+                notify_collection_changed(COLLECTION_NAME, [pdf_path], op="delete")
 
                 # 🔥 Flush + Compact automatique
                 log.info(f"Flush + compactage après suppression de {pdf_path}…")
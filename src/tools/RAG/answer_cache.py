@@ -0,0 +1,171 @@
+# src/tools/RAG/answer_cache.py
+"""
+Cache sémantique des réponses RAG.
+
+Une question dont l'embedding est assez proche (cosinus >= `threshold`) d'une
+question déjà traitée reçoit la réponse stockée, avec les passages récupérés
+à l'époque (ids Milvus et source_path), sans recherche ni génération.
+
+- Capacité bornée, éviction LRU ; recherche par produit matriciel sur les
+  vecteurs normalisés (capacité × dimension, quelques ms pour 1024 entrées).
+- Une entrée est invalidée dès qu'une de ses sources est réingérée ou
+  supprimée (journal collection_events, partagé entre processus). Une
+  réponse n'est pas enregistrée si une de ses sources a changé depuis la
+  `generation` lue avant la recherche (cf. store).
+- `stats()` / `report()` : taux de hit, latence d'un hit et d'un miss,
+  temps économisé.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from src.tools.RAG.collection_events import ALL_SOURCES, CollectionWatcher
+
+
+class SemanticAnswerCache:
+    def __init__(self, collection: str, threshold: float = 0.95, capacity: int = 1024):
+        """
+        Args:
+            collection: collection suivie pour l'invalidation par source
+            threshold : similarité cosinus minimale pour servir une réponse stockée
+            capacity  : nombre max d'entrées
+        """
+        self.threshold = threshold
+        self.capacity = capacity
+        self.watcher = CollectionWatcher(collection)
+        self._matrix: Optional[np.ndarray] = None        # (capacity, dim), vecteurs normalisés
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._entries: OrderedDict = OrderedDict()        # slot -> entrée, ordre LRU
+        self._lock = threading.Lock()
+        self._generation = 0                              # incrémentée à chaque changement vu dans le journal
+        self._changed_at: dict[str, int] = {}             # source -> génération de son dernier changement
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "hit_s": 0.0, "miss_s": 0.0,
+                       "invalidated": 0, "stale": 0}
+
+    # ------------------------------------------------------------------ #
+
+    @property
+    def generation(self) -> int:
+        """À lire avant lookup() (et donc avant la recherche), puis à passer à store()."""
+        return self._generation
+
+    def lookup(self, vector: list[float]) -> Optional[dict]:
+        """
+        Entrée la plus proche au-dessus du seuil :
+        {"question", "answer", "context", "source_ids", "sources", "similarity"}, sinon None.
+        """
+        t0 = time.perf_counter()
+        self._invalidate()
+        query = self._normalize(vector)
+        with self._lock:
+            entry = None
+            if self._entries and self._matrix is not None and self._matrix.shape[1] == query.shape[0]:
+                sims = self._matrix @ query
+                sims[~self._valid] = -1.0
+                slot = int(np.argmax(sims))
+                if sims[slot] >= self.threshold:
+                    self._entries.move_to_end(slot)
+                    entry = dict(self._entries[slot], similarity=float(sims[slot]))
+            if entry is not None:
+                self._stats["hits"] += 1
+                self._stats["hit_s"] += time.perf_counter() - t0
+            else:
+                self._stats["misses"] += 1
+        return entry
+
+    def store(self, question: str, vector: list[float], answer: str, context: list, elapsed_s: float,
+              generation: Optional[int] = None):
+        """
+        Enregistre une réponse générée ; `elapsed_s` = coût du miss (recherche + génération).
+        `generation` : valeur lue avant la recherche ; la réponse est écartée si une de ses
+        sources a changé depuis (passages récupérés potentiellement périmés).
+        """
+        self._invalidate()
+        query = self._normalize(vector)
+        entry = {
+            "question": question,
+            "answer": answer,
+            "context": context,
+            "source_ids": [d.metadata.get("pk") for d in context],
+            "sources": {d.metadata.get("source_path") for d in context},
+        }
+        with self._lock:
+            if generation is not None:
+                changed = max((self._changed_at.get(src, 0) for src in entry["sources"] | {ALL_SOURCES}),
+                              default=0)
+                if changed > generation:
+                    self._stats["stale"] += 1
+                    return
+            self._stats["stored"] += 1
+            self._stats["miss_s"] += elapsed_s
+            if self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                # Premier ajout (ou modèle d'embedding changé) : matrice (re)créée
+                self._matrix = np.zeros((self.capacity, query.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+                self._entries.clear()
+            sims = self._matrix @ query
+            sims[~self._valid] = -1.0
+            if self._entries and sims.max() >= self.threshold:
+                # Question équivalente déjà présente (ex. doublon dans un lot) : remplacée
+                slot = int(np.argmax(sims))
+                del self._entries[slot]
+            elif len(self._entries) >= self.capacity:
+                slot, _ = self._entries.popitem(last=False)
+            else:
+                slot = int(np.argmin(self._valid))       # premier emplacement libre
+            self._matrix[slot] = query
+            self._valid[slot] = True
+            self._entries[slot] = entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._valid[:] = False
+
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def _normalize(vector: list[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _invalidate(self):
+        changed = self.watcher.poll()
+        if changed is None:
+            return
+        with self._lock:
+            self._generation += 1
+            for src in changed:
+                self._changed_at[src] = self._generation
+            if ALL_SOURCES in changed:
+                stale = list(self._entries)
+            else:
+                stale = [slot for slot, e in self._entries.items() if e["sources"] & changed]
+            for slot in stale:
+                del self._entries[slot]
+                self._valid[slot] = False
+            self._stats["invalidated"] += len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            size = len(self._entries)
+        lookups = s["hits"] + s["misses"]
+        avg_hit = s["hit_s"] / s["hits"] if s["hits"] else 0.0
+        avg_miss = s["miss_s"] / s["stored"] if s["stored"] else 0.0
+        return {"hits": s["hits"], "misses": s["misses"],
+                "hit_rate": s["hits"] / lookups if lookups else 0.0,
+                "avg_hit_s": avg_hit, "avg_miss_s": avg_miss,
+                "saved_s": s["hits"] * max(avg_miss - avg_hit, 0.0),
+                "size": size, "invalidated": s["invalidated"], "stale": s["stale"]}
+
+    def report(self) -> str:
+        s = self.stats()
+        return (f"Cache de réponses — {s['hit_rate']:.1%} de hits ({s['hits']}/{s['hits'] + s['misses']}), "
+                f"hit {s['avg_hit_s'] * 1000:.1f} ms vs miss {s['avg_miss_s'] * 1000:.0f} ms, "
+                f"temps économisé ≈ {s['saved_s']:.1f} s, {s['size']} entrées, {s['invalidated']} invalidées, {s['stale']} écartées (sources modifiées)")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+bulk_ingest.py
+Ingestion d'un répertoire de PDF dans Milvus, reprenable.
+
+Les PDF de l'arborescence sont ingérés à plusieurs en parallèle (`--files`),
+chacun par le pipeline d'ingest_pdf. Un budget global borne les appels TEI
+(`--embed_concurrency`) et les insertions Milvus (`--insert_concurrency`)
+simultanés, quel que soit le nombre de fichiers en cours. Flush et compactage
+sont faits une seule fois, en fin d'exécution.
+
+Manifeste (JSON, écrit atomiquement à chaque changement d'état d'un fichier) :
+    {"root", "collection", "files": {chemin: {"status", "chunks", "sha256",
+     "size", "mtime", "error", "updated_at"}}}
+Reprise : un fichier "done" inchangé (taille et mtime, sinon sha256) est
+ignoré ; un fichier "running" (exécution interrompue), "failed" ou modifié
+est réingéré de façon incrémentale (cf. ingest_file) : les chunks déjà
+insérés sont retrouvés par chunk_hash, seuls les manquants sont embeddés.
+
+Usage :
+    python -m src.tools.RAG.bulk_ingest /data/pdfs --files 4 --embed_concurrency 2
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from src.tools.clients import COLLECTION_NAME, TEI_URL, get_embeddings
+from src.tools.RAG.pdf_loader import IngestBudget, connect_milvus, finalize_collection, ingest_file, open_vectorstore
+from src.tools.RAG.source_fingerprints import file_sha256
+
+log = logging.getLogger(__name__)
+
+MANIFEST_PATH = Path(__file__).resolve().parents[3] / "data" / "ingest_manifest.json"
+
+
+def find_pdfs(root: Path) -> list[Path]:
+    return sorted(p.resolve() for p in root.rglob("*") if p.is_file() and p.suffix.lower() == ".pdf")
+
+
+class Manifest:
+    """État par fichier d'une ingestion de répertoire, partagé par les threads."""
+
+    def __init__(self, path: Path, root: Path, collection: str, restart: bool = False):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if self.path.exists() and not restart:
+            with open(self.path, encoding="utf-8") as f:
+                self.data = json.load(f)
+            if self.data.get("collection") != collection:
+                sys.exit(f"[ERROR] Le manifeste {self.path} correspond à une autre collection : "
+                         f"{self.data.get('collection')}")
+            self.data["root"] = str(root)
+        else:
+            self.data = {"root": str(root), "collection": collection, "files": {}}
+
+    def get(self, path: str) -> dict:
+        with self._lock:
+            return dict(self.data["files"].get(path, {}))
+
+    def update(self, path: str, **fields):
+        with self._lock:
+            entry = self.data["files"].setdefault(path, {})
+            entry.update(fields, updated_at=time.time())
+            self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+def _process_file(pdf_path: Path, manifest: Manifest, embedding, vectorstore, budget: IngestBudget,
+                  parse_workers: int, collection_name: str) -> dict:
+    source = str(pdf_path)
+    entry = manifest.get(source)
+    stat = pdf_path.stat()
+    if entry.get("status") == "done" and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+        return {"status": "skipped", "chunks": 0}
+    sha256 = file_sha256(pdf_path)
+    if entry.get("status") == "done" and entry.get("sha256") == sha256:
+        # Fichier touché mais contenu identique
+        manifest.update(source, size=stat.st_size, mtime=stat.st_mtime)
+        return {"status": "skipped", "chunks": 0}
+
+    if entry:
+        log.info(f"[RAG] {pdf_path.name} ({entry.get('status')}) : réingestion incrémentale")
+    manifest.update(source, status="running", chunks=0, sha256=sha256,
+                    size=stat.st_size, mtime=stat.st_mtime, error=None)
+    try:
+        result = ingest_file(pdf_path, embedding, vectorstore, parse_workers, budget, collection_name)
+    except Exception as e:
+        result = {"ok": False, "chunks": 0, "msg": f"{type(e).__name__}: {e}"}
+    if result["ok"]:
+        manifest.update(source, status="done", chunks=result["chunks"] + result["kept"])
+        return {"status": "skipped" if result["unchanged"] else "done", "chunks": result["chunks"]}
+    manifest.update(source, status="failed", chunks=result.get("chunks", 0), error=result["msg"])
+    return {"status": "failed", "chunks": result.get("chunks", 0), "msg": result["msg"]}
+
+
+def ingest_directory(root: str,
+                     files: int = 4,
+                     embed_concurrency: int = 2,
+                     insert_concurrency: int = 1,
+                     parse_workers: int = 1,
+                     manifest_path: Path = MANIFEST_PATH,
+                     restart: bool = False,
+                     collection_name: str = COLLECTION_NAME) -> dict:
+    """
+    Ingère tous les PDF de `root` (récursif). Retourne
+    {ok, files: {done, skipped, failed}, chunks, failed: {chemin: msg}, total_s, chunks_per_s}.
+    """
+    root_path = Path(root).resolve()
+    pdfs = find_pdfs(root_path)
+    manifest = Manifest(manifest_path, root_path, collection_name, restart)
+    log.info(f"[RAG] {len(pdfs)} PDF sous {root_path} (manifeste {manifest.path})")
+
+    connect_milvus()
+    log.info(f"[RAG] Initialisation embeddings TEI @ {TEI_URL}")
+    embedding = get_embeddings()
+    vectorstore = open_vectorstore(embedding, collection_name)
+    budget = IngestBudget(embed_concurrency, insert_concurrency)
+
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+    failed = {}
+    chunks = 0
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=files, thread_name_prefix="bulk-ingest") as pool:
+        futures = {pool.submit(_process_file, p, manifest, embedding, vectorstore, budget,
+                               parse_workers, collection_name): p for p in pdfs}
+        for i, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = {"status": "failed", "chunks": 0, "msg": f"{type(e).__name__}: {e}"}
+                manifest.update(str(path), status="failed", error=outcome["msg"])
+            counts[outcome["status"]] += 1
+            chunks += outcome["chunks"]
+            if outcome["status"] == "failed":
+                failed[str(path)] = outcome["msg"]
+            log.info(f"[RAG] [{i}/{len(pdfs)}] {path.name} : {outcome['status']} ({outcome['chunks']} chunks)")
+    total = time.perf_counter() - t_start
+
+    if counts["done"] or counts["failed"]:
+        finalize_collection(collection_name)
+    log.info(f"[RAG] {embedding.report()}")
+    return {
+        "ok": not failed,
+        "files": counts,
+        "chunks": chunks,
+        "failed": failed,
+        "total_s": total,
+        "chunks_per_s": chunks / total if total else 0.0,
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Ingestion reprenable d'un répertoire de PDF dans Milvus")
+    parser.add_argument("root", type=str, help="Répertoire parcouru récursivement")
+    parser.add_argument("--files", type=int, default=4, help="Fichiers ingérés en parallèle")
+    parser.add_argument("--embed_concurrency", type=int, default=2, help="Appels TEI simultanés (tous fichiers)")
+    parser.add_argument("--insert_concurrency", type=int, default=1,
+                        help="Insertions Milvus simultanées (tous fichiers)")
+    parser.add_argument("--parse_workers", type=int, default=1, help="Processus d'extraction par fichier")
+    parser.add_argument("--manifest", type=str, default=str(MANIFEST_PATH))
+    parser.add_argument("--restart", action="store_true", help="Ignore le manifeste existant")
+    args = parser.parse_args()
+
+    result = ingest_directory(args.root, args.files, args.embed_concurrency, args.insert_concurrency,
+                              args.parse_workers, Path(args.manifest), args.restart)
+    f = result["files"]
+    print(f"[OK] {f['done']} ingérés, {f['skipped']} inchangés, {f['failed']} en échec — "
+          f"{result['chunks']} chunks en {result['total_s']:.1f} s ({result['chunks_per_s']:.1f} chunks/s)")
+    for path, msg in result["failed"].items():
+        print(f"[ERROR] {path} : {msg}")
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
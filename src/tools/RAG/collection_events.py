@@ -0,0 +1,85 @@
+# src/tools/RAG/collection_events.py
+"""
+Journal des modifications d'une collection Milvus, partagé entre processus
+(UI, ingestion, MilvusManager lancé à part).
+
+Chaque écriture dans la collection (ingestion d'un PDF, suppression) ajoute
+une ligne JSON {"ts", "op", "sources"} à data/rag_events/<collection>.jsonl.
+Les caches de la chaîne RAG suivent ce journal avec un CollectionWatcher :
+un stat() par consultation, lecture des seules lignes nouvelles.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+EVENTS_DIR = Path(__file__).resolve().parents[3] / "data" / "rag_events"
+
+# Source spéciale : toute la collection a pu changer (journal tronqué ou illisible)
+ALL_SOURCES = "*"
+
+
+def _journal(collection: str) -> Path:
+    return EVENTS_DIR / f"{collection}.jsonl"
+
+
+def notify_collection_changed(collection: str, sources: list[str], op: str = "ingest"):
+    """À appeler après toute écriture dans la collection (sources = valeurs de source_path)."""
+    path = _journal(collection)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps({"ts": time.time(), "op": op, "sources": list(sources)}, ensure_ascii=False) + "\n"
+    # Ajout en une écriture O_APPEND : atomique entre processus pour une ligne courte.
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+class CollectionWatcher:
+    """Suit le journal d'une collection depuis sa création."""
+
+    def __init__(self, collection: str):
+        self.path = _journal(collection)
+        self._offset = self._size()
+        self._lock = threading.Lock()
+
+    def _size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def poll(self) -> Optional[set[str]]:
+        """
+        Sources modifiées depuis le dernier appel, None si rien n'a changé.
+        Contient ALL_SOURCES si l'étendue du changement est inconnue.
+        """
+        size = self._size()
+        if size == self._offset:
+            return None
+        with self._lock:
+            if size < self._offset:
+                self._offset = size
+                return {ALL_SOURCES}
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(self._offset)
+                    data = f.read(size - self._offset)
+            except OSError:
+                return {ALL_SOURCES}
+            # Ligne incomplète en fin (écriture en cours) : relue au prochain appel
+            complete = data[:data.rfind(b"\n") + 1]
+            if not complete:
+                return None
+            self._offset += len(complete)
+            changed = set()
+            for line in complete.splitlines():
+                try:
+                    changed.update(json.loads(line)["sources"] or [ALL_SOURCES])
+                except (ValueError, KeyError):
+                    changed.add(ALL_SOURCES)
+            return changed
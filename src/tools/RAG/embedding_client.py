@@ -0,0 +1,277 @@
+# src/tools/RAG/embedding_client.py
+"""
+Client d'embeddings TEI (API native /embed) sur les pools HTTP partagés de
+src.tools.clients : connexions keep-alive réutilisées entre chains, et
+variantes async sans thread par appel.
+
+- Plusieurs requêtes en vol (`concurrency`) : un appel est découpé en lots
+  envoyés en parallèle, résultats rendus dans l'ordre des textes. En
+  synchrone, la borne vaut pour toutes les requêtes du client, tous appels
+  et threads confondus ; en async, par appel.
+- Taille de lot ajustée à la latence observée : agrandie tant qu'un lot
+  complet répond en moins de `target_latency_s / 2`, réduite au-delà de
+  1.5 × `target_latency_s` ou en cas de surcharge. Bornée par les limites
+  annoncées par TEI (/info : max_client_batch_size) ; un 413 coupe le lot
+  en deux et abaisse la borne.
+- Surcharge (429, 503) ou connexion perdue : nouvel essai après un délai
+  exponentiel avec gigue (ou Retry-After), `max_retries` fois au plus.
+- `stats()` / `report()` : débit en chunks/s (sur le temps où au moins un
+  appel est en cours), requêtes, relances, taille de lot courante.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+from langchain_core.embeddings import Embeddings
+
+from src.tools.clients import TEI_URL, get_async_http_client, get_http_client
+
+# Taille max par requête (MAX_CLIENT_BATCH_SIZE côté TEI, cf. TEI/docker-compose.yml)
+MAX_BATCH_SIZE = 512
+MIN_BATCH_SIZE = 8
+OVERLOAD_STATUS = (429, 503)
+
+
+class _Overloaded(Exception):
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"TEI surchargé ({response.status_code})")
+        self.response = response
+
+
+class TEIEmbeddings(Embeddings):
+    def __init__(self,
+                 url: str = TEI_URL,
+                 batch_size: int = 64,
+                 concurrency: int = 4,
+                 target_latency_s: float = 1.0,
+                 max_batch_size: int = MAX_BATCH_SIZE,
+                 max_retries: int = 6,
+                 backoff_s: float = 0.5):
+        """
+        Args:
+            url             : serveur TEI (partagé par l'ingestion et la recherche)
+            batch_size      : taille de lot initiale, ajustée ensuite
+            concurrency     : requêtes en vol max (tous appels synchrones confondus)
+            target_latency_s: latence visée par requête
+            max_batch_size  : borne haute des lots (abaissée par /info ou un 413)
+            max_retries     : essais supplémentaires sur surcharge
+            backoff_s       : premier délai avant nouvel essai (doublé à chaque fois)
+        """
+        self.url = url.rstrip("/")
+        self.batch_size = min(batch_size, max_batch_size)
+        self.max_batch_size = max_batch_size
+        self.concurrency = concurrency
+        self.target_latency_s = target_latency_s
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self._limits_checked = False
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(concurrency)   # requêtes synchrones en vol
+        self._lock = threading.Lock()
+        self._stats = {"texts": 0, "requests": 0, "retries": 0, "request_s": 0.0, "busy_s": 0.0}
+        self._active = 0
+        self._active_since = 0.0
+
+    # --- Limites du serveur et taille de lot --------------------------------- #
+
+    def _apply_info(self, info: dict):
+        with self._lock:
+            self._limits_checked = True
+            limit = info.get("max_client_batch_size")
+            if limit:
+                self.max_batch_size = min(self.max_batch_size, int(limit))
+                self.batch_size = min(self.batch_size, self.max_batch_size)
+
+    def _check_limits(self):
+        if self._limits_checked:
+            return
+        try:
+            r = get_http_client().get(f"{self.url}/info", timeout=5.0)
+            info = r.json() if r.is_success else {}
+        except (httpx.HTTPError, ValueError):
+            info = {}
+        self._apply_info(info)
+
+    async def _acheck_limits(self):
+        if self._limits_checked:
+            return
+        try:
+            r = await get_async_http_client().get(f"{self.url}/info", timeout=5.0)
+            info = r.json() if r.is_success else {}
+        except (httpx.HTTPError, ValueError):
+            info = {}
+        self._apply_info(info)
+
+    def _tune(self, size: int, latency: float):
+        with self._lock:
+            self._stats["texts"] += size
+            self._stats["requests"] += 1
+            self._stats["request_s"] += latency
+            if latency > 1.5 * self.target_latency_s:
+                self.batch_size = max(MIN_BATCH_SIZE, int(self.batch_size * 0.7))
+            elif latency < 0.5 * self.target_latency_s and size >= self.batch_size:
+                self.batch_size = min(self.max_batch_size, int(self.batch_size * 1.5) + 1)
+
+    def _too_large(self, size: int):
+        with self._lock:
+            self.max_batch_size = max(1, min(self.max_batch_size, size // 2))
+            self.batch_size = min(self.batch_size, self.max_batch_size)
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        with self._lock:
+            self._stats["retries"] += 1
+            self.batch_size = max(MIN_BATCH_SIZE, self.batch_size // 2)
+        retry_after = error.response.headers.get("retry-after") if isinstance(error, _Overloaded) else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff_s * 2 ** attempt * (0.5 + random.random())
+
+    @staticmethod
+    def _check(r: httpx.Response):
+        if r.status_code in OVERLOAD_STATUS:
+            raise _Overloaded(r)
+        r.raise_for_status()
+
+    # --- Une requête (avec relances) ----------------------------------------- #
+
+    def _embed_batch(self, batch: list[str], abort: threading.Event = None) -> list[list[float]]:
+        abort = abort or threading.Event()      # levé par embed_documents si un autre lot échoue
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._slots:
+                    t0 = time.perf_counter()
+                    r = get_http_client().post(f"{self.url}/embed", json={"inputs": batch, "truncate": True})
+                    latency = time.perf_counter() - t0
+                if r.status_code == 413 and len(batch) > 1:
+                    self._too_large(len(batch))
+                    half = len(batch) // 2
+                    return self._embed_batch(batch[:half], abort) + self._embed_batch(batch[half:], abort)
+                self._check(r)
+            except (_Overloaded, httpx.TransportError) as e:
+                if attempt == self.max_retries or abort.wait(self._retry_delay(attempt, e)):
+                    raise
+                continue
+            self._tune(len(batch), latency)
+            return r.json()
+
+    async def _aembed_batch(self, batch: list[str]) -> list[list[float]]:
+        client = get_async_http_client()
+        for attempt in range(self.max_retries + 1):
+            t0 = time.perf_counter()
+            try:
+                r = await client.post(f"{self.url}/embed", json={"inputs": batch, "truncate": True})
+                if r.status_code == 413 and len(batch) > 1:
+                    self._too_large(len(batch))
+                    half = len(batch) // 2
+                    return await self._aembed_batch(batch[:half]) + await self._aembed_batch(batch[half:])
+                self._check(r)
+            except (_Overloaded, httpx.TransportError) as e:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt, e))
+                continue
+            self._tune(len(batch), time.perf_counter() - t0)
+            return r.json()
+
+    # --- Appels -------------------------------------------------------------- #
+
+    def _busy(self, delta: int):
+        """Temps d'activité : au moins un appel en cours (appels simultanés comptés une fois)."""
+        with self._lock:
+            now = time.perf_counter()
+            if self._active == 0 and delta > 0:
+                self._active_since = now
+            self._active += delta
+            if self._active == 0:
+                self._stats["busy_s"] += now - self._active_since
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="tei-embed")
+        return self._executor
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        self._check_limits()
+        self._busy(1)
+        try:
+            if len(texts) <= self.batch_size:
+                return self._embed_batch(texts)
+            # Lots pris à la taille courante au moment de l'envoi : l'ajustement agit dans l'appel
+            results, pending, start = {}, {}, 0
+            abort = threading.Event()
+            try:
+                while start < len(texts) or pending:
+                    while start < len(texts) and len(pending) < self.concurrency:
+                        batch = texts[start:start + self.batch_size]
+                        pending[self._pool().submit(self._embed_batch, batch, abort)] = start
+                        start += len(batch)
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[pending.pop(future)] = future.result()
+            finally:
+                # Échec d'un lot : les autres sont annulés ou arrêtés avant de relancer
+                # l'exception, pour ne pas garder de places TEI au-delà de l'appel
+                if pending:
+                    abort.set()
+                    for future in pending:
+                        future.cancel()
+                    wait(pending)
+            return [v for offset in sorted(results) for v in results[offset]]
+        finally:
+            self._busy(-1)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        await self._acheck_limits()
+        self._busy(1)
+        try:
+            results, pending, start = {}, {}, 0
+            try:
+                while start < len(texts) or pending:
+                    while start < len(texts) and len(pending) < self.concurrency:
+                        batch = texts[start:start + self.batch_size]
+                        pending[asyncio.ensure_future(self._aembed_batch(batch))] = start
+                        start += len(batch)
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        results[pending.pop(task)] = task.result()
+            finally:
+                for task in pending:
+                    task.cancel()
+            return [v for offset in sorted(results) for v in results[offset]]
+        finally:
+            self._busy(-1)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    # --- Statistiques -------------------------------------------------------- #
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            if self._active:
+                s["busy_s"] += time.perf_counter() - self._active_since
+            batch_size, max_batch_size = self.batch_size, self.max_batch_size
+        return {"texts": s["texts"], "requests": s["requests"], "retries": s["retries"],
+                "chunks_per_s": s["texts"] / s["busy_s"] if s["busy_s"] else 0.0,
+                "avg_latency_s": s["request_s"] / s["requests"] if s["requests"] else 0.0,
+                "busy_s": s["busy_s"], "batch_size": batch_size, "max_batch_size": max_batch_size}
+
+    def report(self) -> str:
+        s = self.stats()
+        return (f"Embeddings TEI — {s['texts']} chunks en {s['busy_s']:.1f} s ({s['chunks_per_s']:.1f} chunks/s), "
+                f"{s['requests']} requêtes ({s['avg_latency_s'] * 1000:.0f} ms en moyenne), "
+                f"{s['retries']} relances, lot {s['batch_size']}/{s['max_batch_size']}")
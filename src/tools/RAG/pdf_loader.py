@@ -1,137 +1,434 @@
+import json
 import logging
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
 from pathlib import Path
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface.embeddings import HuggingFaceEndpointEmbeddings
 from langchain_milvus.vectorstores.milvus import Milvus
 from pymilvus import connections, utility, Collection
 
+from src.tools.clients import COLLECTION_NAME, MILVUS_HOST, MILVUS_PORT, TEI_URL, get_embeddings
+from src.tools.RAG.collection_events import notify_collection_changed
+from src.tools.RAG.pdf_parallel import iter_chunk_ranges, make_splitter
+from src.tools.RAG.source_fingerprints import (chunk_hash, file_sha256, forget_fingerprint, get_fingerprint,
+                                               record_fingerprint)
+
 log = logging.getLogger(__name__)
 
 
-# Taille max par lot d'envoi vers TEI (doit respecter MAX_CLIENT_BATCH_SIZE côté TEI)
+# Chunks par lot du pipeline (redécoupé par TEIEmbeddings selon la latence et les limites TEI)
 MAX_BATCH_SIZE = 512
+# Profondeur des files entre étapes du pipeline (pages, puis lots de chunks)
+PAGE_QUEUE_DEPTH = 64
+BATCH_QUEUE_DEPTH = 2
+# Clé primaire créée par langchain_milvus, suppressions par lots de DELETE_BATCH_SIZE clés
+PRIMARY_FIELD = "pk"
+DELETE_BATCH_SIZE = 1000
+_DONE = object()
+
+
+class IngestBudget:
+    """Appels TEI et insertions Milvus simultanés max, partagés par plusieurs ingestions."""
+
+    def __init__(self, embed_concurrency: int = 1, insert_concurrency: int = 1):
+        self.embed = threading.BoundedSemaphore(embed_concurrency)
+        self.insert = threading.BoundedSemaphore(insert_concurrency)
+
+
+def _identity(chunks):
+    return chunks
 
-def ingest_pdf(path: str) -> dict:
+
+class _PipelineError(Exception):
+    def __init__(self, stage: str, error: Exception, inserted: int):
+        super().__init__(f"{stage}: {error}")
+        self.stage, self.error, self.inserted = stage, error, inserted
+
+
+def _run_pipeline(pages, split, embedding, vectorstore, source_path: str, budget=None, known=None) -> dict:
     """
-    Ingestion d'un PDF dans Milvus via TEI avec batching.
-    Retourne un dict: {ok: bool, chunks: int, collection: str, msg: str}
+    Quatre étapes dans des threads, reliées par des files bornées :
+    pages -> chunks (lots de MAX_BATCH_SIZE) -> embeddings TEI -> insertion Milvus.
+    `pages` produit des (nombre de pages, élément) et `split(élément)` ses chunks :
+    une page et le splitter (séquentiel), ou une plage déjà découpée par les
+    workers (parallèle, le temps "parse" est alors l'attente des workers).
+    Les temps par étape comptent le travail seul (hors attente sur les files
+    et sur `budget`, qui borne les appels TEI / Milvus simultanés entre fichiers).
+    Chaque chunk reçoit source_path et chunk_hash (sha256 du texte) ; ceux dont
+    le hash figure dans le Counter `known` (déjà en base) sont décomptés de
+    `known` et ni embeddés ni insérés.
     """
-    pdf_path = Path(path)
-    if not pdf_path.exists():
-        return {
-            "ok": False,
-            "chunks": 0,
-            "collection": "rag_demo",
-            "msg": f"PDF introuvable: {pdf_path}"
-        }
+    budget = budget or IngestBudget()
+    pages_q = queue.Queue(PAGE_QUEUE_DEPTH)
+    chunks_q = queue.Queue(BATCH_QUEUE_DEPTH)
+    vectors_q = queue.Queue(BATCH_QUEUE_DEPTH)
+    stop = threading.Event()
+    busy = {"parse_s": 0.0, "chunk_s": 0.0, "embed_s": 0.0, "insert_s": 0.0}
+    counts = {"pages": 0, "chunks": 0, "kept": 0}
+    errors = []
 
-    collection_name = "rag_demo"
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                pass
 
-    # 1) Connexion Milvus
-    log.info(f"[RAG] Connexion à Milvus sur milvus-standalone:19530…")
+    def items(q):
+        while not stop.is_set():
+            try:
+                item = q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def stage(name, body, out_q):
+        def run():
+            try:
+                body()
+            except Exception as e:
+                errors.append((name, e))
+                stop.set()
+            finally:
+                if out_q is not None:
+                    put(out_q, _DONE)
+        return threading.Thread(target=run, name=f"ingest-{name}", daemon=True)
+
+    def parse():
+        items_in = iter(pages)
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            item = next(items_in, _DONE)
+            busy["parse_s"] += time.perf_counter() - t0
+            if item is _DONE:
+                return
+            n_pages, page = item
+            counts["pages"] += n_pages
+            put(pages_q, page)
+
+    def chunk():
+        batch = []
+        for page in items(pages_q):
+            t0 = time.perf_counter()
+            for d in split(page):
+                d.metadata = dict(d.metadata or {})
+                d.metadata["source_path"] = source_path
+                d.metadata["chunk_hash"] = digest = chunk_hash(d.page_content)
+                if known is not None and known[digest] > 0:
+                    known[digest] -= 1
+                    counts["kept"] += 1
+                    continue
+                batch.append(d)
+            busy["chunk_s"] += time.perf_counter() - t0
+            while len(batch) >= MAX_BATCH_SIZE:
+                put(chunks_q, batch[:MAX_BATCH_SIZE])
+                batch = batch[MAX_BATCH_SIZE:]
+        if batch and not stop.is_set():
+            put(chunks_q, batch)
+
+    def embed():
+        for batch in items(chunks_q):
+            with budget.embed:
+                t0 = time.perf_counter()
+                vectors = embedding.embed_documents([d.page_content for d in batch])
+                busy["embed_s"] += time.perf_counter() - t0
+            put(vectors_q, (batch, vectors))
+
+    def insert():
+        for batch, vectors in items(vectors_q):
+            with budget.insert:
+                t0 = time.perf_counter()
+                vectorstore.add_embeddings(
+                    texts=[d.page_content for d in batch],
+                    embeddings=vectors,
+                    metadatas=[d.metadata for d in batch],
+                )
+                busy["insert_s"] += time.perf_counter() - t0
+            counts["chunks"] += len(batch)
+            log.info(f"[RAG] Lot inséré ({len(batch)} chunks, total {counts['chunks']})")
+
+    t_start = time.perf_counter()
+    threads = [stage("parse", parse, pages_q), stage("chunk", chunk, chunks_q),
+               stage("embed", embed, vectors_q), stage("insert", insert, None)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - t_start
+
+    if errors:
+        name, error = errors[0]
+        raise _PipelineError(name, error, counts["chunks"])
+    return {
+        "pages": counts["pages"],
+        "chunks": counts["chunks"],
+        "kept": counts["kept"],
+        "timings": {**busy, "total_s": total},
+        "chunks_per_s": counts["chunks"] / total if total else 0.0,
+    }
+
+
+def connect_milvus():
+    """Connexion alias "default" (réutilisée par les vector stores et Collection)."""
+    log.info(f"[RAG] Connexion à Milvus sur {MILVUS_HOST}:{MILVUS_PORT}…")
+    connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
+    log.info(f"[RAG] Milvus connecté. Version: {utility.get_server_version()}")
+
+
+def open_vectorstore(embedding, collection_name: str = COLLECTION_NAME):
+    """VectorStore Milvus (réutilise la connexion alias "default")."""
+    log.info(f"[RAG] Création VectorStore Milvus collection={collection_name} (alias=default)")
+    return Milvus(
+        embedding_function=embedding,
+        collection_name=collection_name,
+        connection_args={"alias": "default"}
+    )
+
+
+def _source_expr(source_path: str) -> str:
+    # Littéral Milvus entre guillemets : \ et " doivent être échappés
+    escaped = source_path.replace("\\", "\\\\").replace('"', '\\"')
+    return f'source_path == "{escaped}"'
+
+
+def _stored_chunks(collection_name: str, source_path: str) -> list[dict]:
+    """Chunks en base d'un fichier : [{pk, chunk_hash}]."""
+    if not utility.has_collection(collection_name):
+        return []
+    col = Collection(collection_name)
+    col.load()
+    it = col.query_iterator(batch_size=DELETE_BATCH_SIZE, expr=_source_expr(source_path),
+                            output_fields=[PRIMARY_FIELD, "chunk_hash"])
+    rows = []
+    try:
+        while batch := it.next():
+            rows.extend(batch)
+    finally:
+        it.close()
+    return rows
+
+
+def _stored_count(collection_name: str, source_path: str) -> int:
+    if not utility.has_collection(collection_name):
+        return 0
+    col = Collection(collection_name)
+    col.load()
+    return col.query(expr=_source_expr(source_path), output_fields=["count(*)"])[0]["count(*)"]
+
+
+def _delete_pks(collection_name: str, pks: list):
+    col = Collection(collection_name)
+    for i in range(0, len(pks), DELETE_BATCH_SIZE):
+        col.delete(f"{PRIMARY_FIELD} in {json.dumps(pks[i:i + DELETE_BATCH_SIZE])}")
+
+
+def ingest_file(pdf_path: Path, embedding, vectorstore, workers: int = 1, budget=None,
+                collection_name: str = COLLECTION_NAME) -> dict:
+    """
+    Pipeline d'un PDF (sans flush ni compactage, cf. finalize_collection).
+    `budget` : IngestBudget partagé entre fichiers ingérés en parallèle.
+
+    Incrémental : un fichier d'empreinte inchangée n'est pas relu ; sinon seuls
+    les chunks dont le texte (chunk_hash) est absent de la base sont embeddés
+    et insérés, puis ceux qui ont disparu du fichier sont supprimés. Un chunk
+    conservé garde ses métadonnées d'origine (page).
+
+    Retourne {ok, chunks (insérés), kept, deleted, unchanged, collection, msg}
+    + pages, timings, chunks_per_s.
+    """
+    source = str(pdf_path)
     try:
-        connections.connect(alias="default", host="milvus-standalone", port="19530")
-        log.info(f"[RAG] Milvus connecté. Version: {utility.get_server_version()}")
+        source_hash = file_sha256(pdf_path)
+        fingerprint = get_fingerprint(collection_name, source)
+        if (fingerprint and fingerprint["sha256"] == source_hash
+                and _stored_count(collection_name, source) == fingerprint["chunks"]):
+            log.info(f"[RAG] {pdf_path.name} inchangé ({fingerprint['chunks']} chunks en base), ignoré")
+            return {"ok": True, "chunks": 0, "kept": fingerprint["chunks"], "deleted": 0, "unchanged": True,
+                    "collection": collection_name, "msg": "PDF inchangé", "pages": 0,
+                    "timings": {}, "chunks_per_s": 0.0}
+
+        try:
+            stored = _stored_chunks(collection_name, source)
+        except Exception as e:
+            # Collection créée avant chunk_hash : pas de comparaison possible, remplacement complet
+            log.warning(f"[RAG] chunk_hash illisible dans {collection_name} ({e}), "
+                        f"anciens chunks de {pdf_path.name} supprimés")
+            delete_source(source, collection_name)
+            stored = []
     except Exception as e:
-        log.error(f"[RAG] Erreur connexion Milvus: {e}")
+        log.error(f"[RAG] Erreur avant ingestion de {pdf_path.name}: {e}")
         return {
             "ok": False,
             "chunks": 0,
             "collection": collection_name,
-            "msg": f"Milvus unreachable: {e}"
+            "msg": f"Pre-ingest check failed: {e}"
         }
+    pks_by_hash = defaultdict(list)
+    for row in stored:
+        pks_by_hash[row.get("chunk_hash")].append(row[PRIMARY_FIELD])
+    known = Counter({h: len(pks) for h, pks in pks_by_hash.items()})
 
-    # 2) Embeddings TEI
-    log.info(f"[RAG] Initialisation embeddings TEI @ http://tei:80")
-    embedding = HuggingFaceEndpointEmbeddings(model="http://tei:80")
+    log.info(f"[RAG] Ingestion en flux de {pdf_path.name} (lots de {MAX_BATCH_SIZE} chunks max, "
+             f"{workers} worker(s) d'extraction, {len(stored)} chunks déjà en base)…")
+    if workers > 1:
+        pages = iter_chunk_ranges(source, workers)
+        split = _identity
+    else:
+        # Découpage page par page : mêmes chunks que split_documents sur le document entier
+        pages = ((1, page) for page in PyPDFLoader(source).lazy_load())
+        splitter = make_splitter()
 
-    # 3) Chargement PDF
-    log.info(f"[RAG] Chargement PDF: {pdf_path.name}")
-    loader = PyPDFLoader(str(pdf_path))
-    docs = loader.load()
+        def split(page):
+            return splitter.split_documents([page])
+    try:
+        result = _run_pipeline(pages, split, embedding, vectorstore, source, budget, known)
+    except _PipelineError as e:
+        log.error(f"[RAG] Erreur ingestion ({e.stage}): {e.error}")
+        if e.inserted:
+            # Chunks insérés conservés : retrouvés par chunk_hash à la prochaine ingestion
+            forget_fingerprint(collection_name, source)
+            notify_collection_changed(collection_name, [source], op="ingest")
+        return {
+            "ok": False,
+            "chunks": e.inserted,
+            "collection": collection_name,
+            "msg": f"Ingestion failed ({e.stage}): {e.error}"
+        }
 
-    # 4) Chunking
-    log.info(f"[RAG] Chunking en cours…")
-    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
-    chunks = splitter.split_documents(docs)
-    log.info(f"[RAG] Nombre de chunks générés: {len(chunks)}")
+    # Chunks en base absents du fichier (texte modifié ou supprimé ; chunk_hash manquant)
+    stale = [pk for h, n in known.items() if n > 0 for pk in pks_by_hash[h][:n]]
+    total_inserted = result["chunks"]
+    log.info(f"[RAG] Insertion terminée ({pdf_path.name}). Insérés: {total_inserted}, "
+             f"conservés: {result['kept']}, à supprimer: {len(stale)} "
+             f"({result['pages']} pages, {result['chunks_per_s']:.1f} chunks/s)")
 
-    if not chunks:
+    if not total_inserted and not result["kept"]:
         return {
             "ok": False,
-            "chunks": 0,
             "collection": collection_name,
-            "msg": "Aucun chunk généré"
+            "msg": "Aucun chunk généré",
+            **result,
+        }
+    try:
+        if stale:
+            _delete_pks(collection_name, stale)
+        record_fingerprint(collection_name, source, source_hash, total_inserted + result["kept"])
+    except Exception as e:
+        log.error(f"[RAG] Erreur suppression des chunks obsolètes de {pdf_path.name}: {e}")
+        notify_collection_changed(collection_name, [source], op="ingest")
+        return {
+            **result,
+            "ok": False,
+            "collection": collection_name,
+            "msg": f"Stale chunk cleanup failed: {e}"
         }
+    if total_inserted or stale:
+        # Invalide les résultats en cache de la chaîne RAG (tous processus)
+        notify_collection_changed(collection_name, [source], op="ingest")
+        msg = "Chunks insérés"
+    else:
+        msg = "Aucun chunk modifié"
+    return {"ok": True, "collection": collection_name, "msg": msg,
+            "deleted": len(stale), "unchanged": not (total_inserted or stale), **result}
 
-    for d in chunks:
-        d.metadata = dict(d.metadata or {})
-        d.metadata["source_path"] = str(pdf_path)
 
-    # 5) VectorStore Milvus (réutilise la connexion alias "default")
-    log.info(f"[RAG] Création VectorStore Milvus collection={collection_name} (alias=default)")
-    vectorstore = Milvus(
-        embedding_function=embedding,
-        collection_name=collection_name,
-        connection_args={"alias": "default"}
-    )
+def delete_source(source_path: str, collection_name: str = COLLECTION_NAME):
+    """Supprime les chunks d'un fichier."""
+    forget_fingerprint(collection_name, source_path)
+    if not utility.has_collection(collection_name):
+        return
+    Collection(collection_name).delete(_source_expr(source_path))
+    notify_collection_changed(collection_name, [source_path], op="delete")
 
-    # 6) Insertion par batch
-    try:
-        log.info(f"[RAG] Insertion des chunks en batch de {MAX_BATCH_SIZE} max…")
-        total_inserted = 0
-        for i in range(0, len(chunks), MAX_BATCH_SIZE):
-            batch = chunks[i:i + MAX_BATCH_SIZE]
-            vectorstore.add_documents(batch)
-            total_inserted += len(batch)
-            log.info(f"[RAG] Batch {i//MAX_BATCH_SIZE + 1} inséré ({len(batch)} chunks)")
-
-        log.info(f"[RAG] Insertion terminée. Total inséré: {total_inserted}")
-    except Exception as e:
-        log.error(f"[RAG] Erreur insertion Milvus: {e}")
+
+def finalize_collection(collection_name: str = COLLECTION_NAME) -> dict:
+    """Vérification de la collection puis flush + compactage (une fois par ingestion)."""
+    if not utility.has_collection(collection_name):
+        log.error(f"[RAG] Collection absente après ingestion.")
+        return {"ok": False, "msg": "Collection missing post-ingest"}
+
+    col = Collection(collection_name)
+    col.load()
+    total_entities = col.num_entities
+    log.info(f"[RAG] Vérif Milvus: {total_entities} entités présentes dans {collection_name}")
+
+    log.info(f"[RAG] Flush de la collection {collection_name}…")
+    col.flush()
+    log.info(f"[RAG] Compactage de la collection {collection_name}…")
+    col.compact()
+    log.info(f"[RAG] Flush + compact terminés pour {collection_name}")
+    return {"ok": True, "entities": total_entities}
+
+
+def ingest_pdf(path: str, workers: int = 1) -> dict:
+    """
+    Ingestion d'un PDF dans Milvus via TEI, en flux : lecture des pages,
+    chunking, embeddings et insertion se recouvrent (files bornées entre
+    étapes : la mémoire dépend de leur profondeur, pas de la taille du PDF).
+    Retourne un dict: {ok: bool, chunks: int, collection: str, msg: str,
+    pages: int, timings: {étape: s}, chunks_per_s: float, kept: int,
+    deleted: int, unchanged: bool}
+
+    Réingérer un PDF ne duplique rien : inchangé, il est ignoré ; modifié,
+    seuls ses chunks nouveaux sont insérés et ses chunks disparus supprimés.
+
+    workers > 1 : extraction et chunking en parallèle dans `workers` processus
+    (plages de pages, cf. pdf_parallel), chunks identiques au mode séquentiel.
+    """
+    pdf_path = Path(path)
+    collection_name = COLLECTION_NAME
+    if not pdf_path.exists():
         return {
             "ok": False,
-            "chunks": total_inserted,
+            "chunks": 0,
             "collection": collection_name,
-            "msg": f"Ingestion failed: {e}"
+            "msg": f"PDF introuvable: {pdf_path}"
         }
 
-        # 7) Vérification collection + compactage
+    # 1) Connexion Milvus
     try:
-        if not utility.has_collection(collection_name):
-            log.error(f"[RAG] Collection absente après ingestion.")
-            return {
-                "ok": False,
-                "chunks": total_inserted,
-                "collection": collection_name,
-                "msg": "Collection missing post-ingest"
-            }
-
-        col = Collection(collection_name)
-        col.load()
-        total_entities = col.num_entities
-        log.info(f"[RAG] Vérif Milvus: {total_entities} entités présentes dans {collection_name}")
-
-        # 8) Flush + compact systématiques
-        log.info(f"[RAG] Flush de la collection {collection_name}…")
-        col.flush()
-        log.info(f"[RAG] Compactage de la collection {collection_name}…")
-        col.compact()
-        log.info(f"[RAG] Flush + compact terminés pour {collection_name}")
-
-        # <<< ICI LE RETURN FINAL >>>
+        connect_milvus()
+    except Exception as e:
+        log.error(f"[RAG] Erreur connexion Milvus: {e}")
         return {
-            "ok": True,
-            "chunks": total_inserted,
+            "ok": False,
+            "chunks": 0,
             "collection": collection_name,
-            "msg": f"Ingestion terminée, {total_entities} entités présentes"
+            "msg": f"Milvus unreachable: {e}"
         }
 
+    # 2) Embeddings TEI (client partagé, même endpoint que la chaîne RAG)
+    log.info(f"[RAG] Initialisation embeddings TEI @ {TEI_URL}")
+    embedding = get_embeddings()
+
+    # 3) VectorStore Milvus
+    vectorstore = open_vectorstore(embedding, collection_name)
+
+    # 4) Pipeline : pages (lazy) -> chunks -> embeddings -> insertion
+    result = ingest_file(pdf_path, embedding, vectorstore, workers, collection_name=collection_name)
+    if result["chunks"]:
+        log.info(f"[RAG] {embedding.report()}")
+    if not result["ok"] or result["unchanged"]:
+        return result
+
+    # 5) Vérification collection + flush + compact
+    try:
+        final = finalize_collection(collection_name)
     except Exception as e:
         return {
+            **result,
             "ok": False,
-            "chunks": total_inserted,
-            "collection": collection_name,
             "msg": f"Milvus check/flush/compact failed: {e}"
         }
+    if not final["ok"]:
+        return {**result, **final}
+    return {
+        **result,
+        "ok": True,
+        "msg": f"Ingestion terminée, {final['entities']} entités présentes",
+    }
@@ -0,0 +1,84 @@
+# src/tools/RAG/pdf_parallel.py
+"""
+Extraction et chunking d'un PDF en parallèle (processus), par plages de pages.
+
+Chaque worker ouvre le PDF, extrait le texte de sa plage comme PyPDFLoader
+(pypdf, mode "plain", texte strippé, métadonnées du document + page et
+page_label) et le découpe page par page avec le même splitter : les chunks
+sont identiques à ceux du chemin séquentiel. Les plages sont rendues dans
+l'ordre, avec au plus 2 × workers plages en cours (mémoire bornée).
+
+Module volontairement léger (pas de Milvus ni de LangChain Milvus) : il est
+réimporté par chaque worker (contexte "spawn", sûr avec les threads du
+pipeline d'ingestion).
+"""
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+from langchain_core.documents import Document
+
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+
+
+def make_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def parse_range(path: str, start: int, end: int, doc_metadata: dict) -> list[Document]:
+    """Chunks des pages [start, end) (exécuté dans un worker)."""
+    import pypdf
+
+    reader = pypdf.PdfReader(path)
+    splitter = make_splitter()
+    # page_labels recalcule toute la liste à chaque accès : une seule fois par plage
+    labels = reader.page_labels if "page_label" in doc_metadata else None
+    chunks = []
+    for page_number in range(start, end):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain").strip()
+        metadata = dict(doc_metadata, page=page_number)
+        if labels is not None:
+            metadata["page_label"] = labels[page_number]
+        chunks.extend(splitter.split_documents([Document(page_content=text, metadata=metadata)]))
+    return chunks
+
+
+def document_metadata(path: str) -> tuple[int, dict]:
+    """Nombre de pages et métadonnées communes, telles que PyPDFLoader les produit."""
+    import pypdf
+    from langchain_community.document_loaders import PyPDFLoader
+
+    n_pages = len(pypdf.PdfReader(path).pages)
+    first = next(iter(PyPDFLoader(path).lazy_load()), None)
+    metadata = dict(first.metadata) if first is not None else {}
+    metadata.pop("page", None)
+    return n_pages, metadata
+
+
+def iter_chunk_ranges(path: str, workers: int, pages_per_range: int = 0) -> Iterator[tuple[int, list[Document]]]:
+    """
+    Yields (nombre de pages, chunks) par plage, dans l'ordre des pages.
+    `pages_per_range` : 0 = automatique (~4 plages par worker, 4 à 64 pages).
+    """
+    n_pages, metadata = document_metadata(path)
+    if not n_pages:
+        return
+    size = pages_per_range or max(4, min(64, n_pages // (workers * 4) or 1))
+    ranges = [(s, min(s + size, n_pages)) for s in range(0, n_pages, size)]
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        pending = deque()
+        for start, end in ranges:
+            pending.append((end - start, pool.submit(parse_range, path, start, end, metadata)))
+            if len(pending) >= 2 * workers:
+                n, future = pending.popleft()
+                yield n, future.result()
+        while pending:
+            n, future = pending.popleft()
+            yield n, future.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
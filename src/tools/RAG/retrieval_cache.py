@@ -0,0 +1,258 @@
+# src/tools/RAG/retrieval_cache.py
+"""
+Cache de la récupération RAG (embedding de la question + recherche Milvus).
+
+- Embeddings des questions : LRU indexé sur le texte normalisé (casse, espaces,
+  ponctuation finale), les questions répétées ou trivialement reformulées
+  n'appellent plus TEI.
+- Résultats de recherche : LRU indexé sur (empreinte du vecteur, k), vidé dès
+  que la collection change (ingestion ou suppression, cf. collection_events).
+- Les lots ne demandent à TEI et à Milvus que les absents du cache, en un appel.
+- `stats()` / `report()` : taux de hit par niveau et latence économisée
+  (hits × coût moyen mesuré d'un miss).
+"""
+
+import asyncio
+import hashlib
+import struct
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable
+
+from langchain_core.documents import Document
+
+from src.tools.RAG.collection_events import CollectionWatcher
+
+
+def normalize_query(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(text.split()).strip(" ?!.;:,")
+
+
+def vector_key(vector: list[float]) -> str:
+    return hashlib.sha1(struct.pack(f"{len(vector)}f", *vector)).hexdigest()
+
+
+class LRUCache:
+    """Dictionnaire borné (éviction du moins récemment utilisé), thread-safe."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def items(self) -> list:
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _LayerStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_miss_s": avg_miss, "saved_s": self.hits * avg_miss}
+
+
+class CachedRetriever:
+    def __init__(self,
+                 embeddings,
+                 search: Callable[[list[list[float]], int], list[list[Document]]],
+                 collection: str,
+                 k: int = 4,
+                 max_queries: int = 4096,
+                 max_results: int = 4096):
+        """
+        Args:
+            embeddings : objet Embeddings (embed_documents / aembed_documents)
+            search     : (vecteurs, k) -> documents par vecteur, en une requête
+            collection : collection suivie pour l'invalidation des résultats
+            k          : passages par question
+            max_queries: embeddings de questions gardés
+            max_results: résultats de recherche gardés
+        """
+        self.embeddings = embeddings
+        self.search_fn = search
+        self.k = k
+        self.query_cache = LRUCache(max_queries)
+        self.result_cache = LRUCache(max_results)
+        self.watcher = CollectionWatcher(collection)
+        self._generation = 0               # incrémenté à chaque invalidation des résultats
+        self._stats = {"embed": _LayerStats(), "search": _LayerStats()}
+        self._stats_lock = threading.Lock()
+
+    # --- Embeddings des questions ----------------------------------------- #
+
+    def _split_queries(self, texts: list[str]):
+        keys = [normalize_query(t) for t in texts]
+        vectors = [self.query_cache.get(k) for k in keys]
+        missing = {}                       # clé -> texte envoyé à TEI (une fois par clé)
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        return keys, vectors, missing
+
+    def _fill_queries(self, keys, vectors, missing, embedded, elapsed, hits):
+        for key, vector in zip(missing, embedded):
+            self.query_cache.put(key, vector)
+        fresh = dict(zip(missing, embedded))
+        self._record("embed", hits, len(missing), elapsed)
+        return [v if v is not None else fresh[k] for k, v in zip(keys, vectors)]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        keys, vectors, missing = self._split_queries(texts)
+        t0 = time.perf_counter()
+        embedded = self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._fill_queries(keys, vectors, missing, embedded, time.perf_counter() - t0,
+                                  len(texts) - len(missing))
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        keys, vectors, missing = self._split_queries(texts)
+        t0 = time.perf_counter()
+        embedded = await self.embeddings.aembed_documents(list(missing.values())) if missing else []
+        return self._fill_queries(keys, vectors, missing, embedded, time.perf_counter() - t0,
+                                  len(texts) - len(missing))
+
+    # --- Recherche ---------------------------------------------------------- #
+
+    def _split_results(self, vectors: list[list[float]]):
+        if self.watcher.poll() is not None:
+            # Un nouveau document peut entrer dans n'importe quel top-k : tout est invalidé.
+            self._generation += 1
+            self.result_cache.clear()
+        generation = self._generation
+        keys = [(vector_key(v), self.k) for v in vectors]
+        results = [self.result_cache.get(k) for k in keys]
+        missing = {}
+        for key, vector, docs in zip(keys, vectors, results):
+            if docs is None:
+                missing.setdefault(key, vector)
+        return generation, keys, results, missing
+
+    def _fill_results(self, generation, keys, results, missing, found, elapsed, hits):
+        if generation == self._generation:     # pas de résultat antérieur à une invalidation
+            for key, docs in zip(missing, found):
+                self.result_cache.put(key, docs)
+        fresh = dict(zip(missing, found))
+        self._record("search", hits, len(missing), elapsed)
+        return [r if r is not None else fresh[k] for k, r in zip(keys, results)]
+
+    def search(self, vectors: list[list[float]]) -> list[list[Document]]:
+        generation, keys, results, missing = self._split_results(vectors)
+        t0 = time.perf_counter()
+        found = self.search_fn(list(missing.values()), self.k) if missing else []
+        return self._fill_results(generation, keys, results, missing, found, time.perf_counter() - t0,
+                                  len(vectors) - len(missing))
+
+    async def asearch(self, vectors: list[list[float]]) -> list[list[Document]]:
+        generation, keys, results, missing = self._split_results(vectors)
+        t0 = time.perf_counter()
+        # Client Milvus synchrone : la recherche passe par un thread
+        found = await asyncio.to_thread(self.search_fn, list(missing.values()), self.k) if missing else []
+        return self._fill_results(generation, keys, results, missing, found, time.perf_counter() - t0,
+                                  len(vectors) - len(missing))
+
+    # --- Question(s) -> documents ------------------------------------------ #
+
+    def retrieve(self, question: str) -> list[Document]:
+        return self.search(self.embed_queries([question]))[0]
+
+    async def aretrieve(self, question: str) -> list[Document]:
+        return (await self.asearch(await self.aembed_queries([question])))[0]
+
+    def retrieve_batch(self, questions: list[str]) -> list[list[Document]]:
+        return self.search(self.embed_queries(questions))
+
+    async def aretrieve_batch(self, questions: list[str]) -> list[list[Document]]:
+        return await self.asearch(await self.aembed_queries(questions))
+
+    # --- Statistiques ------------------------------------------------------- #
+
+    def _record(self, layer: str, hits: int, misses: int, miss_seconds: float):
+        with self._stats_lock:
+            stats = self._stats[layer]
+            stats.hits += hits
+            stats.misses += misses
+            stats.miss_seconds += miss_seconds if misses else 0.0
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            layers = {name: s.as_dict() for name, s in self._stats.items()}
+        layers["saved_s"] = sum(s["saved_s"] for s in layers.values())
+        layers["sizes"] = {"queries": len(self.query_cache), "results": len(self.result_cache)}
+        return layers
+
+    def report(self) -> str:
+        s = self.stats()
+        return (f"Cache RAG — embeddings : {s['embed']['hit_rate']:.1%} de hits "
+                f"({s['embed']['hits']}/{s['embed']['hits'] + s['embed']['misses']}), "
+                f"recherches : {s['search']['hit_rate']:.1%} de hits "
+                f"({s['search']['hits']}/{s['search']['hits'] + s['search']['misses']}), "
+                f"latence économisée ≈ {s['saved_s']:.2f} s")
+
+    def clear(self, results_only: bool = False):
+        self.result_cache.clear()
+        if not results_only:
+            self.query_cache.clear()
+
+
+def milvus_search(collection: str, text_field: str = "text", vector_field: str = "vector"):
+    """
+    Fonction de recherche multi-vecteurs (un appel Milvus) pour CachedRetriever.
+    Champs par défaut : ceux créés par langchain_milvus à l'ingestion.
+    """
+
+    def search(vectors: list[list[float]], k: int) -> list[list[Document]]:
+        from src.tools.clients import get_milvus_client
+        results = get_milvus_client().search(
+            collection_name=collection,
+            data=vectors,
+            limit=k,
+            anns_field=vector_field,
+            output_fields=["*"],
+        )
+        contexts = []
+        for hits in results:
+            docs = []
+            for hit in hits:
+                fields = dict(hit["entity"])
+                fields.pop(vector_field, None)
+                fields.setdefault("pk", hit.get("id"))
+                docs.append(Document(page_content=fields.pop(text_field, ""), metadata=fields))
+            contexts.append(docs)
+        return contexts
+
+    return search
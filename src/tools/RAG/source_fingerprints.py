@@ -0,0 +1,76 @@
+# src/tools/RAG/source_fingerprints.py
+"""
+Empreintes des fichiers ingérés dans une collection Milvus.
+
+Après une ingestion complète, data/rag_sources/<collection>.json associe à
+chaque source_path le sha256 du fichier et son nombre de chunks. Un fichier
+dont l'empreinte et le nombre de chunks en base n'ont pas changé n'est ni
+relu ni réingéré. L'empreinte n'est qu'un raccourci : perdue ou périmée, la
+réingestion retombe sur la comparaison des chunk_hash, sans doublon.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+SOURCES_DIR = Path(__file__).resolve().parents[3] / "data" / "rag_sources"
+
+_lock = threading.Lock()
+
+
+def file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _registry(collection: str) -> Path:
+    return SOURCES_DIR / f"{collection}.json"
+
+
+def _load(collection: str) -> dict:
+    try:
+        with open(_registry(collection), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save(collection: str, data: dict):
+    path = _registry(collection)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def get_fingerprint(collection: str, source_path: str) -> Optional[dict]:
+    """{"sha256", "chunks"} de la dernière ingestion complète, sinon None."""
+    with _lock:
+        return _load(collection).get(source_path)
+
+
+def record_fingerprint(collection: str, source_path: str, sha256: str, chunks: int):
+    with _lock:
+        data = _load(collection)
+        data[source_path] = {"sha256": sha256, "chunks": chunks}
+        _save(collection, data)
+
+
+def forget_fingerprint(collection: str, source_path: str):
+    with _lock:
+        data = _load(collection)
+        if data.pop(source_path, None) is not None:
+            _save(collection, data)
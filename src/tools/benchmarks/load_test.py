@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+load_test.py
+Test de charge HTTP de /v1/chat/completions (vllm_chat_server, routeur ou
+tout serveur compatible OpenAI).
+
+Le même harnais sert contre le moteur vLLM réel ou le moteur factice CPU :
+    python vllm_chat_server.py --model_name Mistral-7B-Instruct-v0.3 --engine fake
+    python -m src.tools.benchmarks.load_test --concurrency 16 --requests 200 --stream
+
+Modes :
+- boucle fermée (défaut) : `--concurrency` clients envoient chacun une requête
+  dès que la précédente est terminée ;
+- boucle ouverte (`--rate R`) : arrivées de Poisson à R req/s, quelle que soit
+  la latence (la concurrence est alors plafonnée par `--concurrency`).
+
+Chaque utilisateur simulé s'identifie par l'en-tête x-client-id (`--clients`
+identités, une par client concurrent par défaut) : sans cela, toutes les
+requêtes partagent l'IP du harnais et le plafond par client du serveur
+(max_requests_per_client) mesurerait surtout des rejets.
+
+Rapport : latence bout en bout p50/p90/p99, TTFT et temps par token de sortie
+(en streaming), débit en requêtes et en tokens générés (requêtes abouties
+seulement), rejets 429 comptés à part.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import httpx
+
+WORDS = ("document analyse recherche question réponse contexte source page modèle "
+         "données résultat méthode exemple section figure tableau conclusion").split()
+
+
+@dataclass
+class Sample:
+    status: int
+    latency: float
+    ttft: Optional[float] = None
+    completion_tokens: int = 0
+    prompt_tokens: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class Report:
+    samples: list = field(default_factory=list)
+    duration: float = 0.0
+
+    def summary(self) -> dict:
+        ok = [s for s in self.samples if s.status == 200 and s.error is None]
+        rejected = sum(1 for s in self.samples if s.status == 429)
+        latencies = [s.latency for s in ok]
+        ttfts = [s.ttft for s in ok if s.ttft is not None]
+        tpots = [(s.latency - s.ttft) / (s.completion_tokens - 1)
+                 for s in ok if s.ttft is not None and s.completion_tokens > 1]
+        completion = sum(s.completion_tokens for s in ok)
+        return {
+            "requests": len(self.samples),
+            "ok": len(ok),
+            "rejected_429": rejected,
+            "errors": len(self.samples) - len(ok) - rejected,
+            "duration_s": round(self.duration, 3),
+            "throughput_req_s": round(len(ok) / self.duration, 3) if self.duration else 0.0,
+            "throughput_completion_tok_s": round(completion / self.duration, 1) if self.duration else 0.0,
+            "prompt_tokens": sum(s.prompt_tokens for s in ok),
+            "completion_tokens": completion,
+            "latency_s": percentiles(latencies),
+            "ttft_s": percentiles(ttfts),
+            "tpot_ms": {k: round(v * 1000, 2) for k, v in percentiles(tpots).items()},
+        }
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def pct(p: float) -> float:
+        # Interpolation linéaire entre rangs (comme numpy.percentile)
+        k = (len(values) - 1) * p / 100
+        lo = int(k)
+        hi = min(lo + 1, len(values) - 1)
+        return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+    return {"p50": round(pct(50), 4), "p90": round(pct(90), 4), "p99": round(pct(99), 4),
+            "mean": round(statistics.fmean(values), 4), "max": round(values[-1], 4)}
+
+
+def make_messages(i: int, args) -> list:
+    """Prompt synthétique : préfixe system commun + question propre à la requête."""
+    rng = random.Random(args.seed + i)
+    system = " ".join(WORDS[j % len(WORDS)] for j in range(args.system_words))
+    question = " ".join(rng.choice(WORDS) for _ in range(args.prompt_words))
+    messages = [{"role": "user", "content": f"[{i}] {question}"}]
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    return messages
+
+
+async def one_request(client: httpx.AsyncClient, i: int, args, client_id: str = "load-0") -> Sample:
+    body = {
+        "model": args.model,
+        "messages": make_messages(i, args),
+        "max_completion_tokens": args.max_tokens,
+        "temperature": args.temperature,
+        "stream": args.stream,
+        "priority": args.priority,
+    }
+    headers = {"x-client-id": client_id}
+    start = time.perf_counter()
+    try:
+        if not args.stream:
+            r = await client.post("/v1/chat/completions", json=body, headers=headers)
+            latency = time.perf_counter() - start
+            if r.status_code != 200:
+                return Sample(r.status_code, latency, error=r.text[:200])
+            usage = r.json().get("usage") or {}
+            return Sample(200, latency, completion_tokens=usage.get("completion_tokens", 0),
+                          prompt_tokens=usage.get("prompt_tokens", 0))
+
+        ttft, usage = None, {}
+        async with client.stream("POST", "/v1/chat/completions", json=body, headers=headers) as r:
+            if r.status_code != 200:
+                await r.aread()
+                return Sample(r.status_code, time.perf_counter() - start, error=r.text[:200])
+            async for line in r.aiter_lines():
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                chunk = json.loads(line[6:])
+                if ttft is None and any(c.get("delta", {}).get("content") for c in chunk.get("choices", [])):
+                    ttft = time.perf_counter() - start
+                usage = chunk.get("usage") or usage
+        return Sample(200, time.perf_counter() - start, ttft=ttft,
+                      completion_tokens=usage.get("completion_tokens", 0),
+                      prompt_tokens=usage.get("prompt_tokens", 0))
+    except httpx.HTTPError as e:
+        return Sample(0, time.perf_counter() - start, error=repr(e))
+
+
+async def run(args) -> Report:
+    clients = max(1, args.clients or args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        for i in range(args.warmup):
+            await one_request(client, -1 - i, args)
+
+        report = Report()
+        start = time.perf_counter()
+        if args.rate:
+            sem = asyncio.Semaphore(args.concurrency)
+            rng = random.Random(args.seed)
+
+            async def bounded(i):
+                async with sem:
+                    report.samples.append(await one_request(client, i, args, f"load-{i % clients}"))
+
+            tasks = []
+            for i in range(args.requests):
+                tasks.append(asyncio.create_task(bounded(i)))
+                await asyncio.sleep(rng.expovariate(args.rate))
+            await asyncio.gather(*tasks)
+        else:
+            counter = iter(range(args.requests))
+
+            async def worker(w: int):
+                for i in counter:
+                    report.samples.append(await one_request(client, i, args, f"load-{w % clients}"))
+
+            await asyncio.gather(*(worker(w) for w in range(args.concurrency)))
+        report.duration = time.perf_counter() - start
+    return report
+
+
+def print_report(summary: dict, args):
+    print(f"\n=== Load test {args.url} ({'stream' if args.stream else 'non-stream'}, "
+          f"{'rate ' + str(args.rate) + ' req/s' if args.rate else 'concurrency ' + str(args.concurrency)}, "
+          f"{args.clients or args.concurrency} clients) ===")
+    print(f"Requêtes   : {summary['ok']} ok / {summary['rejected_429']} rejetées (429) / {summary['errors']} erreurs"
+          f" en {summary['duration_s']} s")
+    print(f"Débit      : {summary['throughput_req_s']} req/s, {summary['throughput_completion_tok_s']} tok/s générés")
+    for name, unit in (("latency_s", "s"), ("ttft_s", "s"), ("tpot_ms", "ms")):
+        p = summary[name]
+        if p:
+            print(f"{name:<11}: p50 {p['p50']} {unit} | p90 {p['p90']} {unit} | p99 {p['p99']} {unit} | max {p['max']} {unit}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de /v1/chat/completions")
+    parser.add_argument("--url", type=str, default="http://localhost:8000")
+    parser.add_argument("--model", type=str, default="auto")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=0,
+                        help="Identités client (x-client-id) ; 0 = une par client concurrent")
+    parser.add_argument("--rate", type=float, default=0.0, help="Arrivées de Poisson (req/s) ; 0 = boucle fermée")
+    parser.add_argument("--max_tokens", type=int, default=128)
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--prompt_words", type=int, default=64)
+    parser.add_argument("--system_words", type=int, default=32, help="Préfixe system commun (prefix cache)")
+    parser.add_argument("--priority", type=str, default="interactive")
+    parser.add_argument("--stream", action="store_true", help="Mesure aussi TTFT et temps par token")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="Écrit le résumé JSON dans ce fichier")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args)).summary()
+    print_report(summary, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
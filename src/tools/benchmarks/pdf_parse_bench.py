@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+pdf_parse_bench.py
+Extraction + chunking d'un PDF : mode séquentiel d'ingest_pdf (PyPDFLoader
+page par page) contre le mode multi-processus (pdf_parallel), selon le
+nombre de pages et de workers. Vérifie que les chunks sont identiques.
+
+Sans `--pdf`, des PDF de texte synthétiques sont générés pour chaque taille
+de `--pages` ; avec `--pdf`, le fichier donné est mesuré tel quel.
+
+Usage :
+    python -m src.tools.benchmarks.pdf_parse_bench --pages 50,200,1000,2000 --workers 2,4,8
+    python -m src.tools.benchmarks.pdf_parse_bench --pdf /chemin/manuel.pdf --workers 8
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from langchain_community.document_loaders import PyPDFLoader
+
+from src.tools.RAG.pdf_parallel import iter_chunk_ranges, make_splitter
+
+WORDS = ("analyse architecture capteur configuration diagnostic document entrée "
+         "fonction interface maintenance module paramètre procédure réglage sortie "
+         "signal système tension valeur vérification").split()
+
+
+def synthetic_pdf(path: str, pages: int, lines_per_page: int = 48, seed: int = 0):
+    """PDF texte minimal (Helvetica, une colonne), sans dépendance d'écriture PDF."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 14))) for _ in range(lines_per_page)]
+        if rng.random() < 0.3:
+            lines[rng.randrange(lines_per_page)] = ""          # paragraphes
+        text = " T* ".join(f"({line.encode('latin-1', 'replace').decode('latin-1')}) Tj" for line in lines)
+        stream = f"BT /F1 10 Tf 14 TL 50 790 Td {text} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for i, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % i + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for off in offsets:
+            f.write(b"%010d 00000 n \n" % off)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def serial_chunks(path: str) -> list:
+    splitter = make_splitter()
+    return [c for page in PyPDFLoader(path).lazy_load() for c in splitter.split_documents([page])]
+
+
+def parallel_chunks(path: str, workers: int) -> list:
+    return [c for _, chunks in iter_chunk_ranges(path, workers) for c in chunks]
+
+
+def same_chunks(a: list, b: list) -> bool:
+    return [(c.page_content, c.metadata) for c in a] == [(c.page_content, c.metadata) for c in b]
+
+
+def bench(path: str, workers: list[int]) -> dict:
+    t0 = time.perf_counter()
+    reference = serial_chunks(path)
+    serial_s = time.perf_counter() - t0
+    row = {"chunks": len(reference), "serial_s": serial_s, "parallel": {}}
+    for w in workers:
+        t0 = time.perf_counter()
+        chunks = parallel_chunks(path, w)
+        row["parallel"][w] = (time.perf_counter() - t0, same_chunks(reference, chunks))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction + chunking PDF : séquentiel vs multi-processus")
+    parser.add_argument("--pdf", type=str, default=None, help="PDF à mesurer (sinon PDF synthétiques)")
+    parser.add_argument("--pages", type=str, default="50,200,1000,2000", help="Tailles des PDF synthétiques")
+    parser.add_argument("--workers", type=str, default=str(os.cpu_count() or 2))
+    args = parser.parse_args()
+    workers = [int(w) for w in args.workers.split(",")]
+
+    rows = []
+    if args.pdf:
+        from pypdf import PdfReader
+        rows.append((len(PdfReader(args.pdf).pages), bench(args.pdf, workers)))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in (int(p) for p in args.pages.split(",")):
+                path = os.path.join(tmp, f"synthetic_{n}.pdf")
+                synthetic_pdf(path, n)
+                rows.append((n, bench(path, workers)))
+                print(f"[bench] {n} pages mesurées")
+
+    print(f"\n{'pages':>6} {'chunks':>7} {'séquentiel':>11}" +
+          "".join(f" {f'{w} workers':>12} {'x':>6}" for w in workers) + "  identiques")
+    for n, row in rows:
+        line = f"{n:>6} {row['chunks']:>7} {row['serial_s']:>10.2f}s"
+        identical = True
+        for w in workers:
+            seconds, same = row["parallel"][w]
+            identical &= same
+            line += f" {seconds:>11.2f}s {row['serial_s'] / seconds:>5.1f}x"
+        print(line + f"  {'oui' if identical else 'NON'}")
+
+
+if __name__ == "__main__":
+    main()
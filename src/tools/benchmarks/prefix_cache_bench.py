@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+prefix_cache_bench.py
+Prefill par tour et taux de hit du prefix cache sur une conversation de N tours
+(20 par défaut) construite par src/chains/simple_chat.py.
+
+Deux modes :
+- hors ligne (défaut) : les prompts de chaque tour sont rendus avec le chat
+  template d'un tokenizer (`--tokenizer <dossier du modèle>`, sinon le
+  tokenizer octet du moteur factice) et le prefix cache est simulé par blocs
+  de 16 tokens, comme vLLM. L'ancienne construction (listes history_user /
+  history_assistant dans un seul couple de slots, message courant dupliqué)
+  est mesurée en regard de la nouvelle.
+- en ligne (`--url`) : la conversation est jouée contre le serveur (vLLM ou
+  moteur factice) et les chiffres viennent de usage.prompt_tokens_details.
+
+Usage :
+    python -m src.tools.benchmarks.prefix_cache_bench --tokenizer /chemin/Llama-3.1-8B-Instruct
+    python -m src.tools.benchmarks.prefix_cache_bench --url http://localhost:8000
+
+Note : certains chat templates (Mistral v0.3) insèrent le message system avant
+le *dernier* message utilisateur ; le rendu change alors à chaque tour quelle
+que soit la construction côté chain, ce que ce benchmark met en évidence.
+"""
+
+import argparse
+import hashlib
+import random
+
+from src.chains.simple_chat import SYSTEM_PROMPT, build_messages
+
+BLOCK_SIZE = 16
+WORDS = ("pourquoi comment document page modèle contexte exemple résumé analyse "
+         "question réponse source donnée méthode résultat limite").split()
+
+
+def legacy_messages(user_input: str, history: list[dict]) -> list[dict]:
+    """Reproduction de l'ancienne construction de simple_chat (avant ce benchmark)."""
+    history = history + [{"role": "user", "content": user_input}]   # l'UI y ajoutait le message courant
+    users = [h["content"] for h in history if h["role"] == "user"]
+    assistants = [h["content"] for h in history if h["role"] == "assistant"]
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": str(users)},
+        {"role": "assistant", "content": str(assistants)},
+        {"role": "user", "content": user_input},
+    ]
+
+
+class PrefixCache:
+    """Prefix cache par blocs complets (hash chaîné), sans éviction."""
+
+    def __init__(self, block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        self.blocks: set[str] = set()
+
+    def lookup_and_insert(self, ids: list) -> int:
+        h = hashlib.sha1()
+        cached, hit = 0, True
+        for start in range(0, len(ids) - self.block_size + 1, self.block_size):
+            h.update(repr(ids[start:start + self.block_size]).encode())
+            key = h.hexdigest()
+            if hit and key in self.blocks:
+                cached += self.block_size
+            else:
+                hit = False
+                self.blocks.add(key)
+        return cached
+
+
+def conversation(turns: int, seed: int):
+    rng = random.Random(seed)
+    for t in range(turns):
+        question = f"Tour {t + 1} : " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))) + " ?"
+        answer = " ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 120))) + "."
+        yield question, answer
+
+
+def run_offline(args, build) -> list[tuple]:
+    tokenizer = load_tokenizer(args.tokenizer)
+    cache = PrefixCache()
+    history, rows = [], []
+    for question, answer in conversation(args.turns, args.seed):
+        messages = build(question, history)
+        ids = tokenizer.apply_chat_template(messages, tokenize=True, add_generation_prompt=True)
+        cached = cache.lookup_and_insert(list(ids))
+        rows.append((len(ids), cached))
+        history += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+    return rows
+
+
+def run_online(args) -> list[tuple]:
+    import httpx
+
+    history, rows = [], []
+    with httpx.Client(base_url=args.url, timeout=600) as client:
+        for question, _ in conversation(args.turns, args.seed):
+            r = client.post("/v1/chat/completions", json={
+                "model": args.model,
+                "messages": build_messages(question, history),
+                "max_completion_tokens": args.max_tokens,
+                # temperature > 0 : le cache de réponses du serveur ne court-circuite pas le moteur
+                "temperature": 0.7,
+            })
+            r.raise_for_status()
+            body = r.json()
+            usage = body["usage"]
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+            rows.append((usage["prompt_tokens"], cached))
+            answer = body["choices"][0]["message"]["content"]
+            history += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+    return rows
+
+
+def load_tokenizer(path):
+    if path:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(path)
+    from src.vllm_server.engines import ByteTokenizer
+    return ByteTokenizer()
+
+
+def print_rows(title: str, rows: list[tuple]):
+    print(f"\n=== {title} ===")
+    print(f"{'tour':>4} {'prompt':>8} {'cache':>8} {'prefill':>8} {'hit':>6}")
+    for t, (n, cached) in enumerate(rows, 1):
+        print(f"{t:>4} {n:>8} {cached:>8} {n - cached:>8} {cached / n if n else 0:>6.1%}")
+    total = sum(n for n, _ in rows)
+    cached = sum(c for _, c in rows)
+    print(f"Total : {total} tokens de prompt, {total - cached} en prefill, hit rate {cached / total if total else 0:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefill et prefix cache sur une conversation multi-tours")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tokenizer", type=str, default=None, help="Dossier du modèle (chat template réel)")
+    parser.add_argument("--url", type=str, default=None, help="Serveur à interroger (mode en ligne)")
+    parser.add_argument("--model", type=str, default="auto")
+    parser.add_argument("--max_tokens", type=int, default=128)
+    args = parser.parse_args()
+
+    if args.url:
+        print_rows(f"simple_chat contre {args.url}", run_online(args))
+        return
+    print_rows("Ancienne construction (history_user / history_assistant)", run_offline(args, legacy_messages))
+    print_rows("simple_chat (historique en messages ordonnés)", run_offline(args, build_messages))
+
+
+if __name__ == "__main__":
+    main()
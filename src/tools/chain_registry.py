@@ -0,0 +1,140 @@
+# src/tools/chain_registry.py
+"""
+Registre des chains de src/chains.
+
+- Découverte par fichiers (comme l'ancien refresh_chains de l'UI) : une chain
+  dont l'import échoue reste listée, l'erreur n'est levée qu'à son appel.
+- Import paresseux, une fois par module ; `warm_up()` importe les chains en
+  arrière-plan et appelle leur fonction `warm_up()` si elles en ont une
+  (construction de la chain, ouverture des clients partagés de src.tools.clients).
+- Rechargement à chaud : un module dont le fichier a changé est rechargé au
+  prochain appel, ou dès sa modification si la surveillance est lancée.
+"""
+
+import importlib
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+CHAINS_DIR = Path(__file__).resolve().parents[1] / "chains"
+CHAINS_PACKAGE = "src.chains"
+
+
+class ChainLoadError(RuntimeError):
+    pass
+
+
+class ChainRegistry:
+    def __init__(self, chains_dir: Path = CHAINS_DIR, package: str = CHAINS_PACKAGE):
+        self.chains_dir = Path(chains_dir)
+        self.package = package
+        self._modules: dict = {}           # nom -> module importé
+        self._mtimes: dict = {}            # nom -> mtime du fichier au dernier import
+        self._errors: dict = {}            # nom -> erreur du dernier import
+        self._locks: dict = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------------ #
+
+    def names(self) -> list[str]:
+        """Chains disponibles (fichiers src/chains/*.py)."""
+        return sorted(
+            f.stem for f in self.chains_dir.glob("*.py")
+            if f.is_file() and not f.name.startswith("__")
+        )
+
+    def errors(self) -> dict:
+        """Erreurs d'import courantes, par chain."""
+        return dict(self._errors)
+
+    def get(self, name: str):
+        """Module de la chain, importé (ou rechargé si son fichier a changé) au besoin."""
+        path = self.chains_dir / f"{name}.py"
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            raise ChainLoadError(f"Chain introuvable : {name}") from None
+        with self._name_lock(name):
+            if name not in self._modules or self._mtimes.get(name) != mtime:
+                self._load(name, mtime)
+            if name in self._errors:
+                raise ChainLoadError(f"Import de la chain {name} impossible : {self._errors[name]}")
+            return self._modules[name]
+
+    def warm_up(self, names: Optional[list[str]] = None) -> threading.Thread:
+        """Importe et prépare les chains dans un thread en arrière-plan."""
+
+        def _run():
+            for name in names or self.names():
+                self._warm(name)
+
+        thread = threading.Thread(target=_run, daemon=True)
+        thread.start()
+        return thread
+
+    def watch(self, interval_s: float = 2.0, on_change: Optional[Callable[[list[str]], None]] = None):
+        """
+        Surveille src/chains : recharge (et réchauffe) les chains modifiées déjà
+        chargées ; `on_change(noms)` est appelé quand la liste des chains change.
+        """
+        if self._watcher is not None:
+            return
+
+        def _loop():
+            known = self.names()
+            while not self._stop.wait(interval_s):
+                current = self.names()
+                if current != known:
+                    known = current
+                    if on_change is not None:
+                        on_change(current)
+                for name in list(self._modules):
+                    if name in current and self._changed(name):
+                        print(f"[Chains] {name} modifiée : rechargement")
+                        self._warm(name)
+
+        self._watcher = threading.Thread(target=_loop, daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ------------------------------------------------------------------ #
+
+    def _name_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _changed(self, name: str) -> bool:
+        try:
+            return (self.chains_dir / f"{name}.py").stat().st_mtime != self._mtimes.get(name)
+        except FileNotFoundError:
+            return False
+
+    def _load(self, name: str, mtime: float):
+        module_name = f"{self.package}.{name}"
+        self._mtimes[name] = mtime
+        try:
+            if name in self._modules and sys.modules.get(module_name) is self._modules[name]:
+                module = importlib.reload(self._modules[name])
+            else:
+                module = importlib.import_module(module_name)
+        except Exception as e:
+            self._errors[name] = f"{type(e).__name__}: {e}"
+            print(f"[Chains] Import de {name} impossible : {self._errors[name]}")
+            return
+        self._modules[name] = module
+        self._errors.pop(name, None)
+
+    def _warm(self, name: str):
+        try:
+            module = self.get(name)
+            warm = getattr(module, "warm_up", None)
+            if warm is not None:
+                warm()
+        except Exception as e:
+            # Service pas encore démarré (vLLM, TEI, Milvus) : la chain sera prête au premier appel.
+            print(f"[Chains] Préchauffage de {name} impossible : {e}")
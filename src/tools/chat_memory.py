@@ -1,17 +1,198 @@
-# src/chains/chat_memory.py
+# src/tools/chat_memory.py
+"""
+Mémoire de conversation avec budget de tokens.
+
+- Chaque message est compté une seule fois à l'ajout (tokenizer fourni, sinon
+  estimation ~4 caractères/token) ; le compte est stocké avec le message.
+- `get_budgeted_history()` renvoie les messages les plus récents qui tiennent
+  dans `token_budget`. La fenêtre glisse de façon incrémentale (chaque message
+  n'en sort qu'une fois : O(1) amorti par ajout). Quand le budget est dépassé,
+  on descend jusqu'à `low_watermark` × budget : le début de la fenêtre reste
+  alors identique pendant plusieurs tours, ce qui préserve le prefix cache.
+- Optionnel : un `summarizer(résumé_précédent, messages_évincés) -> str`,
+  exécuté dans un thread en arrière-plan, replie les tours sortis de la
+  fenêtre dans un message de résumé placé en tête de la vue budgétée.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+import requests
+
+SUMMARY_HEADER = "Résumé de la conversation précédente :\n"
+# Échecs consécutifs du résumeur avant d'attendre le prochain message pour réessayer
+SUMMARY_MAX_FAILURES = 3
+SUMMARY_BACKOFF_S = 2.0
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
 
 class ChatMemory:
-    def __init__(self):
-        self.history = []
+    def __init__(self,
+                 token_budget: Optional[int] = None,
+                 tokenizer=None,
+                 summarizer: Optional[Callable[[Optional[str], list[dict]], str]] = None,
+                 low_watermark: float = 0.75,
+                 message_overhead: int = 4):
+        """
+        Args:
+            token_budget    : tokens max de la vue budgétée (None = pas de limite)
+            tokenizer       : objet avec encode(text) pour un compte exact (optionnel)
+            summarizer      : (résumé précédent, messages évincés) -> nouveau résumé
+            low_watermark   : fraction du budget visée après une éviction
+            message_overhead: tokens de template (en-tête de rôle…) par message
+        """
+        self.token_budget = token_budget
+        self.tokenizer = tokenizer
+        self.summarizer = summarizer
+        self.low_watermark = low_watermark
+        self.message_overhead = message_overhead
+        self._lock = threading.RLock()
+        self._reset()
+
+    # ------------------------------------------------------------------ #
 
     def add_user_message(self, content):
-        self.history.append({"role": "user", "content": content})
+        self._append("user", content)
 
     def add_ai_message(self, content):
-        self.history.append({"role": "assistant", "content": content})
+        self._append("assistant", content)
 
     def get_history(self):
+        """Historique complet : [{"role", "content", "tokens"}]."""
         return self.history
 
+    def get_budgeted_history(self) -> list[dict]:
+        """Résumé éventuel + messages les plus récents tenant dans le budget."""
+        with self._lock:
+            head = []
+            if self.summary:
+                head = [{"role": "system", "content": SUMMARY_HEADER + self.summary, "tokens": self.summary_tokens}]
+            return head + self.history[self._start:]
+
+    @property
+    def budgeted_tokens(self) -> int:
+        return self._window_tokens + self.summary_tokens
+
     def clear(self):
-        self.history = []
+        self._reset()
+
+    def _reset(self):
+        with self._lock:
+            self.history = []
+            self._start = 0              # premier message de la fenêtre budgétée
+            self._window_tokens = 0
+            self.summary: Optional[str] = None
+            self.summary_tokens = 0
+            self._evicted: list[dict] = []   # sortis de la fenêtre, pas encore résumés
+            self._summarizing = False
+            self._generation = getattr(self, "_generation", 0) + 1   # invalide un résumé en cours
+
+    # ------------------------------------------------------------------ #
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False)) + self.message_overhead
+        return estimate_tokens(text) + self.message_overhead
+
+    def _append(self, role: str, content: str):
+        msg = {"role": role, "content": content, "tokens": self.count_tokens(content)}
+        with self._lock:
+            self._on_append(msg)
+            self.history.append(msg)
+            self._window_tokens += msg["tokens"]
+            self._trim()
+
+    def _on_append(self, msg: dict):
+        """Point d'extension (persistance) appelé avant l'ajout d'un message."""
+
+    def _on_summary(self, summary: Optional[str], batch: list[dict]):
+        """Point d'extension (persistance) appelé quand le résumé intègre `batch`."""
+
+    def _trim(self):
+        if not self.token_budget or self.budgeted_tokens <= self.token_budget:
+            self._start_summarizer()     # tours en attente (échec précédent, reprise de session)
+            return
+        target = self.token_budget * self.low_watermark
+        last = len(self.history) - 1          # le dernier message reste toujours visible
+        while self._start < last and self.budgeted_tokens > target:
+            self._evict()
+        # La fenêtre commence par un message utilisateur.
+        while self._start < last and self.history[self._start]["role"] != "user":
+            self._evict()
+        self._start_summarizer()
+
+    def _start_summarizer(self):
+        if self.summarizer is not None and self._evicted and not self._summarizing:
+            self._summarizing = True
+            threading.Thread(target=self._summarize_loop, args=(self._generation,), daemon=True).start()
+
+    def _evict(self):
+        msg = self.history[self._start]
+        self._start += 1
+        self._window_tokens -= msg["tokens"]
+        if self.summarizer is not None:
+            self._evicted.append(msg)
+
+    def _summarize_loop(self, generation: int):
+        failures = 0
+        while True:
+            with self._lock:
+                if generation != self._generation or not self._evicted:
+                    if generation == self._generation:
+                        self._summarizing = False
+                    return
+                batch, self._evicted = self._evicted, []
+                previous = self.summary
+            try:
+                summary = self.summarizer(previous, [{"role": m["role"], "content": m["content"]} for m in batch])
+            except Exception as e:
+                print(f"[WARN] Résumé de conversation impossible : {e}")
+                failures += 1
+                with self._lock:
+                    if generation != self._generation:
+                        return
+                    # Le lot reste à résumer (avant les tours évincés entre-temps)
+                    self._evicted = batch + self._evicted
+                    if failures >= SUMMARY_MAX_FAILURES:
+                        self._summarizing = False   # nouvel essai au prochain message
+                        return
+                time.sleep(SUMMARY_BACKOFF_S * 2 ** (failures - 1))
+                continue
+            failures = 0
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self.summary = summary or None
+                self.summary_tokens = self.count_tokens(SUMMARY_HEADER + summary) if summary else 0
+                self._on_summary(self.summary, batch)
+                self._trim()
+
+
+def llm_summarizer(base_url: str = "http://localhost:8000/v1",
+                   model: str = "auto",
+                   max_tokens: int = 256,
+                   timeout: float = 120) -> Callable[[Optional[str], list[dict]], str]:
+    """Résumeur via l'API de chat (classe de priorité "batch" : ne ralentit pas les tours interactifs)."""
+
+    def summarize(previous: Optional[str], messages: list[dict]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (
+            "Mets à jour le résumé d'une conversation avec les nouveaux échanges. "
+            "Garde les faits, décisions et questions en suspens ; sois concis.\n\n"
+            f"Résumé actuel :\n{previous or '(aucun)'}\n\nNouveaux échanges :\n{transcript}\n\nRésumé mis à jour :"
+        )
+        r = requests.post(f"{base_url}/chat/completions", timeout=timeout, json={
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_completion_tokens": max_tokens,
+            "temperature": 0,
+            "priority": "batch",
+        })
+        r.raise_for_status()
+        return r.json()["choices"][0]["message"]["content"].strip()
+
+    return summarize
@@ -0,0 +1,259 @@
+# src/tools/chat_store.py
+"""
+Stockage persistant des conversations (SQLite) derrière l'API de ChatMemory.
+
+- Une base pour toutes les sessions ; les messages sont écrits en ajout seul
+  (clé (session_id, seq)) avec leur nombre de tokens, compté une seule fois.
+- Une session reprise ne charge que sa fin : les messages les plus récents
+  qui tiennent dans le budget de tokens (ou les `tail_messages` derniers),
+  plus le résumé persisté des tours plus anciens.
+- Rien n'est gardé en mémoire par session hors des ChatMemory ouvertes : la
+  mémoire reste constante quel que soit le nombre de conversations stockées.
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from src.tools.chat_memory import SUMMARY_HEADER, ChatMemory
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parents[2] / "data" / "chat_sessions.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id            TEXT PRIMARY KEY,
+    title         TEXT,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL,
+    n_messages    INTEGER NOT NULL DEFAULT 0,
+    summary       TEXT,
+    summary_upto  INTEGER NOT NULL DEFAULT -1   -- dernier seq intégré au résumé
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated_at);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id  TEXT NOT NULL,
+    seq         INTEGER NOT NULL,
+    role        TEXT NOT NULL,
+    content     TEXT NOT NULL,
+    tokens      INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class ChatStore:
+    def __init__(self, path: str | Path = DEFAULT_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Connexion partagée entre threads (UI, chains, résumeur), accès sérialisés.
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Sessions ------------------------------------------------------- #
+
+    def create_session(self, title: Optional[str] = None) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, title, now, now),
+            )
+        return session_id
+
+    def list_sessions(self, limit: int = 50, offset: int = 0) -> list[dict]:
+        """Sessions les plus récemment actives d'abord (paginé)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, updated_at, n_messages FROM sessions ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [{"id": r[0], "title": r[1], "updated_at": r[2], "n_messages": r[3]} for r in rows]
+
+    def session(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, title, updated_at, n_messages, summary, summary_upto FROM sessions WHERE id = ?",
+                (session_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "title": row[1], "updated_at": row[2], "n_messages": row[3],
+                "summary": row[4], "summary_upto": row[5]}
+
+    def set_title(self, session_id: str, title: str):
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET title = ? WHERE id = ?", (title, session_id))
+
+    def set_summary(self, session_id: str, summary: Optional[str], upto_seq: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE sessions SET summary = ?, summary_upto = MAX(summary_upto, ?) WHERE id = ?",
+                (summary, upto_seq, session_id),
+            )
+
+    def reset_session(self, session_id: str):
+        """Vide une session (messages, résumé, titre) en gardant son identifiant."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute(
+                "UPDATE sessions SET n_messages = 0, summary = NULL, summary_upto = -1, title = NULL, updated_at = ? "
+                "WHERE id = ?", (time.time(), session_id),
+            )
+            self._conn.execute("COMMIT")
+
+    def delete_session(self, session_id: str):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.execute("COMMIT")
+
+    # --- Messages ------------------------------------------------------- #
+
+    def append(self, session_id: str, role: str, content: str, tokens: int) -> int:
+        """Ajoute un message en fin de session ; renvoie son numéro (seq)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT n_messages FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                if row is None:
+                    raise KeyError(f"Session inconnue : {session_id}")
+                seq = row[0]
+                self._conn.execute(
+                    "INSERT INTO messages (session_id, seq, role, content, tokens, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, seq, role, content, tokens, now),
+                )
+                self._conn.execute(
+                    "UPDATE sessions SET n_messages = ?, updated_at = ? WHERE id = ?", (seq + 1, now, session_id)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def tail(self, session_id: str, max_tokens: Optional[int] = None,
+             max_messages: Optional[int] = None, after_seq: int = -1) -> list[dict]:
+        """
+        Derniers messages (ordre chronologique) tenant dans `max_tokens` et
+        `max_messages`, commençant par un message utilisateur. Lecture à
+        rebours : seules les lignes retournées sont parcourues.
+        """
+        picked, total = [], 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT seq, role, content, tokens FROM messages WHERE session_id = ? AND seq > ? ORDER BY seq DESC",
+                (session_id, after_seq),
+            )
+            for seq, role, content, tokens in cursor:
+                if max_messages is not None and len(picked) >= max_messages:
+                    break
+                if max_tokens is not None and picked and total + tokens > max_tokens:
+                    break
+                picked.append({"role": role, "content": content, "tokens": tokens, "seq": seq})
+                total += tokens
+            cursor.close()
+        picked.reverse()
+        while len(picked) > 1 and picked[0]["role"] != "user":
+            picked.pop(0)
+        return picked
+
+    def messages(self, session_id: str, start_seq: int = 0, end_seq: Optional[int] = None) -> list[dict]:
+        """Messages de seq dans [start_seq, end_seq) (toute la session par défaut)."""
+        end_seq = end_seq if end_seq is not None else 2 ** 62
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, role, content, tokens FROM messages "
+                "WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (session_id, start_seq, end_seq),
+            ).fetchall()
+        return [{"role": r[1], "content": r[2], "tokens": r[3], "seq": r[0]} for r in rows]
+
+    def open_memory(self, session_id: Optional[str] = None, **kwargs) -> "PersistentChatMemory":
+        """ChatMemory adossée à une session (créée si `session_id` est None)."""
+        return PersistentChatMemory(self, session_id or self.create_session(), **kwargs)
+
+
+class PersistentChatMemory(ChatMemory):
+    """ChatMemory dont les messages et le résumé sont persistés dans un ChatStore."""
+
+    def __init__(self, store: ChatStore, session_id: str, tail_messages: int = 200, **kwargs):
+        """
+        Args:
+            store        : base des sessions
+            session_id   : session à reprendre
+            tail_messages: messages max gardés en mémoire (et chargés à la reprise)
+            **kwargs     : paramètres de ChatMemory (token_budget, summarizer…)
+        """
+        self.store = store
+        self.session_id = session_id
+        self.tail_messages = tail_messages
+        super().__init__(**kwargs)
+        self._load()
+
+    def _load(self):
+        meta = self.store.session(self.session_id)
+        if meta is None:
+            raise KeyError(f"Session inconnue : {self.session_id}")
+        with self._lock:
+            self.history = self.store.tail(self.session_id, max_tokens=self.token_budget,
+                                           max_messages=self.tail_messages, after_seq=meta["summary_upto"])
+            self._window_tokens = sum(m["tokens"] for m in self.history)
+            self.summary = meta["summary"]
+            self.summary_tokens = self.count_tokens(SUMMARY_HEADER + self.summary) if self.summary else 0
+            first_seq = self.history[0]["seq"] if self.history else meta["n_messages"]
+            if self.summarizer is not None and meta["summary_upto"] + 1 < first_seq:
+                # Tours sortis de la fenêtre mais pas encore résumés lors de la session précédente
+                self._evicted = self.store.messages(self.session_id, meta["summary_upto"] + 1, first_seq)
+            self._trim()
+            # Tours en attente de la session précédente : résumés dès la reprise, même sous le budget
+            self._start_summarizer()
+
+    @property
+    def title(self) -> Optional[str]:
+        meta = self.store.session(self.session_id)
+        return meta["title"] if meta else None
+
+    def get_history(self):
+        """Historique complet, relu depuis la base."""
+        return self.store.messages(self.session_id)
+
+    def clear(self):
+        """Efface la conversation (en base aussi) ; la session reste ouverte, vide."""
+        with self._lock:
+            self.store.reset_session(self.session_id)
+            self._reset()
+
+    def _on_append(self, msg: dict):
+        msg["seq"] = self.store.append(self.session_id, msg["role"], msg["content"], msg["tokens"])
+        if msg["seq"] == 0 and msg["role"] == "user":
+            self.store.set_title(self.session_id, msg["content"][:80])
+
+    def _on_summary(self, summary: Optional[str], batch: list[dict]):
+        self.store.set_summary(self.session_id, summary, batch[-1]["seq"])
+
+    def _trim(self):
+        if self.token_budget is None:
+            # Sans budget, la fenêtre en mémoire est bornée en nombre de messages.
+            while len(self.history) - self._start > self.tail_messages:
+                self._evict()
+        super()._trim()
+        # Les messages évincés restent sur disque : on ne garde en mémoire que la fenêtre.
+        if self._start and self._start * 2 >= len(self.history):
+            del self.history[:self._start]
+            self._start = 0
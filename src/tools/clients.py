@@ -0,0 +1,162 @@
+# src/tools/clients.py
+"""
+Clients réseau partagés par toutes les chains (LLM vLLM, embeddings TEI, Milvus).
+
+- Créés à la première utilisation (aucune connexion à l'import d'une chain),
+  puis réutilisés : une seule connexion Milvus et un seul pool HTTP
+  keep-alive pour vLLM et TEI, quel que soit le nombre de chains chargées.
+- Les clients async (pool httpx.AsyncClient, LLM async) sont liés à une
+  boucle asyncio : un jeu par boucle, libéré avec elle.
+- Ce module n'est pas rechargé quand une chain l'est : les connexions
+  survivent au rechargement à chaud des chains.
+- Adresses surchargeables par variables d'environnement ; les valeurs par
+  défaut sont celles du réseau docker de l'UI (comme l'ingestion PDF).
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+
+VLLM_BASE_URL = os.environ.get("PYTHIA_VLLM_URL", "http://localhost:8000/v1")
+TEI_URL = os.environ.get("TEI_URL", "http://tei:80")
+# Requêtes d'embedding TEI en vol par client (ingestion et recherche partagent le client)
+TEI_CONCURRENCY = int(os.environ.get("TEI_CONCURRENCY", "4"))
+MILVUS_HOST = os.environ.get("MILVUS_HOST", "milvus-standalone")
+MILVUS_PORT = os.environ.get("MILVUS_PORT", "19530")
+COLLECTION_NAME = "rag_demo"
+# Cache sémantique des réponses RAG : désactivé si le seuil n'est pas défini (ex. 0.95)
+ANSWER_CACHE_THRESHOLD = os.environ.get("PYTHIA_ANSWER_CACHE_THRESHOLD")
+ANSWER_CACHE_SIZE = int(os.environ.get("PYTHIA_ANSWER_CACHE_SIZE", "1024"))
+
+# Pool HTTP : générations longues (timeout de lecture large), connexions gardées ouvertes.
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+HTTP_LIMITS = httpx.Limits(max_connections=256, max_keepalive_connections=64, keepalive_expiry=60)
+
+_clients: dict = {}
+_loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+# Les fabriques reçoivent leurs dépendances déjà créées ; réentrant par sécurité
+_lock = threading.RLock()
+
+
+def _shared(key, factory):
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = factory()
+    return client
+
+
+def _loop_shared(key, factory):
+    """Comme _shared, mais un client par boucle asyncio (appel depuis une coroutine)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _loop_clients.setdefault(loop, {})
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = factory()   # une boucle = un thread : pas de course ici
+    return client
+
+
+def get_http_client() -> httpx.Client:
+    """Pool HTTP synchrone partagé (vLLM, TEI)."""
+    return _shared("http", lambda: httpx.Client(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS))
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Pool HTTP async partagé par toutes les coroutines de la boucle courante."""
+    return _loop_shared("http", lambda: httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS))
+
+
+def _chat_openai(overrides: dict, **clients):
+    from langchain_openai import ChatOpenAI
+    params = {"base_url": VLLM_BASE_URL, "api_key": "not-needed", "model": "auto"}
+    params.update(overrides)
+    return ChatOpenAI(**params, **clients)
+
+
+def get_llm(**overrides):
+    """ChatOpenAI vers vLLM (appels sync) ; un client par jeu de paramètres (temperature…)."""
+    http_client = get_http_client()   # hors du verrou de _shared
+    return _shared(("llm", tuple(sorted(overrides.items()))),
+                   lambda: _chat_openai(overrides, http_client=http_client))
+
+
+def get_async_llm(**overrides):
+    """ChatOpenAI pour ainvoke/astream, sur le pool async de la boucle courante."""
+    http_client, http_async_client = get_http_client(), get_async_http_client()
+    return _loop_shared(("llm", tuple(sorted(overrides.items()))),
+                        lambda: _chat_openai(overrides, http_client=http_client,
+                                             http_async_client=http_async_client))
+
+
+def get_embeddings():
+    """Embeddings TEI (sync et async) sur les pools partagés."""
+
+    def factory():
+        from src.tools.RAG.embedding_client import TEIEmbeddings
+        return TEIEmbeddings(TEI_URL, concurrency=TEI_CONCURRENCY)
+
+    return _shared("embeddings", factory)
+
+
+def get_vectorstore(collection_name: str = COLLECTION_NAME):
+    """Vector store Milvus (collection alimentée par l'ingestion PDF)."""
+    embeddings = get_embeddings()   # dépendance créée hors du verrou de _shared
+
+    def factory():
+        from langchain_milvus.vectorstores.milvus import Milvus
+        return Milvus(
+            embedding_function=embeddings,
+            collection_name=collection_name,
+            connection_args={"uri": f"http://{MILVUS_HOST}:{MILVUS_PORT}"},
+        )
+
+    return _shared(("vectorstore", collection_name), factory)
+
+
+def get_milvus_client():
+    """Client Milvus bas niveau (recherche multi-vecteurs en un appel)."""
+
+    def factory():
+        from pymilvus import MilvusClient
+        return MilvusClient(uri=f"http://{MILVUS_HOST}:{MILVUS_PORT}")
+
+    return _shared("milvus", factory)
+
+
+def get_retriever(collection_name: str = COLLECTION_NAME, k: int = 4):
+    """Récupération RAG avec caches (embeddings des questions, résultats Milvus)."""
+    embeddings = get_embeddings()   # dépendance créée hors du verrou de _shared
+
+    def factory():
+        from src.tools.RAG.retrieval_cache import CachedRetriever, milvus_search
+        return CachedRetriever(embeddings, milvus_search(collection_name), collection_name, k=k)
+
+    return _shared(("retriever", collection_name, k), factory)
+
+
+def get_answer_cache(collection_name: str = COLLECTION_NAME):
+    """Cache sémantique des réponses RAG, ou None s'il n'est pas activé."""
+    if not ANSWER_CACHE_THRESHOLD:
+        return None
+
+    def factory():
+        from src.tools.RAG.answer_cache import SemanticAnswerCache
+        return SemanticAnswerCache(collection_name, float(ANSWER_CACHE_THRESHOLD), ANSWER_CACHE_SIZE)
+
+    return _shared(("answer_cache", collection_name), factory)
+
+
+async def aclose_loop_clients():
+    """Ferme les pools async de la boucle courante (avant l'arrêt de la boucle)."""
+    with _lock:
+        clients = _loop_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        if isinstance(client, httpx.AsyncClient):
+            await client.aclose()
+
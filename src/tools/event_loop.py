@@ -0,0 +1,61 @@
+# src/tools/event_loop.py
+"""
+Boucle asyncio hébergée dans un thread, pour lancer des coroutines depuis du
+code synchrone (UI Qt) : toutes les requêtes partagent un seul thread et les
+pools HTTP async de src.tools.clients, au lieu d'un thread OS et d'une
+connexion TCP par appel.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Awaitable, Iterable, Optional
+
+from src.tools.clients import aclose_loop_clients
+
+
+class EventLoopThread:
+    def __init__(self, name: str = "asyncio-host"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """Planifie `coro` sur la boucle ; renvoie un Future thread-safe."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """Exécute `coro` et attend son résultat (bloquant : hors thread de la boucle)."""
+        return self.submit(coro).result(timeout)
+
+    def gather(self, coros: Iterable[Awaitable], concurrency: int = 32) -> concurrent.futures.Future:
+        """
+        Exécute des coroutines avec au plus `concurrency` en vol (ex. balayage
+        d'évaluation) ; le Future renvoie les résultats dans l'ordre, les
+        exceptions à la place des résultats en échec.
+        """
+
+        async def _bounded(sem, coro):
+            async with sem:
+                return await coro
+
+        async def _all():
+            sem = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(_bounded(sem, c) for c in coros), return_exceptions=True)
+
+        return self.submit(_all())
+
+    def stop(self, timeout: float = 5):
+        """Ferme les pools async puis arrête la boucle."""
+        if not self.loop.is_running():
+            return
+        try:
+            self.run(aclose_loop_clients(), timeout)
+        except Exception as e:
+            print(f"[WARN] Fermeture des clients async : {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
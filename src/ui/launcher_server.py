@@ -1,7 +1,10 @@
 # src/ui/launcher_server.py
+import os
 import sys
+import time
 import subprocess
 import threading
+import requests
 from flask import Flask, request
 
 app = Flask(__name__)
@@ -26,20 +29,263 @@ def stop_milvus():
 
 
 # ---------------- vLLM ----------------
-VLLM_PROCESS = None
+# Les clients parlent au routeur (port 8000) ; les instances vllm_chat_server
+# tournent derrière lui à partir du port BACKEND_PORT_BASE. Avec `replicas: N`
+# (ou `devices: [...]`), N répliques data-parallel sont lancées, chacune
+# épinglée sur son GPU, et le routeur répartit la charge entre elles.
+# Un reload démarre une instance neuve sur un port libre, la chauffe, bascule
+# le trafic puis draine l'ancienne (réplique par réplique).
+VLLM_DIR = "/home/theoub02/ai_gen/Projets/pythia/src/vllm_server"
+ROUTER_URL = "http://127.0.0.1:8000"
+BACKEND_PORT_BASE = 8001
+READY_TIMEOUT_S = 1800     # chargement des poids + profiling vLLM
+DRAIN_TIMEOUT_S = 600      # temps laissé aux requêtes en cours avant arrêt
 
-def stream_logs(process):
+ROUTER_PROCESS = None
+VLLM_INSTANCES = {}        # port -> VllmInstance
+ACTIVE_PORTS = []          # instances actuellement routées
+VLLM_LOCK = threading.Lock()   # sérialise up / reload / down
+
+
+def stream_logs(process, prefix="vLLM"):
     """Relaye les logs de vLLM vers la console Flask en direct."""
     for line in iter(process.stdout.readline, ''):
         if line:
-            print(f"[vLLM] {line}", end='')
+            print(f"[{prefix}] {line}", end='')
     process.stdout.close()
 
+
+class VllmInstance:
+    """Un process vllm_chat_server sur un port donné."""
+
+    def __init__(self, model_name, port, extra_args=(), cuda_visible_devices=None):
+        self.model_name = model_name
+        self.port = port
+        self.extra_args = list(extra_args)
+        self.cuda_visible_devices = cuda_visible_devices
+        self.process = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        env = dict(os.environ)
+        if self.cuda_visible_devices is not None:
+            env["CUDA_VISIBLE_DEVICES"] = str(self.cuda_visible_devices)
+        self.process = subprocess.Popen(
+            [f"{VLLM_DIR}/launch-vllm.sh", self.model_name, "--port", str(self.port), *self.extra_args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=env,
+        )
+        threading.Thread(target=stream_logs, args=(self.process, f"vLLM:{self.port}"), daemon=True).start()
+
+    def status(self):
+        try:
+            return requests.get(f"{self.url}/v1/status", timeout=2).json()
+        except Exception:
+            return None
+
+    def wait_ready(self, timeout=READY_TIMEOUT_S):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not self.alive():
+                return False
+            st = self.status()
+            if st and st.get("ready") is True:
+                return True
+            time.sleep(2)
+        return False
+
+    def warm_up(self):
+        """Courte génération pour amorcer le moteur avant de recevoir le trafic."""
+        try:
+            requests.post(
+                f"{self.url}/v1/chat/completions",
+                json={"messages": [{"role": "user", "content": "ping"}],
+                      "max_completion_tokens": 8, "temperature": 0, "priority": "batch"},
+                timeout=120,
+            )
+        except Exception as e:
+            print(f"[vLLM:{self.port}] Warm-up échoué (non bloquant) : {e}")
+
+    def drain_and_stop(self, timeout=DRAIN_TIMEOUT_S):
+        """Attend la fin des requêtes en cours (in_flight = 0) puis arrête le process."""
+        deadline = time.time() + timeout
+        while self.alive() and time.time() < deadline:
+            st = self.status()
+            if st is None or not st.get("in_flight"):
+                break
+            time.sleep(1)
+        if self.alive():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        print(f"[vLLM:{self.port}] Instance arrêtée.")
+
+
+def _vllm_extra_args(data):
+    # Modèles supplémentaires servis par le même process (hot-swap LRU, routage par `model`)
+    extra_args = []
+    models = data.get("models") or []
+    if models:
+        extra_args += ["--models", ",".join(models)]
+    if data.get("cpu_park_budget_gb"):
+        extra_args += ["--cpu_park_budget_gb", str(data["cpu_park_budget_gb"])]
+    return extra_args
+
+
+def _ensure_router():
+    global ROUTER_PROCESS
+    if ROUTER_PROCESS is not None and ROUTER_PROCESS.poll() is None:
+        return
+    ROUTER_PROCESS = subprocess.Popen(
+        [f"{VLLM_DIR}/launch-router.sh", "--port", "8000"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+    )
+    threading.Thread(target=stream_logs, args=(ROUTER_PROCESS, "router"), daemon=True).start()
+
+
+def _route_to(urls, retries=30):
+    """Définit les instances actives du routeur (attend qu'il réponde)."""
+    for _ in range(retries):
+        try:
+            requests.put(f"{ROUTER_URL}/router/backends", json={"backends": urls}, timeout=2)
+            return True
+        except Exception:
+            time.sleep(1)
+    print("[vLLM] Routeur injoignable, bascule impossible.")
+    return False
+
+
+def _stop_router():
+    global ROUTER_PROCESS
+    if ROUTER_PROCESS is not None and ROUTER_PROCESS.poll() is None:
+        ROUTER_PROCESS.terminate()
+        try:
+            ROUTER_PROCESS.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            ROUTER_PROCESS.kill()
+    ROUTER_PROCESS = None
+
+
+def _free_port():
+    port = BACKEND_PORT_BASE
+    while port in VLLM_INSTANCES:
+        port += 1
+    return port
+
+
+def _active_instances():
+    return [VLLM_INSTANCES[p] for p in ACTIVE_PORTS if p in VLLM_INSTANCES]
+
+
+def _replica_devices(data, current):
+    """CUDA_VISIBLE_DEVICES de chaque réplique (None = hérité de l'environnement)."""
+    if data.get("devices"):
+        return [str(d) for d in data["devices"]]
+    replicas = int(data.get("replicas") or 0)
+    if replicas > 1:
+        return [str(i) for i in range(replicas)]
+    if replicas == 1 or data.get("cuda_visible_devices") is not None or not current:
+        return [data.get("cuda_visible_devices")]
+    return [inst.cuda_visible_devices for inst in current]
+
+
+def _launch(model_name, device, extra_args):
+    inst = VllmInstance(model_name, _free_port(), extra_args, device)
+    VLLM_INSTANCES[inst.port] = inst
+    inst.start()
+    print(f"[vLLM] Instance {inst.port} en démarrage ({model_name}, GPU {device if device is not None else 'défaut'})…")
+    return inst
+
+
+def _bring_up(inst):
+    """Attend ready + warm-up ; arrête l'instance et renvoie False si elle ne démarre pas."""
+    if inst.wait_ready():
+        inst.warm_up()
+        return True
+    print(f"[vLLM] Instance {inst.port} non prête : abandon.")
+    inst.drain_and_stop(timeout=0)
+    VLLM_INSTANCES.pop(inst.port, None)
+    return False
+
+
+def _set_routed(ports):
+    global ACTIVE_PORTS
+    if not _route_to([VLLM_INSTANCES[p].url for p in ports]):
+        return False
+    ACTIVE_PORTS = list(ports)
+    print(f"[vLLM] Trafic routé vers : {ACTIVE_PORTS}")
+    return True
+
+
+def _deploy(data, reload):
+    """
+    Démarre les répliques, attend ready + warm-up et les ajoute au routeur.
+    En reload, le remplacement est progressif : chaque nouvelle réplique prend
+    la place d'une ancienne, qui est ensuite drainée puis arrêtée.
+    """
+    with VLLM_LOCK:
+        old = _active_instances() if reload else []
+        model_name = data.get("model_name") or (old[0].model_name if old else None)
+        extra_args = _vllm_extra_args(data)
+        devices = _replica_devices(data, old)
+        _ensure_router()
+
+        if not reload:
+            # Démarrage à froid : toutes les répliques chargent en parallèle.
+            started = [_launch(model_name, d, extra_args) for d in devices]
+            ready = [inst.port for inst in started if _bring_up(inst)]
+            if ready and not _set_routed(ready):
+                for port in ready:
+                    VLLM_INSTANCES.pop(port).drain_and_stop(timeout=0)
+            return
+
+        for i, device in enumerate(devices):
+            new = _launch(model_name, device, extra_args)
+            if not _bring_up(new):
+                print("[vLLM] Reload interrompu, les anciennes instances restantes gardent le trafic.")
+                return
+            retired = old[i] if i < len(old) else None
+            ports = [p for p in ACTIVE_PORTS if retired is None or p != retired.port] + [new.port]
+            if not _set_routed(ports):
+                new.drain_and_stop(timeout=0)
+                VLLM_INSTANCES.pop(new.port, None)
+                return
+            if retired is not None:
+                print(f"[vLLM] Drain de l'ancienne instance {retired.port}…")
+                retired.drain_and_stop()
+                VLLM_INSTANCES.pop(retired.port, None)
+
+        # Moins de répliques qu'avant : on retire le surplus.
+        surplus = old[len(devices):]
+        if surplus:
+            _set_routed([p for p in ACTIVE_PORTS if p not in {inst.port for inst in surplus}])
+            for inst in surplus:
+                inst.drain_and_stop()
+                VLLM_INSTANCES.pop(inst.port, None)
+
+
 @app.route("/vllm/up", methods=["POST"])
 def start_vllm():
-    """Lance vLLM via launch-vllm.sh avec le modèle choisi (si pas déjà en cours)."""
-    global VLLM_PROCESS
-    if VLLM_PROCESS is not None and VLLM_PROCESS.poll() is None:
+    """
+    Lance vLLM (routeur + instance(s)) avec le modèle choisi (si pas déjà en cours).
+    JSON : model_name, et optionnellement replicas (N répliques sur les GPU 0..N-1)
+    ou devices (liste explicite de CUDA_VISIBLE_DEVICES, une réplique par entrée).
+    """
+    if any(inst.alive() for inst in _active_instances()) or VLLM_LOCK.locked():
         return "vLLM already running\n", 200
 
     # Récupérer model_name depuis le JSON envoyé par l'UI
@@ -48,35 +294,49 @@ def start_vllm():
     if not model_name:
         return "Missing model_name in request\n", 400
 
-    script_path = "/home/theoub02/ai_gen/Projets/pythia/src/vllm_server/launch-vllm.sh"
-    VLLM_PROCESS = subprocess.Popen(
-        [script_path, model_name],   # <-- passe model_name en argument
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        bufsize=1
-    )
-
-    # Thread qui lit les logs et les affiche
-    threading.Thread(target=stream_logs, args=(VLLM_PROCESS,), daemon=True).start()
-
+    threading.Thread(target=_deploy, args=(data, False), daemon=True).start()
     return f"vLLM starting with model: {model_name}\n", 200
 
 
+@app.route("/vllm/reload", methods=["POST"])
+def reload_vllm():
+    """
+    Reload blue/green sans coupure : nouvelle instance (config JSON relue),
+    warm-up, bascule du routeur, puis drain et arrêt de l'ancienne.
+    JSON optionnel : model_name, models, cpu_park_budget_gb, cuda_visible_devices,
+    replicas, devices (sinon les répliques gardent leurs GPU).
+    Ancienne et nouvelle instance coexistent pendant la bascule : la GPU (ou le
+    cuda_visible_devices choisi) doit pouvoir les accueillir ensemble.
+    """
+    current = _active_instances()
+    if not any(inst.alive() for inst in current):
+        return "vLLM not running, use /vllm/up\n", 409
+    if VLLM_LOCK.locked():
+        return "vLLM reload already in progress\n", 409
+    data = request.get_json(silent=True) or {}
+    threading.Thread(target=_deploy, args=(data, True), daemon=True).start()
+    return f"vLLM reload started (model: {data.get('model_name') or current[0].model_name})\n", 202
+
 
 @app.route("/vllm/down", methods=["POST"])
 def stop_vllm():
-    """Arrête vLLM et décharge le modèle (kill du process)."""
-    global VLLM_PROCESS
-    if VLLM_PROCESS and VLLM_PROCESS.poll() is None:
-        VLLM_PROCESS.terminate()
-        try:
-            VLLM_PROCESS.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            VLLM_PROCESS.kill()
-        VLLM_PROCESS = None
-        return "vLLM stopped\n", 200
-    return "vLLM not running\n", 200
+    """Retire vLLM du routeur, draine les requêtes en cours, puis arrête instances et routeur."""
+    if not any(inst.alive() for inst in VLLM_INSTANCES.values()):
+        _stop_router()
+        return "vLLM not running\n", 200
+
+    def _down():
+        global ACTIVE_PORTS
+        with VLLM_LOCK:
+            _route_to([], retries=1)
+            for inst in list(VLLM_INSTANCES.values()):
+                inst.drain_and_stop()
+            VLLM_INSTANCES.clear()
+            ACTIVE_PORTS = []
+            _stop_router()
+
+    threading.Thread(target=_down, daemon=True).start()
+    return "vLLM stopping (drain en cours)\n", 200
 
 
 # ---------------- Shutdown Flask ----------------
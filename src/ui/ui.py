@@ -1,9 +1,9 @@
 import sys
+import asyncio
 import subprocess
 import threading
 import requests
 import time
-import importlib
 from importlib import import_module
 from pathlib import Path
 import signal
@@ -13,14 +13,20 @@ from PyQt5.QtWidgets import (
     QVBoxLayout, QHBoxLayout, QComboBox, QFileDialog
 )
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QProcess
-from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtGui import QColor, QPainter, QTextCursor
 
-from src.tools.chat_memory import ChatMemory
+from src.tools.chain_registry import ChainRegistry
+from src.tools.chat_memory import llm_summarizer
+from src.tools.chat_store import ChatStore
+from src.tools.event_loop import EventLoopThread
 from src.tools.RAG.pdf_loader import ingest_pdf
 from pymilvus import connections, utility
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
 
+# Tokens d'historique envoyés à chaque tour (au-delà : éviction + résumé en arrière-plan)
+CHAT_HISTORY_TOKEN_BUDGET = 6000
+
 # --------------------------------------------------------------------------- #
 #                           Widgets utilitaires                               #
 # --------------------------------------------------------------------------- #
@@ -51,12 +57,21 @@ class StatusLight(QWidget):
 class ModelChatUI(QWidget):
     """Interface principale : gestion vLLM + chains + PDF à venir."""
     append_message = pyqtSignal(str)
+    append_chunk = pyqtSignal(str)   # fragments streamés, collés au dernier message
+    chains_changed = pyqtSignal()    # fichier ajouté / supprimé dans src/chains
 
     def __init__(self):
         super().__init__()
         self.vllm_thread = None
         self.vllm_process = None
-        self.memory = ChatMemory()
+        # Conversations persistées (SQLite) ; historique envoyé aux chains borné en
+        # tokens, les tours évincés sont résumés.
+        self.chat_store = ChatStore()
+        self.memory = None
+        # Chains importées une fois, préchauffées en arrière-plan et rechargées à chaud.
+        self.chain_registry = ChainRegistry()
+        # Boucle asyncio unique pour les requêtes aux chains (pools HTTP keep-alive partagés)
+        self.loop_host = EventLoopThread()
         self.tei_process = None  # gestion du process TEI
         self.tei_log_thread = None  # thread de suivi des logs
         self.tei_log_process = None  # Popen docker logs
@@ -102,6 +117,17 @@ class ModelChatUI(QWidget):
         chain_layout.addWidget(QLabel("Chains :"))
         chain_layout.addWidget(self.chain_list)
 
+        # --- Conversations (reprise d'une session enregistrée) -------------------
+        self.session_list = QComboBox()
+        self.session_list.activated.connect(self.switch_session)
+        self.new_session_button = QPushButton("Nouvelle conversation")
+        self.new_session_button.clicked.connect(lambda: self.open_session(None))
+
+        session_layout = QHBoxLayout()
+        session_layout.addWidget(QLabel("Conversation :"))
+        session_layout.addWidget(self.session_list, 1)
+        session_layout.addWidget(self.new_session_button)
+
         # --- Gestion RAG ---------------------------------------------------------
         self.tei_launch_button = QPushButton("Lancer RAG Tools")
         self.tei_launch_button.clicked.connect(self.launch_rag_tools)
@@ -163,6 +189,7 @@ class ModelChatUI(QWidget):
         main_layout.addLayout(header_layout)
         main_layout.addWidget(QLabel("Chains"))
         main_layout.addLayout(chain_layout)
+        main_layout.addLayout(session_layout)
         main_layout.addWidget(QLabel("Serveur TEI"))
         main_layout.addLayout(tei_layout)
         main_layout.addWidget(QLabel("Document PDF"))
@@ -173,6 +200,16 @@ class ModelChatUI(QWidget):
         self.setLayout(main_layout)
         self.setWindowTitle("Interface Chat LLM")
         self.append_message.connect(self.chat_display.append)
+        self.append_chunk.connect(self.insert_chunk)
+        self.chains_changed.connect(self.refresh_chains)
+
+        # Chains : préchauffage en arrière-plan puis surveillance des fichiers
+        self.chain_registry.warm_up()
+        self.chain_registry.watch(on_change=lambda _names: self.chains_changed.emit())
+
+        # Reprise de la conversation la plus récente
+        recent = self.chat_store.list_sessions(limit=1)
+        self.open_session(recent[0]["id"] if recent else None)
 
         # Ping serveur toutes les 2 s
         self.status_timer = QTimer()
@@ -255,18 +292,50 @@ class ModelChatUI(QWidget):
         self.check_server_status()
 
 
+    # --------------------------- Conversations -------------------------------- #
+
+    def open_session(self, session_id: str | None):
+        """Ouvre (ou crée) une session : seule la fin de la conversation est chargée."""
+        self.memory = self.chat_store.open_memory(
+            session_id,
+            token_budget=CHAT_HISTORY_TOKEN_BUDGET,
+            summarizer=llm_summarizer(),
+        )
+        self.chat_display.clear()
+        if self.memory.summary:
+            self.chat_display.append("[… conversation antérieure résumée]")
+        for msg in self.memory.get_budgeted_history():
+            if msg["role"] == "user":
+                self.chat_display.append(f"[Vous] {msg['content']}")
+            elif msg["role"] == "assistant":
+                self.chat_display.append(f"[LLM] {msg['content']}")
+        self.refresh_sessions()
+
+    def refresh_sessions(self):
+        self.session_list.clear()
+        for session in self.chat_store.list_sessions(limit=50):
+            title = session["title"] or "(nouvelle conversation)"
+            self.session_list.addItem(title, session["id"])
+        index = self.session_list.findData(self.memory.session_id)
+        if index < 0:
+            self.session_list.insertItem(0, "(nouvelle conversation)", self.memory.session_id)
+            index = 0
+        self.session_list.setCurrentIndex(index)
+
+    def switch_session(self, index: int):
+        session_id = self.session_list.itemData(index)
+        if session_id and session_id != self.memory.session_id:
+            self.open_session(session_id)
+
     # --------------------------- Chains --------------------------------------- #
 
     def refresh_chains(self):
-        """Découverte dynamique des modules dans src/chains."""
-        project_dir = Path(__file__).resolve().parents[2]
-        chains_path = project_dir / "src" / "chains"
-        chains = [
-            f.stem for f in chains_path.glob("*.py")
-            if f.is_file() and not f.name.startswith("__")
-        ]
+        """Découverte dynamique des modules dans src/chains (sélection conservée)."""
+        current = self.chain_list.currentText()
         self.chain_list.clear()
-        self.chain_list.addItems(chains)
+        self.chain_list.addItems(self.chain_registry.names())
+        if current:
+            self.chain_list.setCurrentText(current)
 
     def send_prompt(self):
         """Envoie prompt → chain → affichage."""
@@ -274,34 +343,83 @@ class ModelChatUI(QWidget):
         if not prompt:
             return
         self.append_message.emit(f"[Vous] {prompt}")
+        # Vue budgétée des tours précédents (sans le message courant, passé à part)
+        history = self.memory.get_budgeted_history()
         self.memory.add_user_message(prompt)
+        if not history:
+            self.refresh_sessions()   # titre de la session = premier message
         self.prompt_input.clear()
 
         selected_chain = self.chain_list.currentText()
-        threading.Thread(
-            target=self.query_chain, args=(prompt, selected_chain), daemon=True
-        ).start()
+        project_dir = Path(__file__).resolve().parents[2]
+        model_path = str(project_dir / "src" / "models" / self.model_list.currentText())
+        self.loop_host.submit(self.aquery_chain(prompt, selected_chain, history, self.memory, model_path))
 
-    def query_chain(self, prompt: str, chain_name: str):
-        """Appel à run_chain du module sélectionné."""
+    async def aquery_chain(self, prompt: str, chain_name: str, history: list[dict], memory, model_path: str):
+        """Appel à arun_chain(_stream) du module sélectionné, sur la boucle asyncio partagée."""
+        try:
+            chain_module = await asyncio.to_thread(self.chain_registry.get, chain_name)
+        except Exception as e:
+            self.append_message.emit(f"[Erreur chain] {e}")
+            return
+        arun_chain_stream = getattr(chain_module, "arun_chain_stream", None)
+        arun_chain = getattr(chain_module, "arun_chain", None)
+        if arun_chain_stream is None and arun_chain is None:
+            # Chain sans interface async : appel synchrone dans un thread du pool
+            await asyncio.to_thread(self.query_chain, prompt, chain_name, history, memory, model_path)
+            return
         try:
-            module_path = f"src.chains.{chain_name}"
-            chain_module = importlib.import_module(module_path)
+            if arun_chain_stream is not None:
+                self.append_message.emit("[LLM] ")
+                parts = []
+                async for piece in arun_chain_stream(prompt, history, model_path=model_path):
+                    parts.append(piece)
+                    self.append_chunk.emit(piece)
+                response = "".join(parts)
+            else:
+                response = await arun_chain(prompt, history, model_path=model_path)
+                self.append_message.emit(f"[LLM] {response}")
+            memory.add_ai_message(response)
+        except Exception as e:
+            self.append_message.emit(f"[Erreur chain] {e}")
 
-            project_dir = Path(__file__).resolve().parents[2]
-            model_name = self.model_list.currentText()
-            model_path = project_dir / "src" / "models" / model_name
-
-            response = chain_module.run_chain(
-                prompt,
-                self.memory.get_history(),
-                model_path=str(model_path)
-            )
-            self.memory.add_ai_message(response)
-            self.append_message.emit(f"[LLM] {response}")
+    def query_chain(self, prompt: str, chain_name: str, history: list[dict], memory, model_path: str):
+        """Appel à run_chain du module sélectionné."""
+        try:
+            chain_module = self.chain_registry.get(chain_name)
+
+            run_chain_stream = getattr(chain_module, "run_chain_stream", None)
+            if run_chain_stream is not None:
+                # Affichage incrémental : "[LLM] " puis les tokens au fil de l'eau
+                self.append_message.emit("[LLM] ")
+                parts = []
+                for piece in run_chain_stream(
+                    prompt,
+                    history,
+                    model_path=model_path
+                ):
+                    parts.append(piece)
+                    self.append_chunk.emit(piece)
+                response = "".join(parts)
+            else:
+                response = chain_module.run_chain(
+                    prompt,
+                    history,
+                    model_path=model_path
+                )
+                self.append_message.emit(f"[LLM] {response}")
+            memory.add_ai_message(response)
         except Exception as e:
             self.append_message.emit(f"[Erreur chain] {e}")
 
+    def insert_chunk(self, text: str):
+        """Ajoute un fragment streamé à la fin du dernier message (thread Qt)."""
+        cursor = self.chat_display.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        self.chat_display.setTextCursor(cursor)
+        self.chat_display.ensureCursorVisible()
+
     # ----------------------- RAG Management ---------------------------- #
 
     def launch_rag_tools(self):
@@ -535,13 +653,18 @@ class ModelChatUI(QWidget):
     def open_milvus_manager(self):
         """Ouvre la fenêtre de gestion des fichiers Milvus."""
         project_dir = Path(__file__).resolve().parents[2]
-        manager_path = project_dir / "src" / "tools" / "RAG" / "VectorStore" / "milvus_management" / "milvus_manager.py"
-        subprocess.Popen([sys.executable, str(manager_path)])
+        # Lancé en module depuis la racine : imports src.* (journal des modifications RAG)
+        subprocess.Popen(
+            [sys.executable, "-m", "src.tools.RAG.VectorStore.milvus_management.milvus_manager"],
+            cwd=str(project_dir),
+        )
 
     # ------------------------- Fermeture clean -------------------------------- #
 
     def closeEvent(self, event):
         self.status_timer.stop()  # stoppe le polling
+        self.chain_registry.stop()
+        self.loop_host.stop()
         self.close_vllm()
         if self.vllm_thread:
             self.vllm_thread.join(timeout=5)
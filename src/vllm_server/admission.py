@@ -0,0 +1,186 @@
+"""
+admission.py
+Contrôle d'admission pour le serveur de chat : nombre borné de requêtes
+confiées au moteur, file d'attente bornée, classes de priorité et part
+équitable par client.
+
+- Au plus `max_running` requêtes sont en génération (typiquement max_num_seqs).
+- Les suivantes attendent dans une file de profondeur `max_queue_depth` ;
+  au-delà, rejet immédiat (HTTP 429 + Retry-After côté serveur).
+- À la libération d'une place, on sert d'abord la classe la plus prioritaire,
+  puis le client qui a le moins de requêtes en cours, puis l'ordre d'arrivée.
+- Une classe peut être plafonnée (ex. "batch") pour garder des places libres
+  aux requêtes interactives.
+- Plafond par client facultatif (`max_requests_per_client`, 0 = aucun) ;
+  la clé client est fournie par l'appelant (côté serveur : x-client-id,
+  champ `user`, à défaut l'adresse IP).
+"""
+
+import asyncio
+import itertools
+import math
+from collections import Counter
+from typing import Callable, Optional
+
+# Rang de chaque classe (0 = la plus prioritaire)
+PRIORITY_CLASSES = {"interactive": 0, "batch": 1}
+DEFAULT_PRIORITY = "interactive"
+
+
+class AdmissionRejected(Exception):
+    """Requête refusée par le contrôle d'admission."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Place accordée dans le moteur ; `release` est idempotent."""
+
+    def __init__(self, controller: "AdmissionController", client_id: str, priority: str):
+        self._controller = controller
+        self.client_id = client_id
+        self.priority = priority
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._controller._release(self)
+
+
+class _Waiter:
+    __slots__ = ("future", "client_id", "priority", "rank", "seq")
+
+    def __init__(self, future, client_id, priority, seq):
+        self.future = future
+        self.client_id = client_id
+        self.priority = priority
+        self.rank = PRIORITY_CLASSES[priority]
+        self.seq = seq
+
+
+class AdmissionController:
+    def __init__(self,
+                 max_running: int,
+                 max_queue_depth: int = 64,
+                 max_requests_per_client: int = 0,
+                 class_max_running: Optional[dict] = None,
+                 retry_after_s: float = 1.0,
+                 on_queue_change: Optional[Callable[[int], None]] = None):
+        self.max_running = max(1, int(max_running))
+        self.max_queue_depth = max(0, int(max_queue_depth))
+        self.max_requests_per_client = int(max_requests_per_client or 0)
+        self.class_max_running = {k: int(v) for k, v in (class_max_running or {}).items() if v}
+        self.retry_after_s = retry_after_s
+        self.on_queue_change = on_queue_change         # appelé avec la profondeur de file (métrique)
+
+        self.running = 0
+        self.running_by_class: Counter = Counter()
+        self.running_by_client: Counter = Counter()
+        self.active_by_client: Counter = Counter()   # en cours + en attente
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._service_ema: Optional[float] = None     # durée moyenne d'une requête (s)
+
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def normalize_priority(priority: Optional[str]) -> str:
+        priority = (priority or DEFAULT_PRIORITY).strip().lower()
+        return priority if priority in PRIORITY_CLASSES else DEFAULT_PRIORITY
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def observe_service_time(self, seconds: float):
+        """Alimente l'estimation utilisée pour Retry-After."""
+        if self._service_ema is None:
+            self._service_ema = seconds
+        else:
+            self._service_ema = 0.8 * self._service_ema + 0.2 * seconds
+
+    def retry_after(self) -> int:
+        if self._service_ema is None:
+            return max(1, math.ceil(self.retry_after_s))
+        backlog = (len(self._waiters) + 1) / self.max_running
+        return max(1, math.ceil(max(self.retry_after_s, backlog * self._service_ema)))
+
+    async def acquire(self, client_id: str, priority: Optional[str] = None) -> Ticket:
+        """Attend une place dans le moteur ou lève AdmissionRejected."""
+        priority = self.normalize_priority(priority)
+        if self.max_requests_per_client and self.active_by_client[client_id] >= self.max_requests_per_client:
+            raise AdmissionRejected("client_limit", self.retry_after())
+
+        if self._can_run(priority):
+            return self._grant(client_id, priority)
+
+        if len(self._waiters) >= self.max_queue_depth:
+            raise AdmissionRejected("queue_full", self.retry_after())
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), client_id, priority, next(self._seq))
+        self._waiters.append(waiter)
+        self._queue_changed()
+        self.active_by_client[client_id] += 1
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._queue_changed()
+                self._forget_client(client_id)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # La place a été accordée au moment de l'annulation : on la rend.
+                waiter.future.result().release()
+            raise
+
+    # ------------------------------------------------------------------ #
+
+    def _queue_changed(self):
+        if self.on_queue_change is not None:
+            self.on_queue_change(len(self._waiters))
+
+    def _can_run(self, priority: str) -> bool:
+        if self.running >= self.max_running:
+            return False
+        limit = self.class_max_running.get(priority)
+        return limit is None or self.running_by_class[priority] < limit
+
+    def _grant(self, client_id: str, priority: str, queued: bool = False) -> Ticket:
+        self.running += 1
+        self.running_by_class[priority] += 1
+        self.running_by_client[client_id] += 1
+        if not queued:
+            self.active_by_client[client_id] += 1
+        return Ticket(self, client_id, priority)
+
+    def _forget_client(self, client_id: str):
+        self.active_by_client[client_id] -= 1
+        if self.active_by_client[client_id] <= 0:
+            del self.active_by_client[client_id]
+
+    def _release(self, ticket: Ticket):
+        self.running -= 1
+        self.running_by_class[ticket.priority] -= 1
+        self.running_by_client[ticket.client_id] -= 1
+        if self.running_by_client[ticket.client_id] <= 0:
+            del self.running_by_client[ticket.client_id]
+        self._forget_client(ticket.client_id)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Attribue les places libres : priorité, puis part équitable, puis FIFO."""
+        while self._waiters:
+            eligible = [w for w in self._waiters if self._can_run(w.priority)]
+            if not eligible:
+                return
+            best = min(eligible, key=lambda w: (w.rank, self.running_by_client[w.client_id], w.seq))
+            self._waiters.remove(best)
+            self._queue_changed()
+            if best.future.done():
+                self._forget_client(best.client_id)
+                continue
+            best.future.set_result(self._grant(best.client_id, best.priority, queued=True))
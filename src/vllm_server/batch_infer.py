@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+batch_infer.py
+Inférence hors ligne d'un fichier JSONL de requêtes de chat avec vllm.LLM.
+
+Chaque ligne d'entrée est une requête au format /v1/chat/completions :
+    {"id": "...", "messages": [...], "max_completion_tokens": 256, "temperature": 0}
+(ou {"prompt": "..."} pour un simple message utilisateur). Les requêtes sont
+envoyées au moteur par gros lots (`--batch_size`) avec la config JSON du
+modèle, comme vllm_chat_server.py, et les résultats sont écrits dans le JSONL
+de sortie dans l'ordre des lignes d'entrée.
+
+Reprise : après chaque lot, la sortie est synchronisée sur disque puis un
+checkpoint (lignes traitées, taille de la sortie) est écrit. Une exécution
+interrompue, relancée avec les mêmes arguments, tronque la sortie au dernier
+lot complet et reprend à la ligne suivante.
+
+Usage :
+    ./launch-batch.sh --model_name Mistral-7B-Instruct-v0.3 --input in.jsonl --output out.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from vllm import LLM, SamplingParams
+
+from model_config import ModelConfigError, check_model_dir, engine_kwargs, load_model_config
+from prompt_tokens import PromptBuilder, PromptTooLong
+
+DEFAULT_MAX_TOKENS = 512
+
+
+# --- 1. Checkpoint ---
+def load_checkpoint(path: str, input_path: str) -> dict:
+    if not os.path.exists(path):
+        return {"input": input_path, "lines_done": 0, "output_bytes": 0}
+    with open(path, encoding="utf-8") as f:
+        ckpt = json.load(f)
+    if ckpt.get("input") != input_path:
+        sys.exit(f"[ERROR] Le checkpoint {path} correspond à un autre fichier d'entrée : {ckpt.get('input')}")
+    return ckpt
+
+
+def save_checkpoint(path: str, ckpt: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(ckpt, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# --- 2. Requêtes ---
+def parse_request(line: str) -> dict:
+    req = json.loads(line)
+    if not isinstance(req, dict):
+        raise ValueError("chaque ligne doit être un objet JSON")
+    if "messages" not in req and isinstance(req.get("prompt"), str):
+        req["messages"] = [{"role": "user", "content": req["prompt"]}]
+    if not isinstance(req.get("messages"), list) or not req["messages"]:
+        raise ValueError("'messages' (liste non vide) ou 'prompt' requis")
+    return req
+
+
+def sampling_params(req: dict, args) -> SamplingParams:
+    return SamplingParams(
+        temperature=float(req.get("temperature", args.temperature)),
+        top_p=float(req.get("top_p", 1.0)),
+        max_tokens=int(req.get("max_completion_tokens") or req.get("max_tokens") or args.max_tokens),
+        seed=req.get("seed"),
+    )
+
+
+def run_batch(llm: LLM, builder: PromptBuilder, batch: list, args) -> list[dict]:
+    """(n° de ligne, texte) -> enregistrements de sortie, dans le même ordre."""
+    records = [None] * len(batch)
+    prompts, params, slots = [], [], []
+    for i, (lineno, line) in enumerate(batch):
+        try:
+            req = parse_request(line)
+            ids = builder.build(req["messages"]).ids
+        except (ValueError, PromptTooLong) as e:
+            records[i] = {"line": lineno, "error": str(e)}
+            continue
+        records[i] = {"line": lineno, "id": req.get("id", req.get("custom_id"))}
+        prompts.append({"prompt_token_ids": ids})
+        params.append(sampling_params(req, args))
+        slots.append(i)
+
+    if prompts:
+        outputs = llm.generate(prompts, params, use_tqdm=False)
+        for i, out in zip(slots, outputs):
+            completion = out.outputs[0]
+            n_prompt, n_completion = len(out.prompt_token_ids), len(completion.token_ids)
+            records[i]["response"] = {
+                "model": args.model_name,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": completion.text},
+                    "finish_reason": completion.finish_reason,
+                }],
+                "usage": {"prompt_tokens": n_prompt, "completion_tokens": n_completion,
+                          "total_tokens": n_prompt + n_completion},
+            }
+    return records
+
+
+# --- 3. Main ---
+def main():
+    parser = argparse.ArgumentParser(description="Inférence batch JSONL avec vLLM")
+    parser.add_argument("--model_name", type=str, required=True, help="Nom du JSON de config dans src/vllm_server")
+    parser.add_argument("--input", type=str, required=True)
+    parser.add_argument("--output", type=str, required=True)
+    parser.add_argument("--checkpoint", type=str, default=None, help="Défaut : <output>.ckpt")
+    parser.add_argument("--batch_size", type=int, default=512, help="Lignes envoyées au moteur par lot")
+    parser.add_argument("--max_num_seqs", type=int, default=256,
+                        help="Séquences en parallèle dans le moteur (le JSON vise le service interactif)")
+    parser.add_argument("--max_tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--restart", action="store_true", help="Ignore le checkpoint et réécrit la sortie")
+    args = parser.parse_args()
+
+    try:
+        cfg = load_model_config(args.model_name)
+        check_model_dir(cfg)
+    except ModelConfigError as e:
+        sys.exit(f"[ERROR] {e}")
+
+    ckpt_path = args.checkpoint or f"{args.output}.ckpt"
+    input_path = os.path.abspath(args.input)
+    if args.restart and os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    ckpt = load_checkpoint(ckpt_path, input_path)
+    output_size = os.path.getsize(args.output) if os.path.exists(args.output) else 0
+    if output_size < ckpt["output_bytes"]:
+        sys.exit(f"[ERROR] La sortie {args.output} ({output_size} octets) est plus courte que le checkpoint "
+                 f"({ckpt['output_bytes']} octets) : supprimée ou remplacée ? Relancer avec --restart.")
+    if ckpt["lines_done"]:
+        print(f"[INFO] Reprise après {ckpt['lines_done']} lignes déjà traitées.")
+
+    kwargs = engine_kwargs(cfg)
+    kwargs.update(max_num_seqs=args.max_num_seqs, enforce_eager=False)   # CUDA graphs : rentables sur un long batch
+    llm = LLM(**kwargs)
+    builder = PromptBuilder(
+        llm.get_tokenizer(),
+        max_model_len=cfg.get("max_model_len"),
+        min_completion_tokens=cfg.get("min_completion_tokens", 256),
+        overflow_policy=cfg.get("prompt_overflow_policy", "truncate_oldest"),
+    )
+
+    # Sortie tronquée au dernier lot validé par le checkpoint (lot partiel éventuel écarté)
+    mode = "r+" if ckpt["output_bytes"] else "w"
+    start = time.perf_counter()
+    n_lines = n_prompt = n_completion = n_errors = 0
+    with open(args.input, encoding="utf-8") as fin, open(args.output, mode, encoding="utf-8") as fout:
+        fout.truncate(ckpt["output_bytes"])
+        fout.seek(ckpt["output_bytes"])
+        lines = ((i, line) for i, line in enumerate(fin) if line.strip())
+        lines = ((i, line) for i, line in lines if i >= ckpt["lines_done"])
+        while True:
+            batch = list(islice(lines, args.batch_size))
+            if not batch:
+                break
+            for rec in run_batch(llm, builder, batch, args):
+                fout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                if "error" in rec:
+                    n_errors += 1
+                else:
+                    n_prompt += rec["response"]["usage"]["prompt_tokens"]
+                    n_completion += rec["response"]["usage"]["completion_tokens"]
+            fout.flush()
+            os.fsync(fout.fileno())
+            n_lines += len(batch)
+
+            ckpt.update(lines_done=batch[-1][0] + 1, output_bytes=fout.tell())
+            save_checkpoint(ckpt_path, ckpt)
+            elapsed = time.perf_counter() - start
+            print(f"[INFO] {ckpt['lines_done']} lignes | {n_lines / elapsed:.1f} req/s | "
+                  f"{n_completion / elapsed:.0f} tok/s générés")
+
+    elapsed = time.perf_counter() - start
+    print("\n=== Rapport batch ===")
+    print(f"Lignes traitées (cette exécution) : {n_lines}  (erreurs : {n_errors})")
+    print(f"Durée                             : {elapsed:.1f} s")
+    print(f"Débit requêtes                    : {n_lines / elapsed if elapsed else 0:.2f} req/s")
+    print(f"Tokens prompt / générés           : {n_prompt} / {n_completion}")
+    print(f"Débit génération                  : {n_completion / elapsed if elapsed else 0:.0f} tok/s")
+    print(f"Débit total (prompt + génération) : {(n_prompt + n_completion) / elapsed if elapsed else 0:.0f} tok/s")
+    print(f"Sortie : {args.output}  (checkpoint : {ckpt_path})")
+
+
+if __name__ == "__main__":
+    main()
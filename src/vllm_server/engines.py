@@ -0,0 +1,252 @@
+"""
+engines.py
+Backends moteur du serveur de chat : vLLM (GPU) ou moteur factice (CPU).
+
+Le backend est choisi par modèle via la clé `engine` du JSON ("vllm" par
+défaut, "fake"), ou pour tous les modèles via `--engine` du serveur.
+
+Le moteur factice reproduit l'interface utilisée par vllm_chat_server
+(`generate` asynchrone à sorties cumulatives, `abort`, `sleep`/`wake_up`,
+`shutdown`) avec un profil de latence configurable :
+- prefill : `fake_prefill_ms_per_token` × tokens non présents dans son prefix cache ;
+- décodage : un pas de `fake_decode_ms_per_token`, ralenti de
+  `fake_batch_slowdown` par séquence supplémentaire dans le batch ;
+- au plus `max_num_seqs` séquences en parallèle, les autres attendent.
+Le texte généré est déterministe (fonction du prompt et du seed). Il sert à
+tester et mesurer la couche HTTP (batching, files, streaming) sans GPU.
+"""
+
+import asyncio
+import hashlib
+import random
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+try:
+    from vllm import SamplingParams
+except ImportError:   # machine sans vLLM : seul le moteur factice est utilisable
+    @dataclass
+    class SamplingParams:
+        n: int = 1
+        temperature: float = 1.0
+        top_p: float = 1.0
+        max_tokens: Optional[int] = 16
+        seed: Optional[int] = None
+
+ENGINE_BACKENDS = ("vllm", "fake")
+
+
+def engine_backend(cfg: dict) -> str:
+    backend = cfg.get("engine") or "vllm"
+    if backend not in ENGINE_BACKENDS:
+        raise ValueError(f"engine doit être l'un de {ENGINE_BACKENDS} (reçu : {backend})")
+    return backend
+
+
+def load_engine(cfg: dict, enable_sleep_mode: bool = False) -> tuple:
+    """(moteur async, tokenizer) pour un modèle, selon cfg["engine"]."""
+    if engine_backend(cfg) == "fake":
+        tokenizer = load_tokenizer(cfg)
+        return FakeAsyncEngine(tokenizer, cfg), tokenizer
+
+    from vllm import AsyncEngineArgs, AsyncLLMEngine
+    from transformers import AutoTokenizer
+    from model_config import engine_kwargs
+
+    engine_args = AsyncEngineArgs(
+        **engine_kwargs(cfg),
+        # Le sleep mode permet de parquer les poids en RAM CPU (hot-swap)
+        enable_sleep_mode=enable_sleep_mode,
+    )
+    engine = AsyncLLMEngine.from_engine_args(engine_args)
+    tokenizer = AutoTokenizer.from_pretrained(cfg["model_path"])
+    return engine, tokenizer
+
+
+def load_tokenizer(cfg: dict):
+    """Tokenizer réel du modèle s'il est disponible, sinon un tokenizer octet trivial."""
+    model_path = cfg.get("model_path")
+    if model_path and Path(model_path, "tokenizer_config.json").is_file():
+        try:
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(model_path)
+        except Exception as e:
+            print(f"[WARN] Tokenizer de {model_path} inutilisable ({e}), tokenizer trivial utilisé.")
+    return ByteTokenizer()
+
+
+# ---------------------------------------------------------------------- #
+# Tokenizer trivial
+# ---------------------------------------------------------------------- #
+
+class ByteTokenizer:
+    """Un token par octet UTF-8, plus quelques tokens spéciaux ; template de chat minimal."""
+
+    bos_token = "<s>"
+    eos_token = "</s>"
+    end_token = "<|end|>"
+    all_special_tokens = [bos_token, eos_token, end_token]
+    offset = len(all_special_tokens)
+    eos_token_id = 1
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        text = self.bos_token + "".join(
+            f"<|{m.get('role', 'user')}|>{m.get('content', '')}{self.end_token}" for m in messages
+        )
+        if add_generation_prompt and messages and messages[-1].get("role") != "assistant":
+            text += "<|assistant|>"
+        return self.encode(text) if tokenize else text
+
+    def encode(self, text: str, add_special_tokens: bool = False) -> list:
+        ids = [0] if add_special_tokens else []
+        pos = 0
+        while pos < len(text):
+            for sid, tok in enumerate(self.all_special_tokens):
+                if text.startswith(tok, pos):
+                    ids.append(sid)
+                    pos += len(tok)
+                    break
+            else:
+                nxt = min((i for i in (text.find(t, pos) for t in self.all_special_tokens) if i >= 0),
+                          default=len(text))
+                ids.extend(b + self.offset for b in text[pos:nxt].encode("utf-8"))
+                pos = nxt
+        return ids
+
+    def decode(self, ids, skip_special_tokens: bool = True) -> str:
+        out, buf = [], bytearray()
+        for i in ids:
+            if i >= self.offset:
+                buf.append(i - self.offset)
+                continue
+            out.append(buf.decode("utf-8", errors="replace"))
+            buf.clear()
+            if not skip_special_tokens:
+                out.append(self.all_special_tokens[i])
+        out.append(buf.decode("utf-8", errors="replace"))
+        return "".join(out)
+
+
+# ---------------------------------------------------------------------- #
+# Moteur factice
+# ---------------------------------------------------------------------- #
+
+LOREM = ("le la les un une des et ou mais donc car modèle réponse document page "
+         "contexte question source analyse résultat données exemple selon ainsi").split()
+
+
+@dataclass
+class FakeCompletion:
+    index: int = 0
+    text: str = ""
+    token_ids: list = field(default_factory=list)
+    finish_reason: Optional[str] = None
+
+
+@dataclass
+class FakeRequestOutput:
+    request_id: str
+    prompt_token_ids: list
+    outputs: list
+    finished: bool = False
+    num_cached_tokens: int = 0
+
+
+class FakeAsyncEngine:
+    def __init__(self, tokenizer, cfg: dict):
+        self.tokenizer = tokenizer
+        self.prefill_s_per_token = float(cfg.get("fake_prefill_ms_per_token", 0.1)) / 1000
+        self.decode_s_per_token = float(cfg.get("fake_decode_ms_per_token", 20)) / 1000
+        self.batch_slowdown = float(cfg.get("fake_batch_slowdown", 0.02))
+        self.output_tokens = int(cfg.get("fake_output_tokens", 128))
+        self.block_size = 16
+        self.cache_blocks = int(cfg.get("fake_prefix_cache_blocks", 4096))
+        self._prefix_cache: "OrderedDict[str, None]" = OrderedDict()
+        self._slots = asyncio.Semaphore(max(1, int(cfg.get("max_num_seqs", 1))))
+        self._running = 0
+        self._aborted: set[str] = set()
+        self.sleeping = False
+
+    # --- Interface AsyncLLMEngine ---
+
+    async def generate(self, prompt, sampling_params, request_id: str):
+        prompt_ids = self._prompt_ids(prompt)
+        max_tokens = sampling_params.max_tokens or 16
+        n_target = min(max_tokens, self.output_tokens)
+        rng = random.Random(self._seed(prompt_ids, sampling_params))
+        text = " ".join(rng.choice(LOREM) for _ in range(n_target))
+        target_ids = self.tokenizer.encode(text, add_special_tokens=False)[:n_target]
+        completion = FakeCompletion()
+        out = FakeRequestOutput(request_id, prompt_ids, [completion])
+
+        async with self._slots:
+            self._running += 1
+            try:
+                cached = self._lookup_prefix(prompt_ids)
+                out.num_cached_tokens = cached
+                # Le prefill produit le premier token ; chaque token suivant coûte un pas de décodage.
+                await asyncio.sleep((len(prompt_ids) - cached) * self.prefill_s_per_token)
+                for step, token_id in enumerate(target_ids):
+                    if request_id in self._aborted:
+                        completion.finish_reason = "abort"
+                        break
+                    if step:
+                        await asyncio.sleep(self.decode_s_per_token * (1 + self.batch_slowdown * (self._running - 1)))
+                    completion.token_ids = completion.token_ids + [token_id]
+                    completion.text = self.tokenizer.decode(completion.token_ids, skip_special_tokens=True)
+                    if step + 1 < len(target_ids):
+                        yield out
+                if completion.finish_reason is None:
+                    completion.finish_reason = "length" if len(completion.token_ids) >= max_tokens else "stop"
+                out.finished = True
+                yield out
+            finally:
+                self._running -= 1
+                self._aborted.discard(request_id)
+
+    async def abort(self, request_id: str):
+        self._aborted.add(request_id)
+
+    async def sleep(self, level: int = 1):
+        self.sleeping = True
+        self._prefix_cache.clear()
+
+    async def wake_up(self):
+        self.sleeping = False
+
+    def shutdown(self):
+        self._prefix_cache.clear()
+
+    # --- Interne ---
+
+    def _prompt_ids(self, prompt) -> list:
+        if isinstance(prompt, dict) and "prompt_token_ids" in prompt:
+            return list(prompt["prompt_token_ids"])
+        text = prompt.get("prompt", "") if isinstance(prompt, dict) else str(prompt)
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    @staticmethod
+    def _seed(prompt_ids: list, sampling_params) -> int:
+        seed = getattr(sampling_params, "seed", None)
+        if seed is not None and (getattr(sampling_params, "temperature", 0) or 0) > 0:
+            return int(seed)
+        return int.from_bytes(hashlib.sha1(repr(prompt_ids).encode()).digest()[:8], "big")
+
+    def _lookup_prefix(self, prompt_ids: list) -> int:
+        """Tokens couverts par des blocs complets déjà vus (prefix cache), puis mémorise les blocs du prompt."""
+        h = hashlib.sha1()
+        cached, hit = 0, True
+        for start in range(0, len(prompt_ids) - self.block_size + 1, self.block_size):
+            h.update(repr(prompt_ids[start:start + self.block_size]).encode())
+            key = h.hexdigest()
+            if hit and key in self._prefix_cache:
+                cached += self.block_size
+                self._prefix_cache.move_to_end(key)
+            else:
+                hit = False
+                self._prefix_cache[key] = None
+        while len(self._prefix_cache) > self.cache_blocks:
+            self._prefix_cache.popitem(last=False)
+        return cached
@@ -0,0 +1,15 @@
+#!/bin/bash
+set -e
+
+# Détermine le chemin du script (même venv que launch-vllm.sh)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+VENV_DIR="$SCRIPT_DIR/vllm-server"
+
+if [ ! -d "$VENV_DIR" ]; then
+    echo "[ERROR] venv vllm-server absent : lancer d'abord launch-vllm.sh."
+    exit 1
+fi
+
+echo "[INFO] Lancement de batch_infer.py ($*) ..."
+source "$VENV_DIR/bin/activate"
+exec python "$SCRIPT_DIR/batch_infer.py" "$@"
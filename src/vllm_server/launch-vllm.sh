@@ -9,10 +9,11 @@ REQ_FILE="$SCRIPT_DIR/../../docker/requirements.txt"
 # 0) Vérifie qu’un argument est fourni
 if [ -z "$1" ]; then
     echo "[ERROR] Aucun model_name fourni."
-    echo "Usage: $0 <model_name>"
+    echo "Usage: $0 <model_name> [options vllm_chat_server.py...]"
     exit 1
 fi
 MODEL_NAME="$1"
+shift
 
 # 1) Création du venv si absent
 if [ ! -d "$VENV_DIR" ]; then
@@ -25,6 +26,6 @@ else
 fi
 
 # 2) Activation et lancement du serveur vLLM
-echo "[INFO] Lancement de vllm_chat_server.py avec --model_name $MODEL_NAME ..."
+echo "[INFO] Lancement de vllm_chat_server.py avec --model_name $MODEL_NAME $* ..."
 source "$VENV_DIR/bin/activate"
-exec python "$SCRIPT_DIR/vllm_chat_server.py" --model_name "$MODEL_NAME"
+exec python "$SCRIPT_DIR/vllm_chat_server.py" --model_name "$MODEL_NAME" "$@"
@@ -0,0 +1,86 @@
+"""
+model_config.py
+Lecture des fichiers de configuration modèle (src/vllm_server/<model_name>.json).
+
+Les JSON acceptent des lignes de commentaire `//` ; le chemin du modèle est
+résolu depuis `absolute_path` ou `relative_path` (relatif à la racine du
+projet) et ajouté au dict sous la clé `model_path`.
+"""
+
+import json
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parents[2]
+CONFIG_DIR = PROJECT_DIR / "src" / "vllm_server"
+
+
+class ModelConfigError(Exception):
+    """Configuration modèle absente ou invalide."""
+
+
+def config_path(name: str) -> Path:
+    return CONFIG_DIR / f"{name}.json"
+
+
+def available_models() -> list[str]:
+    """Noms des modèles configurés (un JSON par modèle)."""
+    return sorted(p.stem for p in CONFIG_DIR.glob("*.json"))
+
+
+def load_model_config(name: str) -> dict:
+    params_path = config_path(name)
+    if not params_path.is_file():
+        raise ModelConfigError(f"Fichier de config introuvable : {params_path}")
+
+    raw = params_path.read_text(encoding="utf-8")
+    filtered = "\n".join(line for line in raw.splitlines() if not line.strip().startswith("//"))
+    cfg = json.loads(filtered)
+
+    abs_path = cfg.get("absolute_path")
+    rel_path = cfg.get("relative_path")
+    if abs_path:
+        model_dir = Path(abs_path)
+    elif rel_path:
+        model_dir = (PROJECT_DIR / rel_path).resolve()
+    else:
+        raise ModelConfigError("Aucun chemin 'absolute_path' ou 'relative_path' défini dans le JSON.")
+
+    cfg["model_path"] = str(model_dir)
+    cfg.setdefault("model_name", name)
+    return cfg
+
+
+def check_model_dir(cfg: dict):
+    if not Path(cfg["model_path"]).is_dir():
+        raise ModelConfigError(f"Modèle introuvable : {cfg['model_path']}")
+
+
+def engine_kwargs(cfg: dict) -> dict:
+    """Arguments moteur vLLM (EngineArgs / LLM) communs au serveur et au mode batch."""
+    return dict(
+        model=cfg["model_path"],
+        tensor_parallel_size=cfg.get("tensor_parallel_size", 1),
+        pipeline_parallel_size=cfg.get("pipeline_parallel_size", 1),
+        dtype=cfg.get("dtype"),
+        quantization=cfg.get("quantization"),
+        kv_cache_dtype=cfg.get("kv_cache_dtype"),
+        gpu_memory_utilization=cfg.get("gpu_memory_utilization"),
+        max_model_len=cfg.get("max_model_len"),
+        max_num_seqs=cfg.get("max_num_seqs", 1),
+        max_num_batched_tokens=cfg.get("max_num_batched_tokens", 0),
+        enable_prefix_caching=True,
+        swap_space=cfg.get("swap_space_gb", 0),
+        cpu_offload_gb=cfg.get("cpu_offload_gb", 0),
+        enforce_eager=True,
+    )
+
+
+def weights_size_gb(cfg: dict) -> float:
+    """Taille des poids sur disque (estimation de l'empreinte d'un modèle « parqué » en RAM)."""
+    model_dir = Path(cfg["model_path"])
+    total = sum(
+        p.stat().st_size
+        for pattern in ("*.safetensors", "*.bin", "*.pt")
+        for p in model_dir.glob(pattern)
+    )
+    return total / 1024 ** 3
@@ -0,0 +1,262 @@
+"""
+model_registry.py
+Registre des modèles servis par un même serveur de chat.
+
+Chaque modèle configuré est dans l'un des états :
+- "unloaded" : rien en mémoire ;
+- "resident" : moteur chargé sur GPU, prêt à générer ;
+- "parked"   : moteur endormi (sleep mode vLLM), poids déchargés en RAM CPU ;
+               le réveil évite de relire les poids depuis le disque.
+(états transitoires : "loading" pendant un chargement, "parking" pendant la
+mise en veille ; le modèle n'est alors réservable par aucune requête).
+
+Le registre route une requête vers son modèle (`acquire`) et, si le budget
+GPU est dépassé, met de côté les modèles les moins récemment utilisés :
+parking en RAM tant que le budget CPU le permet, déchargement sinon.
+Un modèle n'est jamais évincé pendant qu'il a des requêtes en cours.
+"""
+
+import asyncio
+import gc
+import time
+from typing import Callable, Optional
+
+from model_config import weights_size_gb
+
+UNLOADED = "unloaded"
+LOADING = "loading"
+RESIDENT = "resident"
+PARKING = "parking"
+PARKED = "parked"
+
+
+class UnknownModel(KeyError):
+    """Modèle absent de la configuration du serveur."""
+
+
+class ModelEntry:
+    def __init__(self, name: str, cfg: dict):
+        self.name = name
+        self.cfg = cfg
+        self.state = UNLOADED
+        self.engine = None
+        self.tokenizer = None
+        self.prompt_builder = None
+        self.active = 0
+        self.draining = False
+        self.last_used = 0.0
+        self.loads = 0
+        self._park_gb: Optional[float] = None
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.name}@{self.cfg['model_path']}"
+
+    @property
+    def gpu_fraction(self) -> float:
+        return float(self.cfg.get("gpu_memory_utilization") or 0.9)
+
+    @property
+    def park_gb(self) -> float:
+        if self._park_gb is None:
+            self._park_gb = float(self.cfg.get("park_size_gb") or weights_size_gb(self.cfg))
+        return self._park_gb
+
+
+class ModelLease:
+    """Réservation d'un modèle résident pour la durée d'une requête (release idempotent)."""
+
+    def __init__(self, registry: "ModelRegistry", entry: ModelEntry):
+        self._registry = registry
+        self.entry = entry
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._registry._release(self.entry)
+
+
+class ModelRegistry:
+    def __init__(self,
+                 configs: dict[str, dict],
+                 default_model: str,
+                 load_fn: Callable[[dict], tuple],
+                 shutdown_fn: Callable[[object], None],
+                 gpu_budget: float = 1.0,
+                 cpu_park_budget_gb: float = 0.0,
+                 on_load: Optional[Callable[[ModelEntry], None]] = None):
+        """
+        Args:
+            configs           : {nom: config JSON} des modèles servables
+            default_model     : modèle utilisé quand la requête n'en précise pas
+            load_fn           : cfg -> (engine, tokenizer), bloquant (exécuté dans un thread)
+            shutdown_fn       : arrêt d'un moteur déchargé
+            gpu_budget        : somme max des gpu_memory_utilization des modèles résidents
+            cpu_park_budget_gb: RAM max pour les modèles parqués (0 = pas de parking)
+            on_load           : rappel après chargement depuis le disque
+        """
+        if default_model not in configs:
+            raise UnknownModel(default_model)
+        self.entries = {name: ModelEntry(name, cfg) for name, cfg in configs.items()}
+        self.default_model = default_model
+        self.load_fn = load_fn
+        self.shutdown_fn = shutdown_fn
+        self.gpu_budget = gpu_budget
+        self.cpu_park_budget_gb = cpu_park_budget_gb
+        self.on_load = on_load
+        self.swaps = 0
+        self._swap_lock = asyncio.Lock()
+        self._drained = asyncio.Event()
+
+    # ------------------------------------------------------------------ #
+
+    def resolve(self, name: Optional[str]) -> ModelEntry:
+        if not name or name == "auto":
+            name = self.default_model
+        entry = self.entries.get(name)
+        if entry is None:
+            raise UnknownModel(name)
+        return entry
+
+    async def acquire(self, name: Optional[str] = None) -> ModelLease:
+        """Rend le modèle résident (chargement, réveil ou attente) et le réserve."""
+        entry = self.resolve(name)
+        if entry.state == RESIDENT and not entry.draining:
+            return self._lease(entry)
+
+        async with self._swap_lock:
+            while entry.state != RESIDENT:
+                victims = self._victims_for(entry)
+                busy = [v for v in victims if v.active]
+                if busy:
+                    # On attend la fin des requêtes en cours des modèles à évincer.
+                    for v in busy:
+                        v.draining = True
+                    self._drained.clear()
+                    await self._drained.wait()
+                    continue
+                for v in victims:
+                    await self._evict(v)
+                await self._bring_up(entry)
+            return self._lease(entry)
+
+    async def preload(self, name: Optional[str] = None):
+        self.resolve(name)
+        (await self.acquire(name)).release()
+
+    async def shutdown(self):
+        for entry in self.entries.values():
+            if entry.engine is not None:
+                self.shutdown_fn(entry.engine)
+                entry.engine = None
+                entry.state = UNLOADED
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            "default": self.default_model,
+            "gpu_budget": self.gpu_budget,
+            "cpu_park_budget_gb": self.cpu_park_budget_gb,
+            "resident": [e.name for e in self.entries.values() if e.state == RESIDENT],
+            "parked": [e.name for e in self.entries.values() if e.state == PARKED],
+            "swaps": self.swaps,
+            "models": {
+                e.name: {
+                    "state": e.state,
+                    "active_requests": e.active,
+                    "idle_s": round(now - e.last_used, 1) if e.last_used else None,
+                    "gpu_memory_utilization": e.gpu_fraction,
+                    "loads": e.loads,
+                }
+                for e in self.entries.values()
+            },
+        }
+
+    # ------------------------------------------------------------------ #
+
+    def _lease(self, entry: ModelEntry) -> ModelLease:
+        entry.active += 1
+        entry.last_used = time.monotonic()
+        return ModelLease(self, entry)
+
+    def _release(self, entry: ModelEntry):
+        entry.active -= 1
+        entry.last_used = time.monotonic()
+        if entry.active == 0 and entry.draining:
+            self._drained.set()
+
+    def _victims_for(self, entry: ModelEntry) -> list[ModelEntry]:
+        """Modèles résidents à évincer (LRU d'abord) pour faire tenir `entry` sur GPU."""
+        residents = sorted(
+            (e for e in self.entries.values() if e.state == RESIDENT and e is not entry),
+            key=lambda e: e.last_used,
+        )
+        used = sum(e.gpu_fraction for e in residents)
+        victims = []
+        for candidate in residents:
+            if used + entry.gpu_fraction <= self.gpu_budget + 1e-6:
+                break
+            victims.append(candidate)
+            used -= candidate.gpu_fraction
+        return victims
+
+    async def _evict(self, entry: ModelEntry):
+        # Plus "resident" pendant la mise en veille : aucun acquire() ne peut réserver ce moteur
+        entry.draining = True
+        if self.cpu_park_budget_gb > 0 and hasattr(entry.engine, "sleep") and self._make_park_room(entry):
+            print(f"[INFO] Parking du modèle {entry.name} en RAM CPU…")
+            entry.state = PARKING
+            try:
+                await entry.engine.sleep(level=1)
+            except Exception:
+                self._unload(entry)
+                raise
+            finally:
+                entry.draining = False
+            entry.state = PARKED
+        else:
+            self._unload(entry)
+            entry.draining = False
+
+    def _make_park_room(self, entry: ModelEntry) -> bool:
+        """Libère de la RAM (déchargement LRU des modèles parqués) ; False si impossible."""
+        if entry.park_gb > self.cpu_park_budget_gb:
+            return False
+        parked = sorted((e for e in self.entries.values() if e.state == PARKED), key=lambda e: e.last_used)
+        used = sum(e.park_gb for e in parked)
+        for old in parked:
+            if used + entry.park_gb <= self.cpu_park_budget_gb:
+                break
+            self._unload(old)
+            used -= old.park_gb
+        return True
+
+    def _unload(self, entry: ModelEntry):
+        print(f"[INFO] Déchargement du modèle {entry.name}…")
+        self.shutdown_fn(entry.engine)
+        entry.engine = None
+        entry.tokenizer = None
+        entry.prompt_builder = None
+        entry.state = UNLOADED
+        gc.collect()
+
+    async def _bring_up(self, entry: ModelEntry):
+        self.swaps += 1
+        if entry.state == PARKED:
+            print(f"[INFO] Réveil du modèle parqué {entry.name}…")
+            await entry.engine.wake_up()
+            entry.state = RESIDENT
+            return
+
+        print(f"[INFO] Chargement du modèle {entry.name} depuis le disque…")
+        entry.state = LOADING
+        try:
+            entry.engine, entry.tokenizer = await asyncio.to_thread(self.load_fn, entry.cfg)
+        except Exception:
+            entry.state = UNLOADED
+            raise
+        entry.loads += 1
+        if self.on_load is not None:
+            self.on_load(entry)
+        entry.state = RESIDENT
@@ -0,0 +1,141 @@
+"""
+prompt_tokens.py
+Rendu des messages de chat directement en token ids (tokenisation unique).
+
+Les ids produits ici sont passés tels quels au moteur (TokensPrompt) et
+réutilisés pour le bloc `usage` et le contrôle de longueur ; le moteur ne
+retokenise donc plus le texte du prompt.
+
+- Le préfixe constant (messages system de tête) est tokenisé une seule fois
+  et mis en cache ; seule la suite de la conversation est encodée.
+- Si le prompt dépasse max_model_len - min_completion_tokens, la politique
+  `truncate_oldest` retire les plus anciens messages non-system (recherche
+  dichotomique), `reject` lève PromptTooLong.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+OVERFLOW_POLICIES = ("truncate_oldest", "reject")
+
+
+class PromptTooLong(Exception):
+    """Le prompt ne tient pas dans le contexte du modèle."""
+
+    def __init__(self, n_tokens: int, limit: int, max_model_len: int):
+        super().__init__(
+            f"Prompt too long: {n_tokens} tokens > limit {limit} "
+            f"(max_model_len={max_model_len}, reserve for completion={max_model_len - limit})."
+        )
+        self.n_tokens = n_tokens
+        self.limit = limit
+
+
+@dataclass
+class PromptTokens:
+    ids: list
+    dropped_messages: int = 0
+
+
+class PromptBuilder:
+    def __init__(self,
+                 tokenizer,
+                 max_model_len: int | None = None,
+                 min_completion_tokens: int = 256,
+                 overflow_policy: str = "truncate_oldest",
+                 prefix_cache_size: int = 32):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy doit être l'un de {OVERFLOW_POLICIES}")
+        self.tokenizer = tokenizer
+        self.max_model_len = max_model_len
+        self.min_completion_tokens = min_completion_tokens if max_model_len else 0
+        self.overflow_policy = overflow_policy
+        self.prefix_cache_size = prefix_cache_size
+        self._prefix_cache: "OrderedDict[tuple, tuple[str, list] | None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._special_tokens = tuple(getattr(tokenizer, "all_special_tokens", ()) or ())
+
+    @property
+    def prompt_limit(self) -> int | None:
+        if not self.max_model_len:
+            return None
+        return max(1, self.max_model_len - self.min_completion_tokens)
+
+    # ------------------------------------------------------------------ #
+
+    def build(self, messages: list[dict]) -> PromptTokens:
+        """Rend et tokenise `messages`, en appliquant la politique de dépassement."""
+        ids = self.encode(messages)
+        limit = self.prompt_limit
+        if limit is None or len(ids) <= limit:
+            return PromptTokens(ids)
+        if self.overflow_policy == "reject":
+            raise PromptTooLong(len(ids), limit, self.max_model_len)
+        return self._truncate_oldest(messages, limit, len(ids))
+
+    def encode(self, messages: list[dict]) -> list:
+        text = self.tokenizer.apply_chat_template(messages, tokenize=False)
+        prefix = self._system_prefix(messages)
+        if prefix is not None and text.startswith(prefix[0]):
+            prefix_text, prefix_ids = prefix
+            return prefix_ids + self._encode_text(text[len(prefix_text):])
+        return self._encode_text(text)
+
+    def _encode_text(self, text: str) -> list:
+        # Le template contient déjà les tokens spéciaux (BOS, en-têtes de rôle…).
+        return self.tokenizer.encode(text, add_special_tokens=False) if text else []
+
+    def _system_prefix(self, messages: list[dict]):
+        """(texte, ids) du rendu des messages system de tête, mis en cache."""
+        head = []
+        for m in messages:
+            if m.get("role") != "system":
+                break
+            head.append(m)
+        key = tuple(m.get("content", "") for m in head)
+        with self._lock:
+            if key in self._prefix_cache:
+                self._prefix_cache.move_to_end(key)
+                return self._prefix_cache[key]
+
+        entry = None
+        try:
+            prefix_text = self.tokenizer.apply_chat_template(head, tokenize=False) if head else ""
+        except Exception:
+            prefix_text = ""   # certains templates refusent un rendu partiel
+        # On ne coupe que sur un token spécial : la frontière de tokenisation est alors stable.
+        if prefix_text and prefix_text.endswith(self._special_tokens):
+            entry = (prefix_text, self._encode_text(prefix_text))
+
+        with self._lock:
+            self._prefix_cache[key] = entry
+            while len(self._prefix_cache) > self.prefix_cache_size:
+                self._prefix_cache.popitem(last=False)
+        return entry
+
+    def _truncate_oldest(self, messages: list[dict], limit: int, n_tokens: int) -> PromptTokens:
+        """Retire le minimum de messages anciens (hors system et dernier message) pour tenir."""
+        system = [m for m in messages[:-1] if m.get("role") == "system"]
+        history = [m for m in messages[:-1] if m.get("role") != "system"]
+        last = messages[-1:]
+
+        def attempt(drop: int) -> tuple:
+            kept = history[drop:]
+            # On ne commence pas l'historique par une réponse de l'assistant.
+            while kept and kept[0].get("role") == "assistant":
+                kept = kept[1:]
+            return self.encode(system + kept + last), len(history) - len(kept)
+
+        lo, hi = 1, len(history)
+        best = None
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            ids, dropped = attempt(mid)
+            if len(ids) <= limit:
+                best, hi = PromptTokens(ids, dropped), mid - 1
+            else:
+                lo = mid + 1
+        if best is None:
+            raise PromptTooLong(n_tokens, limit, self.max_model_len)
+        return best
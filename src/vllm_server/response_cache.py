@@ -0,0 +1,113 @@
+"""
+response_cache.py
+Cache exact des réponses déterministes (temperature = 0) du serveur de chat.
+
+- Clé : identité du modèle + prompt rendu + paramètres d'échantillonnage.
+- Éviction LRU, expiration TTL et plafond mémoire (taille JSON des entrées).
+- Coalescence : une requête identique à une génération encore en cours
+  attend son résultat au lieu de relancer prefill + decode.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl_s: float = 3600):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = ttl_s
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, tuple[float, int, dict]]" = OrderedDict()  # key -> (t, taille, valeur)
+        self._pending: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(model_id: str, prompt, sampling: dict) -> str:
+        payload = json.dumps([model_id, prompt, sampling], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------ #
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, size, value = entry
+        if self.ttl_s and time.monotonic() - stored_at > self.ttl_s:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: dict):
+        size = len(json.dumps(value, ensure_ascii=False))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic(), size, value)
+        self.current_bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self):
+        """Vide le cache (changement ou rechargement de modèle)."""
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def _drop(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    # ------------------------------------------------------------------ #
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[tuple]]) -> tuple:
+        """
+        Renvoie (valeur, source) avec source ∈ {"hit", "miss", "coalesced"}.
+
+        `compute()` renvoie (valeur, cacheable). Une valeur non cacheable
+        (génération annulée, rejet d'admission) n'est ni stockée ni partagée :
+        les requêtes coalescées relancent alors leur propre calcul.
+        """
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached, "hit"
+
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            value, cacheable = await asyncio.shield(pending)
+            if cacheable:
+                self.coalesced += 1
+                return value, "coalesced"
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value, cacheable = await compute()
+        except BaseException:
+            future.set_result((None, False))
+            raise
+        finally:
+            self._pending.pop(key, None)
+        if cacheable:
+            self.put(key, value)
+        future.set_result((value, cacheable))
+        return value, "miss"
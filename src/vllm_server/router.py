@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+router.py
+Routeur HTTP léger devant les instances (répliques) vllm_chat_server.
+
+Les clients (UI, chains) parlent toujours au port 8000 ; le routeur relaie
+chaque requête /v1/* vers une instance active. Le launcher change l'ensemble
+des instances actives via PUT /router/backends, ce qui permet :
+- un reload blue/green : la nouvelle instance reçoit le trafic dès sa bascule,
+  l'ancienne termine (drain) les requêtes déjà relayées avant d'être arrêtée ;
+- le data-parallel : N répliques (une par GPU) servies ensemble.
+
+Choix de la réplique :
+- la moins chargée, en requêtes en cours (`--balance requests`) ou en tokens
+  estimés en cours (`--balance tokens`), plus la file d'attente d'admission
+  remontée par /v1/status ;
+- affinité de conversation : les tours d'une même conversation (champ `user`,
+  `conversation_id`, ou à défaut le début des messages) retournent sur la même
+  réplique pour profiter de son prefix cache, tant qu'elle n'est pas nettement
+  plus chargée que la meilleure (`--affinity_slack`) ;
+- les répliques qui échouent `--max_failures` health checks consécutifs sont
+  retirées du routage, puis réintégrées dès qu'elles répondent à nouveau.
+
+Les flux SSE sont relayés tels quels ; une déconnexion du client ferme la
+connexion amont, ce qui déclenche l'annulation côté vllm_chat_server.
+POST /v1/requests/{id}/cancel est diffusé à toutes les instances suivies
+(actives et en drain) : seule celle qui exécute la requête l'accepte.
+
+Test sans GPU :
+    python stub_replica.py --port 8001 &  python stub_replica.py --port 8002 &
+    python router.py --backends http://127.0.0.1:8001,http://127.0.0.1:8002
+"""
+
+import asyncio
+import argparse
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+# --- 1. Arguments ---
+parser = argparse.ArgumentParser()
+parser.add_argument("--host", type=str, default="0.0.0.0")
+parser.add_argument("--port", type=int, default=8000)
+parser.add_argument("--backends", type=str, default="",
+                    help="URLs des instances actives au démarrage, séparées par des virgules")
+parser.add_argument("--balance", choices=("requests", "tokens"), default="requests",
+                    help="Mesure de charge : requêtes en cours ou tokens estimés en cours")
+parser.add_argument("--affinity_slack", type=float, default=4,
+                    help="Surcharge tolérée (en unités de charge) avant de quitter la réplique d'une conversation")
+parser.add_argument("--affinity_max_entries", type=int, default=10000)
+parser.add_argument("--health_interval_s", type=float, default=2.0)
+parser.add_argument("--max_failures", type=int, default=3,
+                    help="Échecs consécutifs avant de retirer une réplique du routage")
+args, _ = parser.parse_known_args()
+
+# En-têtes propres à une connexion, à ne pas relayer
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length", "host",
+               "proxy-connection", "upgrade", "te", "trailer"}
+
+CHARS_PER_TOKEN = 4           # estimation grossière de la taille du prompt
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+# --- 2. État des instances ---
+class Backend:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.in_flight = 0
+        self.in_flight_tokens = 0
+        self.requests = 0
+        self.errors = 0
+        self.healthy = True
+        self.failures = 0
+        self.queue_depth = 0          # dernière valeur remontée par /v1/status
+        self.last_check: Optional[float] = None
+
+    def load(self) -> float:
+        if args.balance == "tokens":
+            # Une requête en attente d'admission compte pour une requête « moyenne ».
+            avg = self.in_flight_tokens / self.in_flight if self.in_flight else DEFAULT_COMPLETION_TOKENS
+            return self.in_flight_tokens + self.queue_depth * avg
+        return self.in_flight + self.queue_depth
+
+    def record_failure(self):
+        self.failures += 1
+        if self.healthy and self.failures >= args.max_failures:
+            self.healthy = False
+            print(f"[ROUTER] Réplique {self.url} retirée (health check en échec).")
+
+    def record_success(self):
+        self.failures = 0
+        if not self.healthy:
+            self.healthy = True
+            print(f"[ROUTER] Réplique {self.url} réintégrée.")
+
+    def to_dict(self) -> dict:
+        return {"healthy": self.healthy, "in_flight": self.in_flight, "in_flight_tokens": self.in_flight_tokens,
+                "queue_depth": self.queue_depth, "requests": self.requests, "errors": self.errors}
+
+
+backends: dict[str, Backend] = {}   # actives + retirées encore en drain
+active: list[str] = []
+affinity: "OrderedDict[str, str]" = OrderedDict()   # clé de conversation -> url
+client: Optional[httpx.AsyncClient] = None
+
+
+def set_active(urls: list[str]):
+    """Remplace l'ensemble actif ; les instances retirées restent suivies jusqu'au drain."""
+    global active
+    urls = [u.rstrip("/") for u in urls if u]
+    for url in urls:
+        backends.setdefault(url, Backend(url))
+    active = urls
+    _forget_drained()
+
+
+def _forget_drained():
+    for url in [u for u, b in backends.items() if u not in active and b.in_flight == 0]:
+        del backends[url]
+
+
+def affinity_key(body: dict) -> Optional[str]:
+    """Identifiant stable d'une conversation : `user`/`conversation_id`, sinon ses premiers messages."""
+    explicit = body.get("conversation_id") or body.get("user")
+    if explicit:
+        return f"id:{explicit}"
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not messages:
+        return None
+    # Le system prompt et le premier message utilisateur ne changent pas d'un tour à l'autre.
+    head = []
+    for m in messages:
+        head.append(m)
+        if isinstance(m, dict) and m.get("role") == "user":
+            break
+    payload = json.dumps([body.get("model"), head], sort_keys=True, ensure_ascii=False)
+    return "msg:" + hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(body: dict) -> int:
+    messages = body.get("messages") or []
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in messages if isinstance(m, dict))
+    max_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return prompt_chars // CHARS_PER_TOKEN + int(max_tokens)
+
+
+def pick_backend(body: dict) -> Optional[Backend]:
+    """Réplique saine la moins chargée, ou celle de la conversation si elle reste raisonnable."""
+    candidates = [backends[u] for u in active if backends[u].healthy]
+    if not candidates:
+        return None
+    best = min(candidates, key=lambda b: (b.load(), b.requests))
+
+    key = affinity_key(body)
+    if key is None:
+        return best
+    slack = args.affinity_slack
+    if args.balance == "tokens":
+        slack *= DEFAULT_COMPLETION_TOKENS
+    sticky = backends.get(affinity.get(key))
+    if sticky is not None and sticky in candidates and sticky.load() <= best.load() + slack:
+        best = sticky
+    affinity[key] = best.url
+    affinity.move_to_end(key)
+    while len(affinity) > args.affinity_max_entries:
+        affinity.popitem(last=False)
+    return best
+
+
+async def check_health(backend: Backend):
+    try:
+        r = await client.get(f"{backend.url}/v1/status", timeout=2)
+        status = r.json()
+        if r.status_code != 200 or status.get("ready") is not True:
+            raise ValueError("not ready")
+    except Exception:
+        backend.record_failure()
+    else:
+        backend.queue_depth = int(status.get("queue_depth") or 0)
+        backend.record_success()
+    backend.last_check = time.monotonic()
+
+
+async def health_loop():
+    while True:
+        await asyncio.gather(*(check_health(backends[u]) for u in list(active) if u in backends))
+        await asyncio.sleep(args.health_interval_s)
+
+
+# --- 3. Application ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client
+    client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=5.0),
+                               limits=httpx.Limits(max_connections=None, max_keepalive_connections=64))
+    set_active(args.backends.split(","))
+    health_task = asyncio.create_task(health_loop())
+    yield
+    health_task.cancel()
+    await client.aclose()
+
+
+app = FastAPI(lifespan=lifespan, openapi_url=None, docs_url=None)
+
+
+@app.get("/router/backends")
+async def get_backends():
+    return {"active": active, "balance": args.balance, "affinity_entries": len(affinity),
+            "backends": {u: b.to_dict() for u, b in backends.items()}}
+
+
+@app.put("/router/backends")
+async def put_backends(req: Request):
+    body = await req.json()
+    set_active(body.get("backends", []))
+    print(f"[ROUTER] Instances actives : {active}")
+    return await get_backends()
+
+
+@app.get("/v1/status")
+async def status():
+    """Agrège /v1/status des instances actives ; prêt si au moins une l'est."""
+    async def one(url: str) -> dict:
+        try:
+            r = await client.get(f"{url}/v1/status", timeout=2)
+            return r.json()
+        except Exception as e:
+            return {"ready": False, "error": str(e)}
+
+    statuses = await asyncio.gather(*(one(u) for u in active))
+    per_backend = dict(zip(active, statuses))
+    return {
+        "ready": any(s.get("ready") is True for s in statuses),
+        "in_flight": sum(b.in_flight for b in backends.values()),
+        "queue_depth": sum(int(s.get("queue_depth") or 0) for s in statuses),
+        "backends": per_backend,
+    }
+
+
+async def _await_or_disconnect(req: Request, task: asyncio.Task, interval: float = 0.5):
+    """Attend `task` ; l'annule (et renvoie None) si le client se déconnecte avant."""
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=interval)
+        if done:
+            return task.result()
+        if await req.is_disconnected():
+            task.cancel()
+            return None
+
+
+@app.post("/v1/requests/{request_id}/cancel")
+async def cancel_request(request_id: str):
+    """Annulation explicite : première instance qui connaît la requête, sinon 404."""
+    async def one(url: str):
+        try:
+            return url, await client.post(f"{url}/v1/requests/{request_id}/cancel", timeout=5)
+        except httpx.HTTPError:
+            return url, None
+
+    for url, r in await asyncio.gather(*(one(u) for u in list(backends))):
+        if r is not None and r.status_code == 200:
+            return JSONResponse(content=r.json(), headers={"x-pythia-backend": url})
+    return JSONResponse(status_code=404, content={"error": f"No running request {request_id}."})
+
+
+@app.api_route("/v1/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+async def proxy(path: str, req: Request):
+    raw = await req.body()
+    try:
+        body = await req.json() if raw and req.method == "POST" else {}
+    except ValueError:
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+
+    backend = pick_backend(body)
+    if backend is None:
+        return JSONResponse(status_code=503, headers={"Retry-After": "2"},
+                            content={"error": "No vLLM backend available."})
+
+    headers = {k: v for k, v in req.headers.items() if k.lower() not in HOP_HEADERS}
+    upstream_req = client.build_request(req.method, f"{backend.url}/v1/{path}",
+                                        params=req.query_params, content=raw, headers=headers)
+    tokens = estimate_tokens(body) if body else 0
+    backend.in_flight += 1
+    backend.in_flight_tokens += tokens
+    backend.requests += 1
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            backend.in_flight -= 1
+            backend.in_flight_tokens -= tokens
+            _forget_drained()
+
+    try:
+        upstream = await _await_or_disconnect(req, asyncio.create_task(client.send(upstream_req, stream=True)))
+    except (httpx.HTTPError, OSError) as e:
+        backend.errors += 1
+        backend.record_failure()
+        release()
+        return JSONResponse(status_code=502, content={"error": f"Backend {backend.url} unreachable: {e}"})
+    if upstream is None:
+        release()
+        return Response(status_code=499)
+
+    async def relay():
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            release()
+            # Fermeture dans une tâche à part : le générateur peut être en cours d'annulation.
+            asyncio.ensure_future(upstream.aclose())
+
+    out_headers = {k: v for k, v in upstream.headers.items() if k.lower() not in HOP_HEADERS}
+    out_headers["x-pythia-backend"] = backend.url
+    # Filet de sécurité si le flux n'est jamais consommé (release idempotent)
+    return StreamingResponse(relay(), status_code=upstream.status_code, headers=out_headers,
+                             background=BackgroundTask(release))
+
+
+# --- 4. Lancement ---
+if __name__ == "__main__":
+    uvicorn.run(
+        "router:app",
+        host=args.host,
+        port=args.port,
+        reload=False,
+        log_level="warning",
+        access_log=False,
+    )
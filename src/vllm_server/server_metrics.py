@@ -0,0 +1,163 @@
+"""
+server_metrics.py
+Registre minimal de métriques au format texte Prometheus (exposition 0.0.4).
+
+Pas de dépendance à prometheus_client : le serveur doit pouvoir tourner (et
+être mesuré) sans l'environnement vLLM complet. Si prometheus_client est
+installé (c'est le cas avec vLLM), ses métriques moteur (usage du KV cache,
+etc.) sont ajoutées à la sortie par `render_engine_metrics`.
+"""
+
+import math
+import threading
+from typing import Iterable, Optional
+
+# Buckets par défaut (secondes), calés sur des latences LLM interactives
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: Optional[tuple] = None) -> str:
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{str(v)}"'.replace("\n", " ") for k, v in pairs)
+    return "{" + inner + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(k, "") for k in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Compteur monotone."""
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items()) or ([((), 0.0)] if not self.labelnames else [])
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    """Valeur instantanée (peut monter et descendre)."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Histogramme cumulatif (buckets `le`, `_sum`, `_count`)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, buckets: Iterable[float] = LATENCY_BUCKETS,
+                 labelnames: Iterable[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: dict[tuple, list] = {}   # key -> [counts par bucket, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for key, (counts, total, count) in series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Conteneur ordonné de métriques, rendu en texte Prometheus."""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, doc: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, doc, labelnames))
+
+    def gauge(self, name: str, doc: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, doc, labelnames))
+
+    def histogram(self, name: str, doc: str, buckets: Iterable[float] = LATENCY_BUCKETS,
+                  labelnames: Iterable[str] = ()) -> Histogram:
+        return self._register(Histogram(name, doc, buckets, labelnames))
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+
+def render_engine_metrics() -> str:
+    """Métriques exportées par vLLM via prometheus_client (vide si indisponible)."""
+    try:
+        from prometheus_client import REGISTRY, generate_latest
+    except ImportError:
+        return ""
+    return generate_latest(REGISTRY).decode("utf-8")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+stub_replica.py
+Réplique factice de vllm_chat_server (sans GPU ni modèle) pour tester le routeur.
+
+Expose /v1/status, /v1/models et /v1/chat/completions (JSON ou SSE) avec une
+latence de prefill et par token configurable, et une capacité limitée
+(`--max_running`) : les requêtes au-delà attendent et sont remontées en
+`queue_depth`, comme le ferait l'admission du vrai serveur.
+POST /stub/health {"healthy": false} simule une réplique en panne.
+"""
+
+import asyncio
+import argparse
+import json
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--host", type=str, default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8001)
+parser.add_argument("--model_name", type=str, default="stub")
+parser.add_argument("--max_running", type=int, default=4)
+parser.add_argument("--prefill_ms", type=float, default=20)
+parser.add_argument("--token_ms", type=float, default=5)
+args, _ = parser.parse_known_args()
+
+app = FastAPI(openapi_url=None, docs_url=None)
+slots = asyncio.Semaphore(args.max_running)
+state = {"healthy": True, "in_flight": 0, "waiting": 0, "served": 0}
+
+
+@app.get("/v1/status")
+async def status():
+    if not state["healthy"]:
+        return JSONResponse(status_code=503, content={"ready": False})
+    return {"ready": True, "in_flight": state["in_flight"], "queue_depth": state["waiting"],
+            "served": state["served"], "default": args.model_name}
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": args.model_name, "object": "model", "owned_by": "pythia"}]}
+
+
+@app.post("/stub/health")
+async def set_health(req: Request):
+    state["healthy"] = bool((await req.json()).get("healthy", True))
+    return state
+
+
+@app.post("/v1/chat/completions")
+async def chat(req: Request):
+    body = await req.json()
+    n_tokens = int(body.get("max_completion_tokens") or body.get("max_tokens") or 16)
+    request_id = f"chatcmpl-{uuid.uuid4().hex}"
+    words = [f"tok{i}" for i in range(n_tokens)]
+    state["in_flight"] += 1
+    state["waiting"] += 1
+
+    async def run():
+        admitted = False
+        try:
+            async with slots:
+                admitted = True
+                state["waiting"] -= 1
+                await asyncio.sleep(args.prefill_ms / 1000)
+                for w in words:
+                    await asyncio.sleep(args.token_ms / 1000)
+                    yield w
+        finally:
+            if not admitted:
+                state["waiting"] -= 1
+
+    def done():
+        state["in_flight"] -= 1
+        state["served"] += 1
+
+    if body.get("stream"):
+        async def sse():
+            try:
+                async for w in run():
+                    chunk = {"id": request_id, "object": "chat.completion.chunk", "model": args.model_name,
+                             "choices": [{"index": 0, "delta": {"content": w + " "}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                done()
+        return StreamingResponse(sse(), media_type="text/event-stream")
+
+    try:
+        text = " ".join([w async for w in run()])
+    finally:
+        done()
+    return {
+        "id": request_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": args.model_name,
+        "replica": args.port,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "length"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": n_tokens, "total_tokens": n_tokens},
+    }
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
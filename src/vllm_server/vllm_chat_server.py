@@ -2,148 +2,589 @@
 """
 vllm_chat_server.py
 Serveur vLLM OpenAI-compatible pour les Chat Completions avec gestion via lifespan.
+
+Le moteur est un AsyncLLMEngine partagé : chaque requête HTTP y est soumise
+sous un request_id propre, et le scheduler vLLM regroupe les conversations
+concurrentes (continuous batching) dans la limite de max_num_seqs /
+max_num_batched_tokens définis dans le JSON du modèle.
 """
 
 import os
 import json
-from pathlib import Path
+import asyncio
+import time
+import uuid
 from typing import Optional
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from contextlib import asynccontextmanager
 import uvicorn
 import argparse
 
-from vllm import LLM, SamplingParams
-from transformers import AutoTokenizer
 
-# --- 1. Lecture de l'argument modèle ---
+from admission import AdmissionController, AdmissionRejected
+from engines import ENGINE_BACKENDS, SamplingParams, engine_backend, load_engine
+from model_config import ModelConfigError, check_model_dir, load_model_config
+from model_registry import ModelEntry, ModelRegistry, UnknownModel
+from prompt_tokens import PromptBuilder, PromptTooLong
+from response_cache import ResponseCache
+from server_metrics import (
+    RATE_BUCKETS, TOKEN_BUCKETS, MetricsRegistry, render_engine_metrics,
+)
+
+# --- 1. Lecture des arguments ---
 parser = argparse.ArgumentParser()
-parser.add_argument("--model_name", type=str, required=True, help="Nom du modèle à charger")
+parser.add_argument("--model_name", type=str, required=True, help="Nom du modèle à charger (modèle par défaut)")
+parser.add_argument("--models", type=str, default="",
+                    help="Autres modèles servables, séparés par des virgules (chargés à la demande)")
+parser.add_argument("--gpu_budget", type=float, default=1.0,
+                    help="Somme max des gpu_memory_utilization des modèles résidents")
+parser.add_argument("--cpu_park_budget_gb", type=float, default=0.0,
+                    help="RAM (Go) pour garder des modèles endormis ; 0 = déchargement complet")
+parser.add_argument("--engine", choices=ENGINE_BACKENDS, default=None,
+                    help="Backend moteur pour tous les modèles (sinon clé `engine` du JSON, défaut vllm)")
+parser.add_argument("--host", type=str, default="0.0.0.0")
+parser.add_argument("--port", type=int, default=8000)
 args = parser.parse_args()
 
 # --- 2. Chargement des hyperparamètres depuis JSON ---
 
-project_dir = Path(__file__).resolve().parents[2]
-params_path = project_dir / "src" / "vllm_server" / f"{args.model_name}.json"
+served_models = [args.model_name] + [m.strip() for m in args.models.split(",")
+                                     if m.strip() and m.strip() != args.model_name]
+try:
+    model_configs = {name: load_model_config(name) for name in served_models}
+    for c in model_configs.values():
+        if args.engine:
+            c["engine"] = args.engine
+        # Le moteur factice n'a besoin des poids que pour le tokenizer (optionnel).
+        if engine_backend(c) == "vllm":
+            check_model_dir(c)
+except (ModelConfigError, ValueError) as e:
+    raise SystemExit(f"[ERROR] {e}")
 
-if not params_path.is_file():
-    raise SystemExit(f"[ERROR] Fichier de config introuvable : {params_path}")
+# --- 3. Configuration du modèle par défaut ---
+# Ses réglages serveur (admission, cache, longueur de prompt) valent pour tous
+# les modèles ; les paramètres moteur sont lus par modèle dans build_engine.
 
-raw = params_path.read_text(encoding="utf-8")
-filtered = "\n".join(line for line in raw.splitlines() if not line.strip().startswith("//"))
-cfg = json.loads(filtered)
+cfg = model_configs[args.model_name]
 
-# --- 3. Configuration modèle et chemins ---
+# --- 4. Extraction des autres paramètres ---
 
-model_name = cfg["model_name"]
-abs_path = cfg.get("absolute_path")
-rel_path = cfg.get("relative_path")
+max_num_seqs = cfg.get("max_num_seqs", 1)
 
-if abs_path:
-    model_dir = Path(abs_path)
-elif rel_path:
-    model_dir = (project_dir / rel_path).resolve()
-else:
-    raise SystemExit("[ERROR] Aucun chemin 'absolute_path' ou 'relative_path' défini dans le JSON.")
+# Contrôle de longueur du prompt (tokenisé une seule fois côté serveur)
+prompt_overflow_policy = cfg.get("prompt_overflow_policy", "truncate_oldest")
+min_completion_tokens = cfg.get("min_completion_tokens", 256)
 
-if not model_dir.is_dir():
-    raise SystemExit(f"[ERROR] Modèle introuvable : {model_dir}")
+# Admission : file bornée, classes de priorité, part équitable par client
+max_running_requests = cfg.get("max_running_requests", max_num_seqs)
+max_queue_depth = cfg.get("max_queue_depth", 64)
+max_requests_per_client = cfg.get("max_requests_per_client", 0)
+batch_max_running = cfg.get("batch_max_running")
+retry_after_s = cfg.get("retry_after_s", 1)
 
-model_path = str(model_dir)
+# Cache exact des réponses déterministes (temperature = 0) ; 0 entrée = désactivé
+response_cache_max_entries = cfg.get("response_cache_max_entries", 0)
+response_cache_max_mb = cfg.get("response_cache_max_mb", 64)
+response_cache_ttl_s = cfg.get("response_cache_ttl_s", 3600)
 
+# --- 5. Déclarations globales ---
 
+registry: Optional[ModelRegistry] = None
+model_ready = False
+inflight: dict = {}   # request_id -> InFlightRequest
+admission = AdmissionController(
+    max_running=max_running_requests,
+    max_queue_depth=max_queue_depth,
+    max_requests_per_client=max_requests_per_client,
+    class_max_running={"batch": batch_max_running},
+    retry_after_s=retry_after_s,
+)
+response_cache = ResponseCache(
+    max_entries=response_cache_max_entries,
+    max_bytes=int(response_cache_max_mb * 1024 * 1024),
+    ttl_s=response_cache_ttl_s,
+)
 
-# --- 4. Extraction des autres paramètres ---
+# --- 5b. Métriques (exposées sur /v1/metrics) ---
 
-dtype = cfg.get("dtype")
-quantization = cfg.get("quantization")
-kv_cache_dtype = cfg.get("kv_cache_dtype")
-gpu_memory_utilization = cfg.get("gpu_memory_utilization")
-max_model_len = cfg.get("max_model_len")
-tensor_parallel_size = cfg.get("tensor_parallel_size", 1)
-pipeline_parallel_size = cfg.get("pipeline_parallel_size", 1)
-max_num_seqs = cfg.get("max_num_seqs", 1)
-max_num_batched_tokens = cfg.get("max_num_batched_tokens", 0)
-swap_space_gb = cfg.get("swap_space_gb", 0)
-cpu_offload_gb = cfg.get("cpu_offload_gb", 0)
+metrics = MetricsRegistry()
+m_requests = metrics.counter("pythia_requests_total", "Requêtes chat terminées", ("status",))
+m_running = metrics.gauge("pythia_requests_running", "Requêtes en cours de génération")
+m_queue = metrics.histogram("pythia_request_queue_seconds", "Attente avant premier scheduling (moteur)")
+m_ttft = metrics.histogram("pythia_request_ttft_seconds", "Temps jusqu'au premier token")
+m_e2e = metrics.histogram("pythia_request_e2e_seconds", "Latence totale de la requête")
+m_decode_rate = metrics.histogram("pythia_decode_tokens_per_second", "Débit de décodage par requête",
+                                  RATE_BUCKETS)
+m_prompt_len = metrics.histogram("pythia_prompt_tokens", "Longueur du prompt (tokens)", TOKEN_BUCKETS)
+m_completion_len = metrics.histogram("pythia_completion_tokens", "Longueur de la complétion (tokens)",
+                                     TOKEN_BUCKETS)
+m_prompt_total = metrics.counter("pythia_prompt_tokens_total", "Tokens de prompt traités")
+m_completion_total = metrics.counter("pythia_completion_tokens_total", "Tokens générés")
+m_cached_total = metrics.counter("pythia_prefix_cache_hit_tokens_total",
+                                 "Tokens de prompt servis par le prefix cache")
+m_cache_ratio = metrics.gauge("pythia_prefix_cache_hit_ratio",
+                              "Part cumulée des tokens de prompt servis par le prefix cache")
+m_cancelled = metrics.counter("pythia_requests_cancelled_total", "Générations annulées", ("reason",))
+m_cancel_saved = metrics.counter("pythia_cancelled_tokens_saved_total",
+                                 "Tokens non générés grâce aux annulations (max_tokens - produits)")
+m_cache = metrics.counter("pythia_response_cache_total", "Cache de réponses : hit / miss / coalesced",
+                          ("result",))
+m_cache_entries = metrics.gauge("pythia_response_cache_entries", "Entrées du cache de réponses")
+m_cache_bytes = metrics.gauge("pythia_response_cache_bytes", "Taille du cache de réponses (octets JSON)")
+m_overflow = metrics.counter("pythia_prompt_overflow_total",
+                             "Prompts dépassant max_model_len (tronqués ou rejetés)", ("action",))
+m_rejected = metrics.counter("pythia_admission_rejected_total", "Requêtes refusées (429)", ("reason",))
+m_queue_depth = metrics.gauge("pythia_admission_queue_depth", "Requêtes en attente d'admission")
+admission.on_queue_change = m_queue_depth.set   # mise à jour à chaque entrée / sortie de file
+m_admission_wait = metrics.histogram("pythia_admission_wait_seconds", "Attente dans la file d'admission",
+                                     labelnames=("priority",))
 
-# --- 5. Déclarations globales ---
 
-llm: Optional[LLM] = None
-tokenizer: Optional[AutoTokenizer] = None
-model_ready = False
+def _usage(out) -> dict:
+    """Bloc `usage` OpenAI calculé depuis la sortie moteur."""
+    prompt_tokens = len(out.prompt_token_ids or []) if out is not None else 0
+    completion_tokens = sum(len(c.token_ids) for c in out.outputs) if out is not None else 0
+    cached_tokens = (getattr(out, "num_cached_tokens", None) or 0) if out is not None else 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        # Tokens de prompt servis par le prefix cache (prefill évité)
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+class RequestTrace:
+    """Chronométrage d'une requête (arrivée, premier token, fin) alimentant les métriques."""
+
+    def __init__(self):
+        self.arrival = time.monotonic()
+        self.first_token: Optional[float] = None
+        m_running.inc()
+
+    def on_output(self, out):
+        if self.first_token is None and any(c.token_ids for c in out.outputs):
+            self.first_token = time.monotonic()
+
+    def finish(self, out, status: str = "ok"):
+        end = time.monotonic()
+        m_running.dec()
+        m_requests.inc(status=status)
+        if out is None:
+            return
+        m_e2e.observe(end - self.arrival)
+        usage = _usage(out)
+        m_prompt_len.observe(usage["prompt_tokens"])
+        m_completion_len.observe(usage["completion_tokens"])
+        m_prompt_total.inc(usage["prompt_tokens"])
+        m_completion_total.inc(usage["completion_tokens"])
+
+        cached = getattr(out, "num_cached_tokens", None) or 0
+        m_cached_total.inc(cached)
+        if m_prompt_total.value():
+            m_cache_ratio.set(m_cached_total.value() / m_prompt_total.value())
+
+        # Attente en file : fournie par le moteur V0 (RequestMetrics) ; en V1,
+        # voir vllm:request_queue_time_seconds dans les métriques moteur.
+        engine_metrics = getattr(out, "metrics", None)
+        queue_time = getattr(engine_metrics, "time_in_queue", None)
+        if queue_time is None and engine_metrics is not None:
+            scheduled = getattr(engine_metrics, "first_scheduled_time", None)
+            arrived = getattr(engine_metrics, "arrival_time", None)
+            if scheduled and arrived:
+                queue_time = scheduled - arrived
+        if queue_time is not None:
+            m_queue.observe(queue_time)
+
+        if self.first_token is not None:
+            m_ttft.observe(self.first_token - self.arrival)
+            decode_time = end - self.first_token
+            if usage["completion_tokens"] > 1 and decode_time > 0:
+                m_decode_rate.observe((usage["completion_tokens"] - 1) / decode_time)
 
 # --- 6. Gestion via lifespan FastAPI ---
+def build_engine(model_cfg: dict):
+    """Construit (moteur async, tokenizer) pour un modèle ; appelé par le registre."""
+    return load_engine(model_cfg, enable_sleep_mode=args.cpu_park_budget_gb > 0)
+
+
+def _shutdown_engine(eng) -> None:
+    """Arrête proprement le moteur (API V1 : shutdown, API V0 : background loop)."""
+    shutdown = getattr(eng, "shutdown", None) or getattr(eng, "shutdown_background_loop", None)
+    if shutdown is not None:
+        shutdown()
+
+
+def _on_model_load(entry: ModelEntry):
+    """Après un chargement depuis le disque : prompt builder neuf, cache invalidé."""
+    entry.prompt_builder = PromptBuilder(
+        entry.tokenizer,
+        max_model_len=entry.cfg.get("max_model_len"),
+        min_completion_tokens=min_completion_tokens,
+        overflow_policy=prompt_overflow_policy,
+    )
+    response_cache.invalidate()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global llm, tokenizer, model_ready
-    llm = LLM(
-        model=model_path,
-        tensor_parallel_size=tensor_parallel_size,
-        pipeline_parallel_size=pipeline_parallel_size,
-        dtype=dtype,
-        quantization=quantization,
-        kv_cache_dtype=kv_cache_dtype,
-        gpu_memory_utilization=gpu_memory_utilization,
-        max_model_len=max_model_len,
-        max_num_seqs=max_num_seqs,
-        max_num_batched_tokens=max_num_batched_tokens,
-        enable_prefix_caching=True,
-        swap_space=swap_space_gb,
-        cpu_offload_gb=cpu_offload_gb,
-        enforce_eager=True,
+    global registry, model_ready
+    registry = ModelRegistry(
+        model_configs,
+        default_model=args.model_name,
+        load_fn=build_engine,
+        shutdown_fn=_shutdown_engine,
+        gpu_budget=args.gpu_budget,
+        cpu_park_budget_gb=args.cpu_park_budget_gb,
+        on_load=_on_model_load,
     )
-    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    await registry.preload(args.model_name)
     model_ready = True
-    print("[INFO] Model and tokenizer loaded.")
+    print(f"[INFO] Async engine and tokenizer loaded ({args.model_name}).")
     yield
+    model_ready = False
+    await registry.shutdown()
+
 
 app = FastAPI(lifespan=lifespan, openapi_url="/v1/openapi.json", docs_url="/v1/docs")
 
 # --- 7. Endpoint statut modèle ---
 @app.get("/v1/status")
 async def status():
-    return {"ready": model_ready}
+    if registry is None:
+        return {"ready": model_ready, "in_flight": 0, "queue_depth": 0}
+    # in_flight : requêtes tenant un modèle (attente d'admission, génération,
+    # flux SSE en cours) ; sert au drain avant arrêt lors d'un reload blue/green.
+    # queue_depth : requêtes en attente d'admission ; utilisé par le routeur pour
+    # choisir la réplique la moins chargée.
+    in_flight = sum(e.active for e in registry.entries.values())
+    return {"ready": model_ready, "in_flight": in_flight, "queue_depth": admission.queue_depth,
+            **registry.status()}
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {
+        "object": "list",
+        "data": [{"id": name, "object": "model", "owned_by": "pythia"} for name in model_configs],
+    }
+
+# --- 7b. Endpoint métriques (format texte Prometheus) ---
+@app.get("/v1/metrics")
+async def get_metrics():
+    return PlainTextResponse(
+        metrics.render() + render_engine_metrics(),
+        media_type="text/plain; version=0.0.4",
+    )
 
 # --- 8. Endpoint Chat Completions ---
+class InFlightRequest:
+    """
+    Génération en cours, consommée par une tâche productrice dédiée.
+
+    L'annulation (déconnexion du client ou /v1/requests/{id}/cancel) annule
+    cette tâche : vLLM avorte alors la séquence et libère ses blocs KV, et le
+    consommateur (réponse simple ou flux SSE) se termine proprement.
+    """
+
+    def __init__(self, request_id: str, lease, prompt, sampling_params: SamplingParams):
+        self.request_id = request_id
+        self.lease = lease            # modèle réservé jusqu'à close()
+        self.model = lease.entry.name
+        self.engine = lease.entry.engine
+        self.max_tokens = sampling_params.max_tokens or 0
+        self.last = None
+        self.cancel_reason: Optional[str] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._produce(prompt, sampling_params))
+        inflight[request_id] = self
+
+    async def _produce(self, prompt, sampling_params):
+        try:
+            async for out in self.engine.generate(prompt, sampling_params, self.request_id):
+                self._queue.put_nowait(out)
+        except asyncio.CancelledError:
+            # vLLM avorte déjà sur annulation ; l'appel explicite est idempotent.
+            await self.engine.abort(self.request_id)
+        except Exception as e:
+            self._queue.put_nowait(e)
+        finally:
+            self._queue.put_nowait(None)
+
+    async def outputs(self):
+        """Sorties cumulatives du moteur jusqu'à la fin (ou l'annulation)."""
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            self.last = item
+            yield item
+
+    @property
+    def finished(self) -> bool:
+        return self._task.done()
+
+    @property
+    def generated_tokens(self) -> int:
+        return sum(len(c.token_ids) for c in self.last.outputs) if self.last is not None else 0
+
+    def cancel(self, reason: str) -> bool:
+        """Annule la génération ; renvoie False si elle était déjà terminée."""
+        if self.cancel_reason is not None or self._task.done():
+            return False
+        self.cancel_reason = reason
+        self._task.cancel()
+        m_cancelled.inc(reason=reason)
+        m_cancel_saved.inc(max(0, self.max_tokens - self.generated_tokens))
+        return True
+
+    def close(self):
+        if not self._task.done():
+            self.cancel("disconnect")
+        inflight.pop(self.request_id, None)
+        self.lease.release()
+
+
+async def _watch_disconnect(req: Request, flight: InFlightRequest, interval: float = 0.5):
+    """Annule la génération si le client HTTP se déconnecte (réponse non streamée)."""
+    while not flight.finished:
+        if await req.is_disconnected():
+            flight.cancel("disconnect")
+            return
+        await asyncio.sleep(interval)
+
+
+def _sse(payload) -> str:
+    """Formate un événement Server-Sent Events (une ligne `data:`)."""
+    data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    return f"data: {data}\n\n"
+
+
+async def _stream_completion(flight: InFlightRequest, ticket):
+    """Relaye la génération en chunks OpenAI `chat.completion.chunk` au fil des tokens."""
+    created = int(time.time())
+
+    def chunk(delta: dict, finish_reason=None) -> dict:
+        return {
+            "id": flight.request_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": flight.model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    trace = RequestTrace()
+    status = "error"
+    try:
+        yield _sse(chunk({"role": "assistant", "content": ""}))
+        sent = 0
+        finish_reason = None
+        async for out in flight.outputs():
+            trace.on_output(out)
+            choice = out.outputs[0]
+            # Les sorties vLLM sont cumulatives : on n'envoie que le nouveau texte.
+            delta = choice.text[sent:]
+            sent = len(choice.text)
+            finish_reason = choice.finish_reason
+            if delta:
+                yield _sse(chunk({"content": delta}))
+        if flight.cancel_reason:
+            finish_reason = "cancelled"
+        final = chunk({}, finish_reason or "stop")
+        final["usage"] = _usage(flight.last)
+        yield _sse(final)
+        yield _sse("[DONE]")
+        status = "cancelled" if flight.cancel_reason else "ok"
+    finally:
+        # Déconnexion : Starlette annule ce générateur, close() avorte la séquence.
+        flight.close()
+        trace.finish(flight.last, status)
+        _release(ticket, trace)
+
+
+def _cleanup_stream(flight: InFlightRequest, ticket):
+    """Filet de sécurité si le flux n'a jamais été consommé (idempotent)."""
+    flight.close()
+    ticket.release()
+
+
+def _client_id(req: Request, body: dict) -> str:
+    """Identité du client pour la part équitable : en-tête, champ `user`, sinon IP."""
+    return (req.headers.get("x-client-id") or body.get("user")
+            or (req.client.host if req.client else "unknown"))
+
+
+async def _admit(req: Request, body: dict):
+    """Réserve une place moteur ; renvoie (ticket, None) ou (None, réponse 429)."""
+    priority = body.get("priority") or req.headers.get("x-priority")
+    priority = admission.normalize_priority(priority)
+    start = time.monotonic()
+    try:
+        ticket = await admission.acquire(_client_id(req, body), priority)
+    except AdmissionRejected as e:
+        m_rejected.inc(reason=e.reason)
+        return None, JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)},
+            content={"error": f"Server busy ({e.reason}), retry in {e.retry_after}s."},
+        )
+    m_admission_wait.observe(time.monotonic() - start, priority=priority)
+    return ticket, None
+
+
+def _release(ticket, trace: RequestTrace):
+    if not ticket.released:
+        admission.observe_service_time(time.monotonic() - trace.arrival)
+    ticket.release()
+
+
 @app.post("/v1/chat/completions")
 async def chat_completions(req: Request):
     body = await req.json()
+    if not body.get("messages"):
+        return {"error": "No messages provided."}
+
+    # Routage par le champ `model` ("auto" ou absent = modèle par défaut) ;
+    # le registre charge / réveille le modèle si besoin (éviction LRU).
+    try:
+        lease = await registry.acquire(body.get("model"))
+    except UnknownModel as e:
+        return JSONResponse(status_code=404, content={"error": f"Unknown model {e.args[0]!r}."})
+
+    response = None
+    try:
+        response = await _chat_completion(req, body, lease)
+        return response
+    finally:
+        # Un flux SSE garde le modèle réservé jusqu'à sa fin (InFlightRequest.close).
+        if not isinstance(response, StreamingResponse):
+            lease.release()
+
+
+async def _chat_completion(req: Request, body: dict, lease):
+    entry = lease.entry
     messages = body.get("messages", [])
     temperature = body.get("temperature", 0.7)
     max_tokens = body.get("max_completion_tokens", 1024)
+    stream = bool(body.get("stream", False))
 
-    if not messages:
-        return {"error": "No messages provided."}
+    # Rendu direct en token ids (hors boucle d'événements) : le moteur ne
+    # retokenise pas, et les mêmes ids servent au contrôle de longueur.
+    try:
+        prompt = await asyncio.to_thread(entry.prompt_builder.build, messages)
+    except PromptTooLong as e:
+        m_overflow.inc(action="rejected")
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if prompt.dropped_messages:
+        m_overflow.inc(action="truncated")
+    max_model_len = entry.cfg.get("max_model_len")
+    if max_model_len:
+        max_tokens = max(1, min(max_tokens, max_model_len - len(prompt.ids)))
 
-    chat_prompt = tokenizer.apply_chat_template(messages, tokenize=False)
+    chat_prompt = {"prompt_token_ids": prompt.ids}
     sampling_params = SamplingParams(
         n=1,
         temperature=temperature,
         max_tokens=max_tokens,
     )
-    out = llm.generate([chat_prompt], sampling_params)[0]
 
+    # Seules les complétions déterministes non streamées passent par le cache.
+    if stream or not response_cache.enabled or temperature != 0:
+        return await _complete(req, body, lease, chat_prompt, sampling_params, stream)
+
+    key = ResponseCache.make_key(
+        entry.model_id, prompt.ids,
+        {"temperature": temperature, "max_tokens": max_tokens},
+    )
+
+    async def compute():
+        result = await _complete(req, body, lease, chat_prompt, sampling_params, stream=False)
+        cacheable = isinstance(result, dict) and all(
+            c["finish_reason"] != "cancelled" for c in result["choices"]
+        )
+        return result, cacheable
+
+    result, source = await response_cache.get_or_compute(key, compute)
+    m_cache.inc(result=source)
+    m_cache_entries.set(len(response_cache))
+    m_cache_bytes.set(response_cache.current_bytes)
+    if source != "miss":
+        result = {**result, "id": f"chatcmpl-{uuid.uuid4().hex}"}
+    return result
+
+
+async def _complete(req: Request, body: dict, lease, chat_prompt, sampling_params: SamplingParams,
+                    stream: bool):
+    """Admission puis génération ; renvoie le corps JSON, un flux SSE ou un rejet 429."""
+    ticket, rejection = await _admit(req, body)
+    if rejection is not None:
+        return rejection
+
+    # Soumission au moteur partagé : on ne bloque pas la boucle d'événements,
+    # les autres requêtes sont batchées avec celle-ci par le scheduler vLLM.
+    # L'id est unique : c'est celui de la réponse et de /v1/requests/{id}/cancel.
+    request_id = f"chatcmpl-{uuid.uuid4().hex}"
+    flight = InFlightRequest(request_id, lease, chat_prompt, sampling_params)
+
+    if stream:
+        return StreamingResponse(
+            _stream_completion(flight, ticket),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(_cleanup_stream, flight, ticket),
+        )
+
+    trace = RequestTrace()
+    watcher = asyncio.create_task(_watch_disconnect(req, flight))
+    status = "error"
+    try:
+        async for out in flight.outputs():
+            trace.on_output(out)
+        status = "cancelled" if flight.cancel_reason else "ok"
+    finally:
+        watcher.cancel()
+        flight.close()
+        trace.finish(flight.last, status)
+        _release(ticket, trace)
+
+    out = flight.last
     return {
-        "id": "chatcmpl-generated",
+        "id": request_id,
         "object": "chat.completion",
+        "model": flight.model,
         "choices": [
             {
+                "index": choice.index,
                 "message": {
                     "role": "assistant",
                     "content": choice.text
-                }
+                },
+                "finish_reason": "cancelled" if flight.cancel_reason else choice.finish_reason,
             }
-            for choice in out.outputs
+            for choice in (out.outputs if out is not None else [])
         ],
+        "usage": _usage(out),
     }
 
+
+# --- 8b. Annulation explicite d'une requête en cours ---
+@app.post("/v1/requests/{request_id}/cancel")
+async def cancel_request(request_id: str):
+    flight = inflight.get(request_id)
+    if flight is None or not flight.cancel("api"):
+        return JSONResponse(status_code=404, content={"error": f"No running request {request_id}."})
+    return {"id": request_id, "cancelled": True}
+
 # --- 9. Lancement du serveur ---
 if __name__ == "__main__":
     uvicorn.run(
         "vllm_chat_server:app",
-        host="0.0.0.0",
-        port=8000,
+        host=args.host,
+        port=args.port,
         reload=False,
         log_level="warning",
         access_log=False,